@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Локальная подмена Google Sheets v4 / Drive v3 для отладки и нагрузочных замеров.
+
+Реализовано только то, что вызывает бот: книги и листы gspread (get_values, col_values,
+batch_get, batch_update, append_rows, values_batch_get, ...) и файлы Drive (create,
+get, list, delete, batch). Подмена ставится под настоящие обёртки: вызовы идут через
+``GoogleSheetAsyncClient``, ``QuotaClientManager``, лимитер квоты и повторы, а Drive
+через ``drive_executor``, поэтому замеряется весь сервисный слой без сети.
+
+Использование::
+
+    fake = FakeGoogle(latency=0.05, error_rate=0.01)
+    fake.book(gs.BOOK_TABLE_ID).add(gs.SHEET_EXITS, exits_values(20_000))
+    with fake:
+        await google_exits()
+"""
+import io
+import json
+import random
+import re
+import string
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import httplib2
+from googleapiclient.errors import HttpError
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+from gspread.worksheet import ValueRange
+
+from cache.snapshot import Snapshot
+from services import google_drive
+from services.async_google_service import GoogleSheetAsyncClient
+from services.schedule import SCHEDULE_COLUMNS
+from services.sheets_manager import QuotaClientManager
+
+WRITE_OFF_COLUMNS = ('Дата', 'Телеграм id', 'Сотрудник', 'Код товара', 'Наименование', 'Кол-во', 'Основание',
+                     'Комментарий', 'Ссылка на фото', 'Фото', 'Статус')
+
+_STATUS_TEXT = {403: 'PERMISSION_DENIED', 404: 'NOT_FOUND', 429: 'RESOURCE_EXHAUSTED', 500: 'INTERNAL',
+                503: 'UNAVAILABLE'}
+
+
+class FakeResponse:
+    """Ответ requests для gspread.exceptions.APIError."""
+
+    def __init__(self, status: int, message: str = 'fake error'):
+        self.status_code = status
+        self.payload = {'error': {'code': status, 'message': message, 'status': _STATUS_TEXT.get(status, '')}}
+        self.text = json.dumps(self.payload)
+
+    def json(self) -> dict:
+        return self.payload
+
+
+def api_error(status: int, message: str = 'fake error') -> APIError:
+    """Ошибка Sheets API, как её бросает gspread."""
+    return APIError(FakeResponse(status, message))
+
+
+def http_error(status: int, message: str = 'fake error', reason: str = '') -> HttpError:
+    """Ошибка Drive API, как её бросает googleapiclient."""
+    content = {'error': {'code': status, 'message': message, 'errors': [{'reason': reason, 'message': message}]}}
+    return HttpError(httplib2.Response({'status': status}), json.dumps(content).encode(), uri='fake://drive')
+
+
+class Faults:
+    """Задержка и ошибки, которые получает каждый вызов подменённого API.
+
+    Вызовы выполняются в потоках пула, поэтому задержка - обычный time.sleep.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 429, seed: Optional[int] = None):
+        """
+        :param latency: задержка каждого вызова, сек.
+        :param jitter: случайная добавка к задержке в [0, jitter], сек.
+        :param error_rate: доля вызовов, завершающихся ошибкой error_status
+        :param error_status: HTTP статус случайных ошибок
+        :param seed: (optional) seed для воспроизводимости
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._queued: List[int] = []
+        self._lock = threading.Lock()
+
+    def fail_next(self, count: int = 1, status: int = 429) -> None:
+        """Следующие count вызовов завершатся ошибкой status."""
+        with self._lock:
+            self._queued.extend([status] * count)
+
+    def __call__(self, name: str) -> Optional[int]:
+        """Учесть вызов name, выдержать задержку, вернуть статус ошибки или None."""
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self._queued:
+                status = self._queued.pop(0)
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status = self.error_status
+            else:
+                status = None
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        return status
+
+
+def _grid(range_name: Optional[str]) -> tuple:
+    """(строка с, строка по, столбец с, столбец по) с 0, None - без границы."""
+    if not range_name:
+        return 0, None, 0, None
+    grid = a1_range_to_grid_range(range_name.split('!')[-1].replace('$', ''))
+    return (grid.get('startRowIndex', 0), grid.get('endRowIndex'),
+            grid.get('startColumnIndex', 0), grid.get('endColumnIndex'))
+
+
+def _trim(rows: List[list]) -> List[list]:
+    """Как Sheets API: пустые хвосты строк и пустые строки в конце не возвращаются."""
+    result = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] in ('', None):
+            row.pop()
+        result.append(row)
+    while result and not result[-1]:
+        result.pop()
+    return result
+
+
+class FakeWorksheet:
+    """Лист с интерфейсом gspread.Worksheet, значения хранятся строками."""
+
+    def __init__(self, spreadsheet: 'FakeSpreadsheet', title: str, values: Sequence[Sequence[Any]] = ()):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = abs(hash((spreadsheet.id, title))) % 10 ** 9
+        self.values: List[List[str]] = [[_cell(value) for value in row] for row in values]
+        self._properties = {'sheetId': self.id, 'title': title, 'index': len(spreadsheet.sheets)}
+        self._lock = threading.Lock()
+
+    def _api(self, name: str) -> None:
+        status = self.spreadsheet.faults(f'sheets.{name}')
+        if status is not None:
+            raise api_error(status, f'{name} {self.title}')
+
+    def _read(self, range_name: Optional[str] = None, major_dimension: Optional[str] = None) -> List[list]:
+        row_s, row_f, col_s, col_f = _grid(range_name)
+        with self._lock:
+            rows = [row[col_s:col_f] for row in self.values[row_s:row_f]]
+        rows = _trim(rows)
+        if major_dimension and major_dimension.upper() == 'COLUMNS':
+            width = max((len(row) for row in rows), default=0)
+            rows = _trim([[row[i] if i < len(row) else '' for row in rows] for i in range(width)])
+        return rows
+
+    def _write(self, range_name: str, values: Sequence[Sequence[Any]]) -> None:
+        row_s, _, col_s, _ = _grid(range_name)
+        with self._lock:
+            for i, row in enumerate(values):
+                while len(self.values) <= row_s + i:
+                    self.values.append([])
+                target = self.values[row_s + i]
+                for j, value in enumerate(row):
+                    while len(target) <= col_s + j:
+                        target.append('')
+                    target[col_s + j] = _cell(value)
+        self.spreadsheet.touch()
+
+    @property
+    def row_count(self) -> int:
+        return len(self.values)
+
+    def get_values(self, range_name: Optional[str] = None, major_dimension: Optional[str] = None, **kwargs):
+        """Как gspread: строки дополняются пустыми значениями до прямоугольника."""
+        self._api('get_values')
+        rows = self._read(range_name, major_dimension)
+        width = max((len(row) for row in rows), default=0)
+        return [row + [''] * (width - len(row)) for row in rows]
+
+    def get_all_values(self, **kwargs) -> List[list]:
+        return self.get_values()
+
+    def get_all_records(self, head: int = 1, **kwargs) -> List[dict]:
+        self._api('get_all_records')
+        values = self._read()
+        if len(values) < head:
+            return []
+        header = values[head - 1]
+        return [dict(zip(header, row + [''] * (len(header) - len(row)))) for row in values[head:]]
+
+    def col_values(self, col: int, **kwargs) -> List[Optional[str]]:
+        self._api('col_values')
+        with self._lock:
+            column = [row[col - 1] if col - 1 < len(row) else '' for row in self.values]
+        while column and column[-1] == '':
+            column.pop()
+        return [value if value != '' else None for value in column]
+
+    def batch_get(self, ranges: Sequence[str], major_dimension: Optional[str] = None, **kwargs) -> List[ValueRange]:
+        self._api('batch_get')
+        return [
+            ValueRange.from_json({'range': f"'{self.title}'!{name}", 'majorDimension': major_dimension or 'ROWS',
+                                  'values': self._read(name, major_dimension)})
+            for name in ranges
+        ]
+
+    def batch_update(self, data: Sequence[dict], **kwargs) -> dict:
+        self._api('batch_update')
+        for item in data:
+            self._write(item['range'], item['values'])
+        return {'spreadsheetId': self.spreadsheet.id, 'totalUpdatedRows': sum(len(i['values']) for i in data)}
+
+    def update(self, range_name: str = 'A1', values: Sequence[Sequence[Any]] = (), **kwargs) -> dict:
+        self._api('update')
+        self._write(range_name, values)
+        return {'spreadsheetId': self.spreadsheet.id, 'updatedRows': len(values)}
+
+    def append_rows(self, values: Sequence[Sequence[Any]], **kwargs) -> dict:
+        self._api('append_rows')
+        with self._lock:
+            while self.values and not any(self.values[-1]):
+                self.values.pop()
+            start = len(self.values) + 1
+            self.values.extend([_cell(value) for value in row] for row in values)
+        self.spreadsheet.touch()
+        return {'updates': {'updatedRange': f"'{self.title}'!{rowcol_to_a1(start, 1)}", 'updatedRows': len(values)}}
+
+    def append_row(self, values: Sequence[Any], **kwargs) -> dict:
+        return self.append_rows([values], **kwargs)
+
+    def clear(self) -> None:
+        self._api('clear')
+        with self._lock:
+            self.values = []
+        self.spreadsheet.touch()
+
+
+class FakeSpreadsheet:
+    """Книга с интерфейсом gspread.Spreadsheet."""
+
+    def __init__(self, book_id: str, faults: Faults, title: Optional[str] = None):
+        self.id = book_id
+        self.title = title or book_id
+        self.faults = faults
+        self.sheets: Dict[str, FakeWorksheet] = {}
+        self.modified = _timestamp()
+
+    def touch(self) -> None:
+        """Обновить modifiedTime книги, как Drive после правки листа."""
+        self.modified = _timestamp()
+
+    def add(self, title: str, values: Sequence[Sequence[Any]] = ()) -> FakeWorksheet:
+        """Создать или заменить лист title со значениями values (первая строка - заголовки)."""
+        self.sheets[title] = FakeWorksheet(self, title, values)
+        self.touch()
+        return self.sheets[title]
+
+    @property
+    def sheet1(self) -> FakeWorksheet:
+        return next(iter(self.sheets.values()))
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        status = self.faults('sheets.worksheet')
+        if status is not None:
+            raise api_error(status)
+        if title not in self.sheets:
+            raise WorksheetNotFound(title)
+        return self.sheets[title]
+
+    def worksheets(self, **kwargs) -> List[FakeWorksheet]:
+        return list(self.sheets.values())
+
+    def values_batch_get(self, ranges: Sequence[str], params: Optional[dict] = None) -> dict:
+        status = self.faults('sheets.values_batch_get')
+        if status is not None:
+            raise api_error(status)
+        major_dimension = (params or {}).get('majorDimension')
+        value_ranges = []
+        for name in ranges:
+            title, _, cells = name.rpartition('!')
+            title = title.strip("'") or self.sheet1.title
+            if title not in self.sheets:
+                raise api_error(400, f'Unable to parse range: {name}')
+            values = self.sheets[title]._read(cells or None, major_dimension)
+            value_ranges.append({'range': name, 'majorDimension': major_dimension or 'ROWS', 'values': values})
+        return {'spreadsheetId': self.id, 'valueRanges': value_ranges}
+
+
+class FakeClient:
+    """Клиент с интерфейсом gspread.Client."""
+
+    def __init__(self, faults: Faults):
+        self.faults = faults
+        self.books: Dict[str, FakeSpreadsheet] = {}
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        status = self.faults('sheets.open_by_key')
+        if status is not None:
+            raise api_error(status)
+        if key not in self.books:
+            raise SpreadsheetNotFound(key)
+        return self.books[key]
+
+
+class FakeClientManager(QuotaClientManager):
+    """QuotaClientManager, который вместо авторизации в Google отдаёт FakeClient."""
+
+    def __init__(self, client: FakeClient):
+        super().__init__(lambda: None)
+        self.fake_client = client
+        self._fake_agc = None
+
+    async def _authorize(self):
+        if self._fake_agc is None:
+            from gspread_asyncio import AsyncioGspreadClient
+            self._fake_agc = AsyncioGspreadClient(self, self.fake_client)
+        return self._fake_agc
+
+
+class FakeCredentials:
+    """Реквизиты, которые всегда действительны."""
+    valid = True
+    token = 'fake-token'
+
+    def refresh(self, request) -> None:
+        pass
+
+
+class _Request:
+    """Запрос googleapiclient: execute() и next_chunk() для загрузки."""
+
+    def __init__(self, drive: 'FakeDrive', name: str, fn: Callable[[], Any]):
+        self.drive = drive
+        self.name = name
+        self.fn = fn
+
+    def execute(self, num_retries: int = 0) -> Any:
+        status = self.drive.faults(f'drive.{self.name}')
+        if status is not None:
+            raise http_error(status, self.name, 'rateLimitExceeded' if status in (403, 429) else '')
+        return self.fn()
+
+    def next_chunk(self, num_retries: int = 0) -> tuple:
+        return None, self.execute()
+
+
+class _Batch:
+    """BatchHttpRequest: одна проверка ошибок на batch, результаты через callback."""
+
+    def __init__(self, drive: 'FakeDrive', callback: Optional[Callable] = None):
+        self.drive = drive
+        self.callback = callback
+        self.requests: List[tuple] = []
+
+    def add(self, request: _Request, callback: Optional[Callable] = None, request_id: Optional[str] = None) -> None:
+        self.requests.append((request_id or str(len(self.requests)), request, callback or self.callback))
+
+    def execute(self) -> None:
+        status = self.drive.faults('drive.batch')
+        if status is not None:
+            raise http_error(status, 'batch')
+        for request_id, request, callback in self.requests:
+            try:
+                response, exception = request.fn(), None
+            except HttpError as ex:
+                response, exception = None, ex
+            if callback is not None:
+                callback(request_id, response, exception)
+
+
+class _Files:
+
+    def __init__(self, drive: 'FakeDrive'):
+        self.drive = drive
+
+    def create(self, body: dict, media_body: Any = None, fields: Optional[str] = None) -> _Request:
+        def create():
+            data = media_body.getbytes(0, media_body.size()) if media_body is not None else b''
+            return {'id': self.drive.add(body.get('name', ''), body.get('mimeType', ''),
+                                         (body.get('parents') or [''])[0], data)}
+        return _Request(self.drive, 'create', create)
+
+    def list(self, q: str = '', pageSize: int = 100, pageToken: Optional[str] = None,
+             fields: Optional[str] = None, **kwargs) -> _Request:
+        def list_():
+            files = self.drive.query(q)
+            start = int(pageToken or 0)
+            page = files[start:start + pageSize]
+            response = {'files': [{k: v for k, v in file.items() if k != 'data'} for file in page]}
+            if start + pageSize < len(files):
+                response['nextPageToken'] = str(start + pageSize)
+            return response
+        return _Request(self.drive, 'list', list_)
+
+    def get(self, fileId: str, fields: Optional[str] = None, **kwargs) -> _Request:
+        def get():
+            if fileId in self.drive.books:
+                return {'id': fileId, 'modifiedTime': self.drive.books[fileId].modified}
+            with self.drive.lock:
+                file = self.drive.items.get(fileId)
+            if file is None:
+                raise http_error(404, f'File not found: {fileId}', 'notFound')
+            return {k: v for k, v in file.items() if k != 'data'}
+        return _Request(self.drive, 'get', get)
+
+    def delete(self, fileId: str, **kwargs) -> _Request:
+        def delete():
+            with self.drive.lock:
+                if self.drive.items.pop(fileId, None) is None:
+                    raise http_error(404, f'File not found: {fileId}', 'notFound')
+            return ''
+        return _Request(self.drive, 'delete', delete)
+
+
+class FakeDrive:
+    """Сервис с интерфейсом googleapiclient drive v3 (files(), new_batch_http_request())."""
+
+    _QUERY = re.compile(
+        r"'(?P<parent>[^']+)' in parents"
+        r"|mimeType contains '(?P<mime>[^']+)'"
+        r"|createdTime < '(?P<created>[^']+)'"
+        r"|trashed = (?P<trashed>true|false)"
+    )
+
+    def __init__(self, faults: Faults, books: Optional[Dict[str, FakeSpreadsheet]] = None):
+        self.faults = faults
+        self.items: Dict[str, dict] = {}
+        self.books = books if books is not None else {}
+        self.lock = threading.Lock()
+
+    def add(self, name: str, mime_type: str = 'image/png', parent: str = '', data: bytes = b'',
+            created: Optional[datetime] = None) -> str:
+        """Положить файл в папку parent, возвращает id."""
+        file_id = uuid.uuid4().hex
+        created = (created or datetime.now(timezone.utc)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        with self.lock:
+            self.items[file_id] = {'id': file_id, 'name': name, 'mimeType': mime_type, 'parents': [parent],
+                                   'createdTime': created, 'modifiedTime': created, 'size': str(len(data)),
+                                   'data': data}
+        return file_id
+
+    def query(self, q: str) -> List[dict]:
+        """Файлы по запросу Drive (parents, mimeType contains, createdTime <, trashed)."""
+        with self.lock:
+            files = list(self.items.values())
+        for match in self._QUERY.finditer(q or ''):
+            if match['parent']:
+                files = [f for f in files if match['parent'] in f['parents']]
+            elif match['mime']:
+                files = [f for f in files if match['mime'] in f['mimeType']]
+            elif match['created']:
+                files = [f for f in files if f['createdTime'] < match['created']]
+        return files
+
+    def files(self) -> _Files:
+        return _Files(self)
+
+    def new_batch_http_request(self, callback: Optional[Callable] = None) -> _Batch:
+        return _Batch(self, callback)
+
+
+class FakeGoogle:
+    """Подмена Sheets и Drive целиком, ставится через install() или with."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 429, seed: Optional[int] = None):
+        self.faults = Faults(latency, jitter, error_rate, error_status, seed)
+        self.client = FakeClient(self.faults)
+        self.drive = FakeDrive(self.faults, self.client.books)
+
+    def book(self, book_id: str, title: Optional[str] = None) -> FakeSpreadsheet:
+        """Книга book_id, создаётся при первом обращении."""
+        if book_id not in self.client.books:
+            self.client.books[book_id] = FakeSpreadsheet(book_id, self.faults, title)
+        return self.client.books[book_id]
+
+    def install(self) -> 'FakeGoogle':
+        GoogleSheetAsyncClient.use(FakeClientManager(self.client))
+        google_drive.override(service=self.drive, credentials=FakeCredentials())
+        for snapshot in Snapshot.registry.values():
+            snapshot.invalidate()
+        return self
+
+    def uninstall(self) -> None:
+        GoogleSheetAsyncClient.use(None)
+        google_drive.override()
+        for snapshot in Snapshot.registry.values():
+            snapshot.invalidate()
+
+    def __enter__(self) -> 'FakeGoogle':
+        return self.install()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _cell(value: Any) -> str:
+    return '' if value is None else str(value)
+
+
+def _names(count: int, rnd: random.Random) -> List[str]:
+    return [
+        f'{"".join(rnd.choices(string.ascii_uppercase, k=1))}{"".join(rnd.choices(string.ascii_lowercase, k=7))} '
+        f'{"".join(rnd.choices(string.ascii_uppercase, k=1))}{"".join(rnd.choices(string.ascii_lowercase, k=5))}'
+        for _ in range(count)
+    ]
+
+
+def exits_values(rows: int, start: Optional[date] = None, points: Sequence[str] = ('Балашиха', 'Ногинск'),
+                 employees: int = 40, extra_columns: int = 3, seed: int = 0) -> List[List[str]]:
+    """Синтетический график выходов: заголовки SCHEDULE_COLUMNS и rows строк.
+
+    Даты идут подряд от start, примерно 20 смен в день. По умолчанию start - rows // 40 дней назад,
+    так что половина графика приходится на сегодня и следующие дни.
+
+    :param rows: кол-во смен
+    :param start: (optional) первая дата
+    :param points: точки
+    :param employees: кол-во сотрудников
+    :param extra_columns: лишние столбцы, которые сервис должен пропускать
+    :param seed: seed для воспроизводимости
+    """
+    rnd = random.Random(seed)
+    start = start or date.today() - timedelta(days=rows // 40)
+    staff = [(name, str(10 ** 8 + i)) for i, name in enumerate(_names(employees, rnd))]
+    header = list(SCHEDULE_COLUMNS) + [f'Доп {i}' for i in range(extra_columns)]
+    values = [header]
+    for i in range(rows):
+        name, chat_id = rnd.choice(staff)
+        day = start + timedelta(days=i // 20)
+        values.append([day.strftime('%d.%m.%Y'), name, rnd.choice(points), rnd.choice(('8', '12')), chat_id]
+                      + [''] * extra_columns)
+    return values
+
+
+def write_off_values(rows: int, start: Optional[datetime] = None, employees: int = 20,
+                     seed: int = 0) -> List[List[str]]:
+    """Синтетический лист списаний с заголовками WRITE_OFF_COLUMNS.
+
+    :param rows: кол-во списаний
+    :param start: (optional) время первого списания
+    :param employees: кол-во сотрудников
+    :param seed: seed для воспроизводимости
+    """
+    rnd = random.Random(seed)
+    start = start or datetime.now() - timedelta(days=30)
+    staff = _names(employees, rnd)
+    values = [list(WRITE_OFF_COLUMNS)]
+    for i in range(rows):
+        moment = start + timedelta(minutes=i * 7)
+        file_id = uuid.UUID(int=rnd.getrandbits(128)).hex
+        values.append([moment.strftime('%Y-%m-%d %H:%M:%S'), str(10 ** 8 + i % employees), rnd.choice(staff),
+                       str(rnd.randint(1000, 9999)), '', str(rnd.randint(1, 5)),
+                       rnd.choice(('Брак', 'Просрочка', 'Реклама')), '',
+                       f'https://drive.google.com/file/d/{file_id}/view?usp=drivesdk', '', ''])
+    return values
+
+
+def image(size: int = 200_000) -> io.BytesIO:
+    """Поток с size байт, как BytesIO из bot.download_file."""
+    return io.BytesIO(b'\xff' * size)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Замер сервисного слоя Google на подмене benchmarks.google_fake, без сети и реквизитов.
+
+    python -m benchmarks.google_service --rows 20000 --latency 0.3 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+# id книг и листов нужны до импорта настроек, реальные значения из .env не используются
+for key, value in {
+    'BOOK_TABLE_ID': 'bench-table', 'SHEET_EXITS': 'exits',
+    'BOOK_WRITE_OFF_ID': 'bench-write-off', 'FOLDER_ID_PHOTO_SAVE': 'bench-photo',
+    'APPEND_SPOOL': os.path.join(tempfile.gettempdir(), 'bench_append_spool.db'),
+}.items():
+    os.environ[key] = value
+
+from benchmarks.google_fake import FakeGoogle, exits_values, image, write_off_values  # noqa: E402
+from core.config import settings  # noqa: E402
+from services import async_google_service as google  # noqa: E402
+from services.append_queue import append_queue  # noqa: E402
+from services.metrics import metrics  # noqa: E402
+
+gs = settings.gs
+
+
+async def measure(name: str, fn, repeat: int) -> None:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - started)
+    print(f'{name:<28} first={timings[0] * 1000:9.1f} ms  median={statistics.median(timings) * 1000:9.1f} ms')
+
+
+async def main(args: argparse.Namespace) -> None:
+    fake = FakeGoogle(latency=args.latency, jitter=args.latency / 2, error_rate=args.error_rate, seed=1)
+    fake.book(gs.BOOK_TABLE_ID).add(gs.SHEET_EXITS, exits_values(args.rows))
+    fake.book(gs.BOOK_WRITE_OFF_ID).add('Balashiha', write_off_values(args.rows // 4))
+    for i in range(args.files):
+        fake.drive.add(f'photo_{i}', 'image/png', gs.FOLDER_ID_PHOTO_SAVE)
+
+    with fake:
+        await measure('google_exits (today)', google.google_exits, args.repeat)
+        await measure('google_exits (month, boss)', lambda: google.google_exits(30, boss=True), args.repeat)
+        await measure('google_exits_by_point', lambda: google.google_exits_by_point('Балашиха', 0, 7), args.repeat)
+        await measure('google_write_off', lambda: google.google_write_off('Balashiha', ['Дата', 'Сотрудник']),
+                      args.repeat)
+
+        async def add_rows():
+            await asyncio.gather(*(google.google_add_row(gs.BOOK_WRITE_OFF_ID, 'Balashiha', ['x'] * 11)
+                                   for _ in range(args.burst)))
+            await append_queue.flush()
+
+        await measure(f'google_add_row x{args.burst}', add_rows, 1)
+        await measure('google_save_file', lambda: google.google_save_file('bench', source=image()), args.repeat)
+        await measure(f'google_clear_folder ({args.files})',
+                      lambda: google.google_clear_folder(gs.FOLDER_ID_PHOTO_SAVE), 1)
+        await append_queue.stop()
+
+    print('\nAPI calls:', fake.faults.calls)
+    print(metrics.report())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20_000, help='строк в графике выходов')
+    parser.add_argument('--files', type=int, default=1_000, help='фото в папке списаний')
+    parser.add_argument('--burst', type=int, default=100, help='одновременных google_add_row')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2, help='задержка вызова API, сек.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля вызовов с ошибкой 429')
+    asyncio.run(main(parser.parse_args()))
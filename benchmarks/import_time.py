@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Отчёт о времени импорта бота и проверка бюджета для CI.
+
+Запускает ``python -X importtime -c "import <module>"`` в отдельном процессе, печатает
+самые тяжёлые модули и цепочку импорта каждого модуля из списка ленивых. Код возврата 1,
+если ленивый модуль загрузился при старте или общее время импорта больше бюджета.
+
+    python -m benchmarks.import_time --module bot --budget 1.0
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# нужны только отдельным действиям админа и загружаются при первом обращении
+LAZY = (
+    'pandas',
+    'googleapiclient.discovery',
+    'gspread',
+    'gspread_asyncio',
+    'google.oauth2.service_account',
+    'alive_progress',
+    'pprintpp',
+    'pytils',
+)
+
+
+@dataclass
+class Node:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+    parent: Optional['Node'] = None
+    children: List['Node'] = field(default_factory=list)
+
+    @property
+    def chain(self) -> str:
+        names, node = [], self
+        while node is not None:
+            names.append(node.name)
+            node = node.parent
+        return ' <- '.join(names)
+
+
+def parse(stderr: str) -> List[Node]:
+    """Модули из вывода -X importtime в порядке импорта, с родителями."""
+    nodes, stack = [], []
+    # importtime печатает модуль после всех его зависимостей, поэтому родитель - следующий менее вложенный
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = (part for part in line[len('import time:'):].split('|'))
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        node = Node(name.strip(), int(self_us), int(cumulative_us), depth)
+        while stack and stack[-1].depth > depth:
+            child = stack.pop()
+            child.parent = node
+            node.children.append(child)
+        stack.append(node)
+        nodes.append(node)
+    return nodes
+
+
+def main(args: argparse.Namespace) -> int:
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {args.module}'],
+                            cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    nodes = parse(result.stderr)
+    if result.returncode:
+        print(result.stderr.splitlines()[-1] if result.stderr else 'import failed', file=sys.stderr)
+        return result.returncode
+
+    roots = [node for node in nodes if node.parent is None]
+    total = sum(node.cumulative_us for node in roots) / 1e6
+    print(f'import {args.module}: {total:.3f} s in imports, {wall:.3f} s wall (with interpreter start)\n')
+
+    print(f'{"cumulative":>12} {"self":>10}  module')
+    for node in sorted(nodes, key=lambda n: n.cumulative_us, reverse=True)[:args.top]:
+        print(f'{node.cumulative_us / 1e3:10.1f}ms {node.self_us / 1e3:8.1f}ms  {"  " * node.depth}{node.name}')
+
+    failed = False
+    loaded = [node for node in nodes if node.name in args.lazy]
+    if loaded:
+        failed = True
+        print('\nЛенивые модули загружены при старте:')
+        for node in loaded:
+            print(f'  {node.cumulative_us / 1e3:8.1f}ms  {node.chain}')
+
+    if args.budget and total > args.budget:
+        failed = True
+        print(f'\nБюджет превышен: {total:.3f} s > {args.budget:.3f} s')
+    return int(failed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='bot', help='что импортировать')
+    parser.add_argument('--budget', type=float, default=0.0, help='допустимое время импорта, сек. (0 - не проверять)')
+    parser.add_argument('--top', type=int, default=25, help='сколько самых тяжёлых модулей показать')
+    parser.add_argument('--lazy', nargs='*', default=LAZY, help='модули, которые не должны грузиться при старте')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Замер плановых рассылок и рассылки новостей без телеграм, Google и Postgres.
+
+Под ``core.bot.bot`` ставится подменная сессия aiogram: запросы не уходят в сеть, а ждут
+latency секунд, часть из них отвечает ``TelegramRetryAfter``, часть получателей
+заблокировали бота (``TelegramForbiddenError``). Сотрудники создаются в отдельной базе
+SQLite, график выходов отдаёт ``benchmarks.google_fake``, часы рассылок закреплены на
+понедельник, поэтому каждая задача шлёт сообщения. Для каждой рассылки печатаются
+сообщений в секунду, p50/p99 доставки сообщения (с ожиданием лимитов и повторами) и пик
+памяти Python (tracemalloc). Код возврата 1, если скорость ниже --min-rate.
+
+    python -m benchmarks.mailings --users 500 5000 50000 --latency 0.05 --min-rate 200
+
+По умолчанию лимит бота снят (--rate 0), чтобы мерить сам конвейер; с --rate 25
+замеряется реальная длительность рассылки.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+# база, книги и листы нужны до импорта настроек, реальные значения из .env не используются
+DB_FILE = os.path.join(tempfile.gettempdir(), 'bench_mailings.db')
+for key, value in {
+    'USE_SQLITE': 'true', 'USE_REDIS': 'false', 'URL_SQLITE': f'sqlite+aiosqlite:///{DB_FILE}',
+    'BOOK_TABLE_ID': 'bench-table', 'SHEET_EXITS': 'exits',
+    'APPEND_SPOOL': os.path.join(tempfile.gettempdir(), 'bench_append_spool.db'),
+}.items():
+    os.environ[key] = value
+
+import pytz  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from benchmarks.google_fake import FakeGoogle  # noqa: E402
+from core.bot import bot  # noqa: E402
+from core.config import settings  # noqa: E402
+from database import async_engine, async_session_factory  # noqa: E402
+from database.models import User  # noqa: E402
+from database.tabels import create_db  # noqa: E402
+from hendlers.mailings import mailing  # noqa: E402
+from services import async_google_service, delivery_log, render  # noqa: E402
+from services.broadcast import broadcaster  # noqa: E402
+from services.schedule import SCHEDULE_COLUMNS  # noqa: E402
+from utils import utils  # noqa: E402
+
+gs = settings.gs
+tg = settings.bot
+
+POINTS = ('Балашиха', 'Ногинск', 'Электросталь')
+POSITIONS = ('Бариста', 'Ст. бариста', 'Кассир', 'Супервайзер')
+# модули, которые берут текущее время через get_current_datetime
+CLOCK_MODULES = (utils, mailing, async_google_service, delivery_log, render)
+
+
+class FakeSession(BaseSession):
+    """Сессия aiogram без сети: задержка, flood control и заблокировавшие бота."""
+
+    def __init__(self, latency: float, retry_after: float, retry_after_rate: float, blocked_rate: float,
+                 seed: int = 0):
+        """
+        :param latency: задержка ответа, сек.
+        :param retry_after: retry_after в ответах flood control, сек.
+        :param retry_after_rate: доля запросов с TelegramRetryAfter
+        :param blocked_rate: доля получателей, которые заблокировали бота
+        :param seed: seed для воспроизводимости
+        """
+        super().__init__()
+        self.latency = latency
+        self.retry_after = retry_after
+        self.retry_after_rate = retry_after_rate
+        self.blocked_rate = blocked_rate
+        self.seed = seed
+        self.rnd = random.Random(seed)
+        self.calls: Dict[str, int] = {}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency * (0.5 + self.rnd.random()))
+        if self.rnd.random() < self.retry_after_rate:
+            raise TelegramRetryAfter(method=method, message='Too Many Requests', retry_after=self.retry_after)
+        # один и тот же получатель блокирует бота во всех рассылках
+        chat_id = getattr(method, 'chat_id', 0)
+        if random.Random(f'{self.seed}:{chat_id}').random() < self.blocked_rate:
+            raise TelegramForbiddenError(method=method, message='Forbidden: bot was blocked by the user')
+        return None
+
+    async def stream_content(self, *args, **kwargs) -> AsyncGenerator[bytes, None]:
+        """Рассылки файлы не скачивают, поток пустой."""
+        for chunk in ():
+            yield chunk
+
+    async def close(self) -> None:
+        pass
+
+
+def pin_clock(moment: datetime) -> None:
+    """Закрепить get_current_datetime на moment (смещения days, hours, minutes учитываются)."""
+
+    def now(days: int = 0, hours: int = 0, minutes: int = 0, tz: str = 'Europe/Moscow') -> datetime:
+        return moment + timedelta(days=days, hours=hours, minutes=minutes)
+
+    for module in CLOCK_MODULES:
+        module.get_current_datetime = now
+
+
+def last_monday(hour: int) -> datetime:
+    tz = pytz.timezone('Europe/Moscow')
+    today = datetime.now(tz).replace(hour=hour, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=today.weekday())
+
+
+async def seed_users(users: int) -> List[Dict[str, Any]]:
+    """Пустая база с users активными сотрудниками."""
+    # соединения пула держат открытым удаляемый файл, новая база должна открываться заново
+    await async_engine.dispose()
+    if os.path.exists(DB_FILE):
+        os.remove(DB_FILE)
+    await create_db()
+    rows = [{
+        'user_id': 10 ** 9 + i,
+        'first_name': f'Имя{i}',
+        'last_name': f'Фамилия{i}',
+        'point': POINTS[i % len(POINTS)],
+        'position': POSITIONS[i % len(POSITIONS)],
+        'status': True,
+    } for i in range(users)]
+    async with async_session_factory() as session:
+        for start in range(0, len(rows), 5_000):
+            await session.execute(insert(User), rows[start:start + 5_000])
+        await session.commit()
+    return rows
+
+
+def schedule_values(rows: List[Dict[str, Any]], day: datetime, on_shift: float, seed: int = 0) -> List[List[str]]:
+    """График выходов: доля on_shift сотрудников в смене в day и на следующий день."""
+    rnd = random.Random(seed)
+    values = [list(SCHEDULE_COLUMNS)]
+    for offset in (0, 1):
+        date = (day + timedelta(days=offset)).strftime('%d.%m.%Y')
+        for row in rows:
+            if rnd.random() < on_shift:
+                values.append([date, f"{row['last_name']} {row['first_name']}", row['point'], '12',
+                               str(row['user_id'])])
+    return values
+
+
+async def measure(name: str, run: Callable[[], Awaitable], session: FakeSession,
+                  samples: List[float]) -> float:
+    """Запуск рассылки, печатает скорость, задержки и пик памяти, возвращает сообщений в секунду."""
+    samples.clear()
+    calls = sum(session.calls.values())
+    tracemalloc.start()
+    started = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sent = sum(session.calls.values()) - calls
+    rate = sent / elapsed if elapsed else 0.0
+    p50 = statistics.median(samples) if samples else 0.0
+    p99 = statistics.quantiles(samples, n=100)[98] if len(samples) > 1 else p50
+    print(f'{name:<26} requests={sent:>7}  {elapsed:8.2f} s  {rate:9.0f} msg/s  '
+          f'p50={p50 * 1000:8.1f} ms  p99={p99 * 1000:8.1f} ms  peak={peak / 2 ** 20:7.1f} MiB')
+    return rate
+
+
+def timed_deliveries(samples: List[float]) -> None:
+    """Время доставки каждого сообщения рассылки: лимиты, паузы flood control, повторы и запрос."""
+    deliver = broadcaster._deliver
+
+    async def timed(chat_id, send, stats):
+        started = time.perf_counter()
+        try:
+            return await deliver(chat_id, send, stats)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    broadcaster._deliver = timed
+
+
+async def bench(users: int, args: argparse.Namespace, session: FakeSession, samples: List[float]) -> List[float]:
+    rows = await seed_users(users)
+    moment = last_monday(10)
+    fake = FakeGoogle(seed=1)
+    fake.book(gs.BOOK_TABLE_ID).add(gs.SHEET_EXITS, schedule_values(rows, moment, args.on_shift))
+    chat_ids = [row['user_id'] for row in rows]
+    header = f'📢 <b>News {moment.strftime("%d.%m.%y %H:%M")}</b>\n'
+
+    async def news_text():
+        await broadcaster.run('news', chat_ids, [partial(bot.send_message, text=f'{header}<em>текст</em>')])
+
+    async def news_video_note():
+        await broadcaster.run('news', chat_ids, [
+            partial(bot.send_message, text=f'{header}<em>просмотри видео сообщение 👇</em>'),
+            partial(bot.copy_message, from_chat_id=tg.MASTER or 1, message_id=1),
+        ])
+
+    jobs = (
+        ('reminder_order', 10, mailing.send_reminder_order),
+        ('coffee_machine', 10, mailing.send_reminder_coffee_machine),
+        ('check_up', 21, mailing.send_check_up),
+        ('comes_out', 22, mailing.send_comes_out),
+        ('news (text)', 12, news_text),
+        ('news (video note)', 13, news_video_note),
+    )
+    print(f'\nusers={users}')
+    rates = []
+    with fake:
+        for name, hour, run in jobs:
+            pin_clock(moment.replace(hour=hour))
+            # снимок графика общий на процесс, у каждого прогона свой
+            async_google_service.schedule.invalidate()
+            rates.append(await measure(name, run, session, samples))
+    return rates
+
+
+async def main(args: argparse.Namespace) -> int:
+    session = FakeSession(latency=args.latency, retry_after=args.retry_after_seconds,
+                          retry_after_rate=args.retry_after, blocked_rate=args.blocked)
+    bot.session = session
+    broadcaster.__init__(rate=args.rate or 10 ** 9, chat_interval=args.chat_interval,
+                         concurrency=args.concurrency, retries=tg.BROADCAST_RETRIES,
+                         retry_rounds=tg.BROADCAST_RETRY_ROUNDS, retry_delay=0.0)
+    samples: List[float] = []
+    timed_deliveries(samples)
+
+    rates = []
+    for users in args.users:
+        rates += await bench(users, args, session, samples)
+
+    print('\nAPI calls:', session.calls)
+    slowest = min(rates, default=0.0)
+    if args.min_rate and slowest < args.min_rate:
+        print(f'FAIL: {slowest:.0f} msg/s < {args.min_rate:.0f} msg/s')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[500, 5_000], help='сотрудников в базе')
+    parser.add_argument('--on-shift', type=float, default=0.3, help='доля сотрудников в смене по графику')
+    parser.add_argument('--latency', type=float, default=0.05, help='задержка ответа телеграм, сек.')
+    parser.add_argument('--retry-after', type=float, default=0.001, help='доля запросов с TelegramRetryAfter')
+    parser.add_argument('--retry-after-seconds', type=float, default=0.1, help='retry_after в ответе, сек.')
+    parser.add_argument('--blocked', type=float, default=0.02, help='доля заблокировавших бота')
+    parser.add_argument('--rate', type=float, default=0.0, help='лимит бота, сообщений в секунду, 0 - без лимита')
+    parser.add_argument('--chat-interval', type=float, default=0.0, help='интервал между сообщениями в чат, сек.')
+    parser.add_argument('--concurrency', type=int, default=tg.BROADCAST_CONCURRENCY, help='одновременных отправок')
+    parser.add_argument('--min-rate', type=float, default=0.0, help='минимум сообщений в секунду для CI')
+    sys.exit(asyncio.run(main(parser.parse_args())))
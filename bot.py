@@ -23,11 +23,16 @@ from core.bot import bot
 from database import create_db, async_session_factory
 
 from commands.commands import commands_admin
-from hendlers.mailings import mailing
+from hendlers.admin.mailings import resume_news_mailings
+from hendlers.mailings.jobs import schedule_jobs
 
 from structures.mw_data_structure import TransferData
 
 from services.logging_configurate import logging_configurate
+from services.async_google_service import GoogleSheetAsyncClient
+from services import background
+from services.append_queue import append_queue
+from services.sheet_watcher import sheet_watcher
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pytils")
 
@@ -64,6 +69,12 @@ async def on_startup(bot):
     # await drop_db()
     await create_db()
 
+    GoogleSheetAsyncClient.manager()
+    await append_queue.start()
+    if sheet_watcher.interval:
+        background.spawn(sheet_watcher.run(), name='sheet-watcher')
+    await resume_news_mailings()
+
     scheduler = AsyncIOScheduler(timezone='Europe/Moscow')
 
     if settings.use_redis:
@@ -81,26 +92,14 @@ async def on_startup(bot):
             AsyncIOScheduler(timezone='Europe/Moscow', jobstores=job_stores))
         scheduler.ctx.add_instance(bot, declared_class=Bot)
 
-    scheduler.add_job(mailing.write_off_coffee, trigger='cron', day_of_week='mon', hour=8)
-    scheduler.add_job(mailing.send_reminder_order, trigger='cron', day_of_week='mon', hour=10)
-    scheduler.add_job(mailing.send_reminder_order, trigger='cron', day_of_week='tue', hour=10)
-    scheduler.add_job(mailing.send_reminder_order, trigger='cron', day_of_week='sun', hour=9, minute=30)
-    scheduler.add_job(mailing.send_reminder_coffee_machine, trigger='cron', day_of_week='mon', hour=10)
-    scheduler.add_job(mailing.send_reminder_coffee_machine, trigger='cron', day_of_week='mon', hour=21)
-    scheduler.add_job(mailing.revenue_by_day, trigger='cron', hour=0, minute=30, kwargs={'user_id': None})
-    # scheduler.add_job(mailing.not_send_evening_reports, trigger='cron', hour=3)
-    scheduler.add_job(mailing.safe, trigger='cron', hour=9)
-    scheduler.add_job(mailing.send_check_up, trigger='cron', hour=10)
-    # scheduler.add_job(mailing.not_send_morning_reports, trigger='cron', hour=13)
-    scheduler.add_job(mailing.send_check_up, trigger='cron', hour=21)
-    scheduler.add_job(mailing.send_comes_out, trigger='cron', hour=22)
-
     # scheduler.add_job(mailing.update_supervisor_check_report, trigger='interval', hours=1)
     scheduler.start()
+    schedule_jobs(scheduler)
 
 
 async def on_shutdown():
-    ...
+    await background.shutdown()
+    await append_queue.stop()
     # logging.error(f"'{await bot.get_me().first_name}' stopped")
 
 
@@ -1,3 +1,4 @@
 from .adapter import Cache
+from .lock import LeaseLock
 
-__all__ = ('Cache',)
+__all__ = ('Cache', 'LeaseLock')
@@ -0,0 +1,119 @@
+""" This file contains the redis lease lock which lets one bot replica own a task """
+import asyncio
+import logging
+import uuid
+from typing import Callable, Optional
+
+from redis.asyncio.client import Redis
+
+# Extend the lease only while the key still holds our owner value
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Release the lease only while the key still holds our owner value,
+# with a positive keep the key stays for keep ms so late replicas still see it taken
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return redis.call('del', KEYS[1])
+"""
+
+
+class LeaseLock:
+    """
+    Lock on a redis key which expires unless its owner keeps renewing it.
+
+    The lease is taken with ``SET NX PX`` and a random owner value, renewed in the
+    background every ttl / 3 seconds and released only by its owner, so a crashed
+    replica frees the lock after ttl and never removes a lock taken by another one.
+    Every successful acquire gets a fencing token from ``INCR`` on ``<fence_key>``:
+    tokens only grow, so a side effect stamped with a token older than the last one
+    seen comes from an owner which has already lost the lease. The lock does not check
+    tokens itself: pass ``(fence_key, token)`` to the storage that must reject stale
+    writes (e.g. ``MailingDeliveryRepo.add_many``). Set ``on_lost`` to stop the guarded
+    work (e.g. ``task.cancel``) as soon as a renewal finds the lease gone.
+
+    Usage::
+
+        async with LeaseLock(redis, 'job:safe:2024-05-01T09:00', ttl=60) as lock:
+            if lock.acquired:
+                ...
+    """
+
+    def __init__(self, redis: Redis, key: str, ttl: float, fence_key: Optional[str] = None, keep: float = 0):
+        """
+        :param redis: Redis client
+        :param key: Key of the locked resource
+        :param ttl: Lease time in seconds, the lock is lost if not renewed during it
+        :param fence_key: (Optional) Key of the fencing counter, `<key>:fence` by default
+        :param keep: (Optional) Seconds the key stays taken after release, 0 - delete at once
+        """
+        self.redis = redis
+        self.key = key
+        self.ttl = ttl
+        self.fence_key = fence_key or f"{key}:fence"
+        self.keep = keep
+
+        self.owner = uuid.uuid4().hex
+        self.token: Optional[int] = None
+        self.acquired = False
+        self.lost = False
+        # Called once when the lease is lost
+        self.on_lost: Optional[Callable[[], object]] = None
+        self._renewer: Optional[asyncio.Task] = None
+
+    async def acquire(self) -> bool:
+        """
+        Try to take the lease once, without waiting
+        :return: Whether the lease was taken
+        """
+        self.acquired = bool(await self.redis.set(self.key, self.owner, nx=True, px=int(self.ttl * 1000)))
+        if self.acquired:
+            self.token = int(await self.redis.incr(self.fence_key))
+            self._renewer = asyncio.create_task(self._renew(), name=f"lease:{self.key}")
+        return self.acquired
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                renewed = await self.redis.eval(RENEW_SCRIPT, 1, self.key, self.owner, int(self.ttl * 1000))
+            except Exception as ex:
+                # The lease is still valid until ttl passes, try again on the next tick
+                logging.warning("Lease %s: renew failed: %r", self.key, ex)
+                continue
+            if not renewed:
+                self.lost = True
+                logging.error("Lease %s: lost, token %s is stale", self.key, self.token)
+                if self.on_lost is not None:
+                    self.on_lost()
+                return
+
+    async def release(self) -> None:
+        """Stop renewing and release the lease if it is still ours"""
+        if self._renewer is not None:
+            self._renewer.cancel()
+            self._renewer = None
+        if not self.acquired:
+            return
+        self.acquired = False
+        try:
+            await self.redis.eval(RELEASE_SCRIPT, 1, self.key, self.owner, int(self.keep * 1000))
+        except Exception as ex:
+            # The key expires by itself after ttl
+            logging.warning("Lease %s: release failed: %r", self.key, ex)
+
+    async def __aenter__(self) -> "LeaseLock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.release()
@@ -0,0 +1,130 @@
+""" This file contains the in-process snapshot cache for sheet-backed data """
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, ClassVar, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Snapshot(Generic[T]):
+    """
+    Parsed copy of remote data which is reloaded at most once per TTL.
+
+    Concurrent readers of a stale snapshot wait for a single reload instead of
+    each going to the network. Every snapshot is registered by name, so it can
+    be invalidated or pre-loaded without importing the module which owns it.
+    """
+
+    registry: ClassVar[Dict[str, "Snapshot"]] = {}
+
+    def __init__(
+            self,
+            name: str,
+            loader: Callable[[], Awaitable[T]],
+            ttl: float,
+            book_id: Optional[str] = None,
+            sheet_name: Optional[str] = None,
+    ):
+        """
+        :param name: Unique snapshot name
+        :param loader: Coroutine function which fetches and parses the data
+        :param ttl: Seconds during which the loaded value is served as is
+        :param book_id: (Optional) Google book the data is read from
+        :param sheet_name: (Optional) Sheet of the book the data is read from
+        """
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.book_id = book_id
+        self.sheet_name = sheet_name
+
+        self._value: Optional[T] = None
+        self._loaded_at: Optional[float] = None
+        self._fetched_at: Optional[float] = None
+        self._held_until: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+        Snapshot.registry[name] = self
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the loaded value is still inside its TTL or held"""
+        if self._loaded_at is None:
+            return False
+        now = time.monotonic()
+        return now - self._loaded_at < self.ttl or (self._held_until is not None and now < self._held_until)
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the value was loaded or its TTL restarted by touch(), None if not loaded"""
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    async def get(self) -> T:
+        """
+        Get the value, reloading it if the TTL has passed
+        :return: Loaded value
+        """
+        if self.fresh:
+            return self._value
+        async with self._lock:
+            if self.fresh:
+                return self._value
+            return await self._load()
+
+    async def refresh(self) -> T:
+        """
+        Reload the value regardless of the TTL
+        :return: Loaded value
+        """
+        async with self._lock:
+            return await self._load()
+
+    def invalidate(self) -> None:
+        """Mark the value as stale, the next get() reloads it"""
+        self._loaded_at = None
+        self._fetched_at = None
+        self._held_until = None
+
+    def touch(self, since: float) -> bool:
+        """
+        Restart the TTL if the value was fetched after `since`
+        :param since: time.monotonic() from which the source is known to be unchanged
+        :return: Whether the TTL was restarted
+        """
+        if self._fetched_at is None or self._fetched_at < since:
+            return False
+        self._loaded_at = time.monotonic()
+        return True
+
+    def hold(self, seconds: float) -> None:
+        """
+        Serve the loaded value for at least `seconds` from now even if the TTL is shorter,
+        until the next invalidate()
+        :param seconds: Hold time
+        """
+        self._held_until = time.monotonic() + seconds
+
+    async def _load(self) -> T:
+        started = time.monotonic()
+        self._value = await self.loader()
+        self._fetched_at = started
+        self._loaded_at = time.monotonic()
+        logging.info("Snapshot %s loaded in %.3f s", self.name, self._loaded_at - started)
+        return self._value
+
+    @classmethod
+    def get_by_name(cls, name: str) -> "Snapshot":
+        return cls.registry[name]
+
+    @classmethod
+    def by_book(cls, book_id: str) -> List["Snapshot"]:
+        """All snapshots which are read from the book"""
+        return [snapshot for snapshot in cls.registry.values() if snapshot.book_id == book_id]
+
+    @classmethod
+    def by_sheet(cls, book_id: str, sheet_name: str) -> List["Snapshot"]:
+        """All snapshots which are read from the sheet of the book"""
+        return [snapshot for snapshot in cls.by_book(book_id) if snapshot.sheet_name == sheet_name]
@@ -17,4 +17,5 @@ commands_admin = [
     BotCommand(command='/help', description='справка'),
     BotCommand(command='/log', description='лог программы'),
     BotCommand(command='/db_sqlite', description='получить bot.db'),
+    BotCommand(command='/metrics', description='метрики Google API и очередей'),
 ]
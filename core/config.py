@@ -31,6 +31,15 @@ class DBSettings(DefaultConfig):
 
     ECHO: bool = True
 
+    # queue - pool of POOL_SIZE connections plus up to POOL_MAX_OVERFLOW extra ones,
+    # null - a new connection per session (NullPool), e.g. behind pgbouncer
+    POOL: str = "queue"
+    POOL_SIZE: int = 5
+    POOL_MAX_OVERFLOW: int = 10
+    POOL_RECYCLE: int = 1800
+    POOL_TIMEOUT: float = 30.0
+    POOL_PRE_PING: bool = True
+
     POSTGRES_SYSTEM: str
     POSTGRES_DRIVER: str
 
@@ -84,6 +93,19 @@ class TgBot(DefaultConfig):
     OBSERVERS: Optional[List[int]] = None
     MASTER: Optional[int] = None
 
+    BROADCAST_RATE: float = 25.0
+    BROADCAST_CHAT_INTERVAL: float = 1.0
+    BROADCAST_CONCURRENCY: int = 20
+    BROADCAST_RETRIES: int = 3
+    BROADCAST_FLOOD_RETRIES: int = 5
+    BROADCAST_PROGRESS_INTERVAL: float = 3.0
+    BROADCAST_RETRY_ROUNDS: int = 2
+    BROADCAST_RETRY_DELAY: float = 30.0
+    DELIVERY_BATCH_SIZE: int = 20
+    DELIVERY_KEEP_DAYS: int = 30
+    JOB_LOCK_TTL: float = 60.0
+    JOB_WARM_LEAD: int = 3
+
     @property
     def address(self) -> str:
         return f"{self.WEBHOOK_HOST}{self.WEBHOOK_PATH}"
@@ -122,6 +144,35 @@ class GoogleSheetsSettings(DefaultConfig):
     PROJECTS_SHEET_ID: Optional[int] = None
     FOLDER_ID_BP: Optional[str] = None
 
+    SCHEDULE_TTL: int = 300
+    HEADER_TTL: int = 3600
+    DASHBOARD_TTL: int = 60
+    ROW_INDEX_TTL: int = 600
+    WATCH_INTERVAL: int = 60
+
+    APPEND_SPOOL: str = os.path.join(DB_PATH_, "append_spool.db")
+    APPEND_FLUSH_INTERVAL: float = 2.0
+    APPEND_BATCH_SIZE: int = 50
+
+    DRIVE_WORKERS: int = 4
+    DRIVE_TIMEOUT: float = 300.0
+    DRIVE_CHUNK_SIZE: int = 5 * 1024 * 1024
+    # одновременных batch удаления при очистке папки, остальные потоки Drive остаются загрузкам
+    DRIVE_CLEANUP_CONCURRENCY: int = 1
+
+    SHEETS_WORKERS: int = 4
+    SHEETS_TIMEOUT: float = 120.0
+
+    QUOTA_PER_MINUTE: int = 60
+    QUOTA_BURST: int = 10
+    DRIVE_QUOTA_PER_MINUTE: int = 600
+    DRIVE_QUOTA_BURST: int = 100
+    RETRY_MAX: int = 6
+    RETRY_BASE: float = 1.0
+    RETRY_MAX_DELAY: float = 64.0
+    # наибольшее суммарное время повторов одного запроса, сек.
+    RETRY_MAX_TOTAL: float = 120.0
+
     @property
     def credentials(self) -> str:
         return os.path.join(CURRENT_PATH, self.SERVICE_ACCOUNT_FILE)
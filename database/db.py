@@ -1,4 +1,3 @@
-from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from .repositories import (
@@ -9,15 +8,18 @@ from .repositories import (
     CheckRestaurantRepo,
     PointRepo,
     PositionRepo,
+    MailingDeliveryRepo,
+    NewsRunRepo,
 )
+from .pool import instrument, pool_options
 from core.config import settings
 
 async_engine = create_async_engine(
     url=settings.db.URL_SQLITE if settings.use_sqlite else settings.db.url_postgres,
     echo=settings.db.ECHO,
-    pool_pre_ping=True,
-    poolclass=NullPool
+    **pool_options(settings.db),
 )
+instrument(async_engine.sync_engine)
 
 async_session_factory = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
 
@@ -47,6 +49,10 @@ class Database:
     point: PointRepo
     """ PositionRepo repository """
     position: PositionRepo
+    """ MailingDeliveryRepo repository """
+    mailing_delivery: MailingDeliveryRepo
+    """ NewsRunRepo repository """
+    news_run: NewsRunRepo
 
     session: AsyncSession
 
@@ -101,3 +107,17 @@ class Database:
         The Position repository sessions are required to manage default operations.
         """
         return PositionRepo(self.session)
+
+    @property
+    def mailing_delivery(self) -> MailingDeliveryRepo:
+        """
+        The MailingDelivery repository sessions are required to manage mailing delivery log operations.
+        """
+        return MailingDeliveryRepo(self.session)
+
+    @property
+    def news_run(self) -> NewsRunRepo:
+        """
+        The NewsRun repository sessions are required to resume interrupted news mailings.
+        """
+        return NewsRunRepo(self.session)
@@ -5,6 +5,7 @@ from .position import Position
 from .write_off import WriteOff
 from .product import Product
 from .check import CheckCafe, CheckRestaurant
+from .mailing import MailingDelivery, MailingFence, NewsRun
 
 __all__ = (
     'Base',
@@ -15,4 +16,7 @@ __all__ = (
     'Product',
     'CheckCafe',
     'CheckRestaurant',
+    'MailingDelivery',
+    'MailingFence',
+    'NewsRun',
 )
@@ -0,0 +1,50 @@
+from typing import Optional
+
+from sqlalchemy import BigInteger, Boolean, String, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base, int_pk
+
+
+class MailingDelivery(Base):
+    """Доставка сообщения рассылки: один раз на (run_id, user_id)"""
+    __tablename__ = "mailing_deliveries"
+    __table_args__ = (UniqueConstraint("run_id", "user_id"),)
+
+    id: Mapped[int_pk]
+    run_id: Mapped[str] = mapped_column(String(100), index=True)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    status: Mapped[str] = mapped_column(String(10))
+
+    repr_cols_num = 4
+
+
+class MailingFence(Base):
+    """Последний fencing token аренды задачи, записи журнала доставок с меньшим token отклоняются"""
+    __tablename__ = "mailing_fences"
+
+    id: Mapped[int_pk]
+    key: Mapped[str] = mapped_column(String(100), unique=True)
+    token: Mapped[int] = mapped_column(BigInteger)
+
+    repr_cols_num = 3
+
+
+class NewsRun(Base):
+    """Рассылка новости администратора: что и кому отправить, чтобы продолжить её после перезапуска"""
+    __tablename__ = "news_runs"
+
+    id: Mapped[int_pk]
+    run_id: Mapped[str] = mapped_column(String(100), unique=True)
+    # сообщение администратора, из него копируется медиа, в его чат уходит ход рассылки
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    message_id: Mapped[int] = mapped_column(BigInteger)
+    # text, video или video_note
+    kind: Mapped[str] = mapped_column(String(20))
+    header: Mapped[str] = mapped_column(String(255))
+    text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # user_id получателей через запятую
+    recipients: Mapped[str] = mapped_column(Text)
+    finished: Mapped[bool] = mapped_column(Boolean, default=False, server_default="0")
+
+    repr_cols_num = 4
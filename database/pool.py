@@ -0,0 +1,83 @@
+""" This file contains the connection pool settings and metrics of the async engine """
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool
+
+from core.config import DBSettings
+from services.metrics import metrics
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool which reports the checkout time to metrics as `db.pool.checkout`:
+    waiting for a free connection, or opening a new one while the pool is not full
+    """
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            return super()._do_get()
+        except Exception:
+            metrics.inc("db.pool.checkout_errors")
+            raise
+        finally:
+            metrics.observe("db.pool.checkout", time.monotonic() - started)
+
+
+def pool_options(db: DBSettings) -> Dict[str, Any]:
+    """
+    Engine keyword arguments for the pool mode chosen in DBSettings.POOL
+    :param db: Database settings
+    :return: create_async_engine() keyword arguments
+    """
+    if db.POOL == "null":
+        # A new connection per session, e.g. behind pgbouncer in transaction mode
+        return {"poolclass": NullPool, "pool_pre_ping": db.POOL_PRE_PING}
+    if db.POOL != "queue":
+        raise ValueError(f"Unknown DB pool mode {db.POOL!r}, expected 'queue' or 'null'")
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": db.POOL_SIZE,
+        "max_overflow": db.POOL_MAX_OVERFLOW,
+        "pool_recycle": db.POOL_RECYCLE,
+        "pool_timeout": db.POOL_TIMEOUT,
+        "pool_pre_ping": db.POOL_PRE_PING,
+    }
+
+
+def instrument(engine: Engine) -> None:
+    """
+    Export pool events to metrics: new connections (`db.pool.connects`), invalidated
+    connections (`db.pool.invalidated`) and occupancy gauges `db.pool.checked_out`,
+    `db.pool.idle` and `db.pool.overflow` updated on every checkout and checkin
+    :param engine: Sync engine of the async engine (AsyncEngine.sync_engine)
+    """
+    pool: Pool = engine.pool
+
+    def report(checked_out: int, idle: int, overflow: int) -> None:
+        metrics.set("db.pool.checked_out", checked_out)
+        metrics.set("db.pool.idle", idle)
+        metrics.set("db.pool.overflow", max(overflow, 0))
+
+    def checkout(*_) -> None:
+        report(pool.checkedout(), pool.checkedin(), pool.overflow())
+
+    def checkin(*_) -> None:
+        # fires before the connection is back in the queue; a full queue closes it instead
+        closed = pool.checkedin() >= pool.size()
+        report(pool.checkedout() - 1, pool.checkedin() + (not closed), pool.overflow() - closed)
+
+    def connect(*_) -> None:
+        metrics.inc("db.pool.connects")
+
+    def invalidate(*_) -> None:
+        metrics.inc("db.pool.invalidated")
+
+    event.listen(engine, "connect", connect)
+    event.listen(engine, "invalidate", invalidate)
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        event.listen(engine, "checkout", checkout)
+        event.listen(engine, "checkin", checkin)
@@ -1,19 +1,25 @@
 from .abstract import Repository
-from .user import UserRepo
+from .user import UserRepo, Recipient
 from .product import ProductRepo
 from .write_off import WriteOffRepo
 from .check_cafe import CheckCafeRepo
 from .check_restaurant import CheckRestaurantRepo
 from .point import PointRepo
 from .position import PositionRepo
+from .mailing import MailingDeliveryRepo, NewsRunRepo, DeliveryReport, StaleFenceError
 
 __all__ = (
     "Repository",
     "UserRepo",
+    "Recipient",
     "ProductRepo",
     "WriteOffRepo",
     "PointRepo",
     "CheckCafeRepo",
     "CheckRestaurantRepo",
     "PositionRepo",
+    "MailingDeliveryRepo",
+    "NewsRunRepo",
+    "DeliveryReport",
+    "StaleFenceError",
 )
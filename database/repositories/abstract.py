@@ -11,6 +11,19 @@ from ..models import Base
 AbstractModel = TypeVar("AbstractModel")
 
 
+def dialect_insert(session: AsyncSession):
+    """
+    insert() with ON CONFLICT support for the session's dialect
+    :param session: Session whose bind picks postgresql or sqlite
+    :return: Dialect insert function
+    """
+    if session.bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect
+    return dialect
+
+
 class Repository(Generic[AbstractModel]):
     """Repository abstract class"""
 
@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, func, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import MailingDelivery, MailingFence, NewsRun
+from .abstract import Repository, dialect_insert
+
+# статусы, после которых получателю повторно не отправляем
+DONE_STATUSES = ('sent', 'blocked')
+
+
+class StaleFenceError(Exception):
+    """Запись журнала с fencing token старше последнего принятого: аренду задачи уже взяла другая реплика"""
+
+
+@dataclass
+class DeliveryReport:
+    """Итог запуска рассылки по журналу доставок"""
+    run_id: str
+    statuses: Dict[str, int]
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+
+    @property
+    def total(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def throughput(self) -> float:
+        """Доставок в секунду между первой и последней записью"""
+        if not self.first_at or not self.last_at or self.last_at <= self.first_at:
+            return 0.0
+        return self.total / (self.last_at - self.first_at).total_seconds()
+
+    def __str__(self) -> str:
+        statuses = ', '.join(f'{status}: {count}' for status, count in sorted(self.statuses.items()))
+        return f'{self.run_id}: {statuses or "нет доставок"}, {self.throughput:.1f} сообщ./с'
+
+
+class MailingDeliveryRepo(Repository[MailingDelivery]):
+    """MailingDelivery repository, журнал доставок рассылок"""
+
+    def __init__(self, session: AsyncSession):
+        """Initialize repository"""
+        super().__init__(type_model=MailingDelivery, session=session)
+
+    async def delivered(self, run_id: str) -> Set[int]:
+        """user_id, которым сообщение запуска run_id уже доставлено (или бот заблокирован)"""
+        result = await self.session.scalars(
+            select(MailingDelivery.user_id).where(MailingDelivery.run_id == run_id,
+                                                  MailingDelivery.status.in_(DONE_STATUSES)))
+        return set(result.all())
+
+    async def add_many(self, run_id: str, rows: Iterable[Tuple[int, str]],
+                       fence: Optional[Tuple[str, int]] = None) -> None:
+        """
+        Записать пачку доставок одной транзакцией, повторная запись обновляет статус
+        :param run_id: id запуска рассылки
+        :param rows: пары (user_id, status)
+        :param fence: (Optional) (ключ, token) аренды задачи, пачка с token меньше последнего
+                принятого по ключу не пишется, а вызывает StaleFenceError
+        """
+        values = [{'run_id': run_id, 'user_id': user_id, 'status': status} for user_id, status in rows]
+        if not values:
+            return
+        if fence is not None:
+            await self._fence(*fence)
+        statement = dialect_insert(self.session)(MailingDelivery).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[MailingDelivery.run_id, MailingDelivery.user_id],
+            set_={'status': statement.excluded.status,
+                  # то же выражение, что onupdate столбца: время по Мск в Postgres
+                  'updated_at': MailingDelivery.__table__.c.updated_at.onupdate.arg},
+        )
+        await self.session.execute(statement)
+        await self.session.commit()
+
+    async def _fence(self, key: str, token: int) -> None:
+        """Принять token по ключу в текущей транзакции, если он не меньше последнего принятого"""
+        statement = dialect_insert(self.session)(MailingFence).values(key=key, token=token)
+        statement = statement.on_conflict_do_update(
+            index_elements=[MailingFence.key],
+            set_={'token': statement.excluded.token},
+            # строка ключа блокируется до конца транзакции, новый владелец ждёт записи старого
+            where=MailingFence.token <= statement.excluded.token,
+        ).returning(MailingFence.token)
+        if (await self.session.execute(statement)).scalar_one_or_none() is None:
+            await self.session.rollback()
+            raise StaleFenceError(f'{key}: token {token} устарел')
+
+    async def report(self, run_id: str) -> DeliveryReport:
+        """Кол-во доставок по статусам и время первой и последней записи запуска run_id"""
+        rows = await self.session.execute(
+            select(MailingDelivery.status, func.count(), func.min(MailingDelivery.created_at),
+                   func.max(MailingDelivery.updated_at))
+            .where(MailingDelivery.run_id == run_id)
+            .group_by(MailingDelivery.status))
+        report = DeliveryReport(run_id=run_id, statuses={})
+        for status, count, first_at, last_at in rows:
+            report.statuses[status] = count
+            report.first_at = min(filter(None, (report.first_at, first_at)), default=None)
+            report.last_at = max(filter(None, (report.last_at, last_at)), default=None)
+        return report
+
+    async def delete_before(self, moment: datetime) -> None:
+        """
+        Удалить записи журнала старше moment
+        :param moment: время по Мск без tzinfo, как в столбце created_at
+        """
+        await self.session.execute(delete(MailingDelivery).where(MailingDelivery.created_at < moment))
+        await self.session.commit()
+
+
+class NewsRunRepo(Repository[NewsRun]):
+    """NewsRun repository, незавершённые рассылки новостей"""
+
+    def __init__(self, session: AsyncSession):
+        """Initialize repository"""
+        super().__init__(type_model=NewsRun, session=session)
+
+    async def unfinished(self) -> List[NewsRun]:
+        """Рассылки, которые начались и не дошли до конца"""
+        result = await self.session.scalars(select(NewsRun).where(NewsRun.finished.is_(False)).order_by(NewsRun.id))
+        return list(result.all())
+
+    async def finish(self, run_id: str) -> None:
+        """Отметить рассылку run_id завершённой"""
+        await self.session.execute(update(NewsRun).where(NewsRun.run_id == run_id).values(finished=True))
+        await self.session.commit()
+
+    async def delete_before(self, moment: datetime) -> None:
+        """
+        Удалить завершённые рассылки старше moment
+        :param moment: время по Мск без tzinfo, как в столбце created_at
+        """
+        await self.session.execute(delete(NewsRun).where(NewsRun.finished.is_(True), NewsRun.created_at < moment))
+        await self.session.commit()
@@ -1,10 +1,40 @@
-from typing import List
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 
 from ..models import Product
-from .abstract import Repository
+from .abstract import Repository, dialect_insert
+
+
+SYNC_COLUMNS = ('product', 'group_product', 'unit', 'price')
+SYNC_CHUNK = 500
+
+
+def product_hash(row: dict) -> str:
+    """Хеш содержимого товара без кода и служебных полей"""
+    values = [row.get(col) for col in SYNC_COLUMNS]
+    values[-1] = round(float(values[-1] or 0), 2)
+    return hashlib.sha1(repr(values).encode()).hexdigest()
+
+
+@dataclass
+class ProductSyncReport:
+    """Итог синхронизации справочника товаров"""
+    inserted: List[int] = field(default_factory=list)
+    updated: List[int] = field(default_factory=list)
+    deleted: List[int] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def __str__(self) -> str:
+        return (f'добавлено: {len(self.inserted)}, изменено: {len(self.updated)}, '
+                f'удалено: {len(self.deleted)}, без изменений: {self.unchanged}')
 
 
 class ProductRepo(Repository[Product]):
@@ -40,6 +70,53 @@ class ProductRepo(Repository[Product]):
         self.session.add_all(products)
         await self.session.commit()
 
+    async def sync(self, rows: Iterable[dict]) -> ProductSyncReport:
+        """
+        Привести таблицу товаров к строкам rows (из гугл таблицы) одной транзакцией.
+
+        Строки сравниваются с таблицей по code и хешу содержимого, записываются только новые
+        и изменённые (upsert ON CONFLICT (code)), товары, которых нет в rows, удаляются.
+        :param rows: словари с полями code, product, group_product, unit, price
+        :return: ProductSyncReport
+        """
+        incoming: Dict[int, dict] = {int(row['code']): {**row, 'code': int(row['code'])} for row in rows}
+        current = {
+            code: product_hash(dict(zip(SYNC_COLUMNS, values)))
+            for code, *values in await self.session.execute(
+                select(Product.code, *(getattr(Product, col) for col in SYNC_COLUMNS)))
+        }
+
+        report = ProductSyncReport()
+        changed = []
+        for code, row in incoming.items():
+            if code not in current:
+                report.inserted.append(code)
+            elif current[code] != product_hash(row):
+                report.updated.append(code)
+            else:
+                report.unchanged += 1
+                continue
+            changed.append({'code': code, **{col: row.get(col) for col in SYNC_COLUMNS}})
+        report.deleted = [code for code in current if code not in incoming]
+
+        if not report.changed:
+            return report
+
+        insert = dialect_insert(self.session)
+        for i in range(0, len(changed), SYNC_CHUNK):
+            statement = insert(Product).values(changed[i:i + SYNC_CHUNK])
+            statement = statement.on_conflict_do_update(
+                index_elements=[Product.code],
+                set_={**{col: statement.excluded[col] for col in SYNC_COLUMNS},
+                      # то же выражение, что onupdate столбца: время по Мск в Postgres
+                      'updated_at': Product.__table__.c.updated_at.onupdate.arg},
+            )
+            await self.session.execute(statement)
+        for i in range(0, len(report.deleted), SYNC_CHUNK):
+            await self.session.execute(delete(Product).where(Product.code.in_(report.deleted[i:i + SYNC_CHUNK])))
+        await self.session.commit()
+        return report
+
     async def get_one(self, code: int | str):
         return await self.session.scalar(select(Product).where(Product.code == int(code)))
 
@@ -1,6 +1,6 @@
 """ User repository file """
 import logging
-from typing import Optional, Type, List
+from typing import Collection, NamedTuple, Optional, Type, List
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete, literal, exists
@@ -11,6 +11,19 @@ from ..models import User
 from .abstract import Repository
 
 
+class Recipient(NamedTuple):
+    """Сотрудник для рассылок, только нужные столбцы без ORM объекта"""
+    user_id: int
+    first_name: Optional[str]
+    last_name: Optional[str]
+    point: str
+    position: str
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.last_name} {self.first_name}"
+
+
 class UserRepo(Repository[User]):
     """User repository for CRUD and other SQL queries"""
 
@@ -56,6 +69,45 @@ class UserRepo(Repository[User]):
 
         return users.all()
 
+    async def segment(
+            self,
+            positions: Optional[Collection[str]] = None,
+            points: Optional[Collection[str]] = None,
+            exclude_points: Optional[Collection[str]] = None,
+            roles: Optional[Collection[Role]] = None,
+            last_names: Optional[Collection[str]] = None,
+            exclude_user_ids: Optional[Collection[int]] = None,
+            active: bool = True,
+    ) -> List[Recipient]:
+        """
+        Получатели рассылки, фильтры выполняются в БД, None - без фильтра.
+        :param positions: должности
+        :param points: точки
+        :param exclude_points: кроме точек
+        :param roles: роли
+        :param last_names: фамилии, например тех, кто в смене по графику
+        :param exclude_user_ids: кроме user_id (например, руководство)
+        :param active: только активные
+        :return: список Recipient
+        """
+        query = select(User.user_id, User.first_name, User.last_name, User.point, User.position)
+        if active:
+            query = query.where(User.status)
+        if positions is not None:
+            query = query.where(User.position.in_(list(positions)))
+        if points is not None:
+            query = query.where(User.point.in_(list(points)))
+        if exclude_points:
+            query = query.where(User.point.not_in(list(exclude_points)))
+        if roles is not None:
+            query = query.where(User.role.in_(list(roles)))
+        if last_names is not None:
+            query = query.where(User.last_name.in_(list(last_names)))
+        if exclude_user_ids:
+            query = query.where(User.user_id.not_in(list(exclude_user_ids)))
+        result = await self.session.execute(query.order_by(User.user_id))
+        return [Recipient(*row) for row in result]
+
     async def is_active(self, user_id: int) -> bool:
         return (
                 await self.session.scalar(
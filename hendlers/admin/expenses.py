@@ -4,7 +4,6 @@ import re
 
 import aiofiles
 import aiohttp
-import pytils
 
 from aiogram import Router, F
 from aiogram.filters import StateFilter, and_f, Command
@@ -38,9 +37,9 @@ from fsm.expenses import Home, Payments, Projects
 
 from structures.keybords.keybords_list import boss_category_m
 from services.async_google_service import google_add_row, google_authorize_token, google_save_file
-from services.path import create_dir, clear_dir, create_src
+from services.path import create_dir, clear_dir
 from structures.role import Role
-from utils.utils import includes_number, get_current_datetime
+from utils.utils import includes_number, get_current_datetime, ru_strftime
 from core.config import settings, GoogleSheetsSettings
 
 gs: GoogleSheetsSettings = settings.gs
@@ -228,16 +227,11 @@ async def payments_check(message: Message, state: FSMContext, db: Database):
         )
     elif message.photo:
 
-        create_dir(user_id)
         file_info = await bot.get_file(message.photo[len(message.photo) - 1].file_id)
-        downloaded_file = await bot.download_file(file_info.file_path)
-        src = create_src(user_id, file_info.file_path)
-
-        with open(src, 'wb') as new_file:
-            new_file.write(downloaded_file.getvalue())
+        file = await bot.download_file(file_info.file_path)
 
         name = f'{data["point"]}_{date_time.strftime("%d_%m_%y %H_%M_%S")}_{data["category"]}_{data["amount"]}'
-        file_id = await google_save_file(name=name, file_path=src)
+        file_id = await google_save_file(name=name, source=file)
 
         await google_add_row(
             gs.BOOK_PAYMENTS,
@@ -253,7 +247,6 @@ async def payments_check(message: Message, state: FSMContext, db: Database):
                    f'https://drive.google.com/file/d/{file_id}/view?usp=drivesdk',
                    ],
         )
-        clear_dir(user_id)
     else:
         await message.answer('Добавь фото чека 👇', reply_markup=no_check)
 
@@ -433,7 +426,7 @@ async def construction_pdf_report(message: Message):
                 async with aiofiles.open(file=file_path, mode='wb') as file:
                     await file.write(content)
 
-        now = pytils.dt.ru_strftime(u'%d.%m.%y', inflected=True, date=get_current_datetime())
+        now = ru_strftime(u'%d.%m.%y', inflected=True, date=get_current_datetime())
         await message.answer_document(FSInputFile(file_path, filename=f'Отчет по стройке {now}.pdf'),
                                       caption=f'Отчет по стройке {now}',
                                       reply_markup=boss_payments_menu)
@@ -461,7 +454,7 @@ async def project_pdf_report(message: Message):
                 async with aiofiles.open(file=file_path, mode='wb') as file:
                     await file.write(content)
 
-        now = pytils.dt.ru_strftime(u'%d.%m.%y', inflected=True, date=get_current_datetime())
+        now = ru_strftime(u'%d.%m.%y', inflected=True, date=get_current_datetime())
         await message.answer_document(FSInputFile(file_path, filename=f'Отчет по проекту {now}.pdf'),
                                       caption=f'Отчет по проекту {now}',
                                       reply_markup=boss_payments_menu)
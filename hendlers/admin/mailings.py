@@ -1,6 +1,10 @@
+import contextlib
 import logging
+from functools import partial
+from typing import List
 
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, and_f, StateFilter
 from aiogram.types import Message
 from aiogram.utils.chat_action import ChatActionSender
@@ -17,7 +21,10 @@ from structures.keybords import (
 from fsm.mailings import Mailing
 
 from core.bot import bot
-from database import Database
+from database import Database, NewsRun, async_session_factory
+from services import background
+from services.broadcast import BroadcastStats, Send, broadcaster
+from services.delivery_log import DeliveryLog
 from utils.utils import get_current_datetime
 from core.config import settings, GoogleSheetsSettings
 
@@ -48,50 +55,80 @@ async def news_mailing_start(message: Message, state: FSMContext):
 
 @router.message(StateFilter(Mailing.TEXT), F.text | F.video | F.video_note)
 async def news_mailing(message: Message, state: FSMContext, db: Database):
-    """Рассылка по сотрудникам"""
+    """Рассылка по сотрудникам, идёт в фоне, ход рассылки обновляется в сообщении"""
+    if background.running('news-mailing'):
+        await message.answer('Предыдущая рассылка ещё идёт ⏳', reply_markup=boss_other_menu)
+        return
+
     users = await db.user.get_all()
-    check = []
-    text = message.text
-    if text:
-        msg = f'📢 <b>News {get_current_datetime().strftime("%d.%m.%y %H:%M")}</b>\n<em>{text}</em>'
-        for user in users:
-            try:
-                if user.status and user.user_id not in check:
-                    check.append(user.user_id)
-                    await bot.send_message(user.user_id, msg)
-            except Exception as ex:
-                logging.warning("%s %s ошибка рассылки", user.user_id, user.full_name, exc_info=ex)
-                continue
-    elif message.video:
-        for user in users:
-            try:
-                msg = f'📢 <b>News {get_current_datetime().strftime("%d.%m.%y %H:%M")}</b>\n' \
-                      f'<em>просмотри видео сообщение 👇</em>'
-                if user.status and user.user_id not in check:
-                    check.append(user.user_id)
-                    await bot.send_video(chat_id=user.user_id, video=message.video.file_id, caption=msg)
-            except Exception as ex:
-                logging.warning("%s %s ошибка рассылки", user.user_id, user.full_name, exc_info=ex)
-                continue
-    elif message.video_note:
-        for user in users:
-            try:
-                msg = f'📢 <b>News {get_current_datetime().strftime("%d.%m.%y %H:%M")}</b>\n' \
-                      f'<em>просмотри видео сообщение 👇</em>'
-                if user.status and user.user_id not in check:
-                    check.append(user.user_id)
-                    await bot.send_message(user.user_id, msg)
-                    await bot.send_video_note(
-                        chat_id=user.user_id,
-                        video_note=message.video_note.file_id,
-                        duration=47,
-                        length=360)
-            except Exception as ex:
-                logging.warning("%s %s ошибка рассылки", user.user_id, user.full_name, exc_info=ex)
-                continue
-
-    await message.answer('Рассылку провели 😎', reply_markup=boss_other_menu)
+    chat_ids = list(dict.fromkeys(user.user_id for user in users if user.status))
+    # рассылка записывается до отправки: run_id по сообщению администратора, после перезапуска
+    # бота она продолжается с того же места (resume_news_mailings)
+    run = NewsRun(
+        run_id=f'news:{message.chat.id}:{message.message_id}',
+        chat_id=message.chat.id,
+        message_id=message.message_id,
+        kind='text' if message.text else 'video' if message.video else 'video_note',
+        header=f'📢 <b>News {get_current_datetime().strftime("%d.%m.%y %H:%M")}</b>\n',
+        text=message.text,
+        recipients=','.join(map(str, chat_ids)),
+        finished=False,
+    )
+    await db.news_run.add(run)
+
     await state.clear()
+    status = await message.answer(f'Рассылка: 0 из {len(chat_ids)} ⏳', reply_markup=boss_other_menu)
+    background.spawn(_news_mailing(run, status), name='news-mailing')
+
+
+def _news_messages(run: NewsRun) -> List[Send]:
+    """Сообщения рассылки, медиа копируется из сообщения администратора"""
+    copy = partial(bot.copy_message, from_chat_id=run.chat_id, message_id=run.message_id)
+    if run.kind == 'text':
+        return [partial(bot.send_message, text=f'{run.header}<em>{run.text}</em>')]
+    if run.kind == 'video':
+        return [partial(copy, caption=f'{run.header}<em>просмотри видео сообщение 👇</em>')]
+    # у кружка нет подписи, заголовок уходит отдельным сообщением
+    return [partial(bot.send_message, text=f'{run.header}<em>просмотри видео сообщение 👇</em>'), copy]
+
+
+async def _news_mailing(run: NewsRun, status: Message):
+    """Рассылка с обновлением сообщения о прогрессе, получатели из журнала доставок пропускаются"""
+
+    async def progress(stats: BroadcastStats):
+        if stats.finished is None:
+            with contextlib.suppress(TelegramBadRequest):
+                await status.edit_text(f'Рассылка: {stats.done} из {stats.total} ⏳')
+
+    chat_ids = [int(chat_id) for chat_id in run.recipients.split(',') if chat_id]
+    log = DeliveryLog(run.run_id)
+    stats = await broadcaster.run('news', chat_ids, _news_messages(run), progress=progress, log=log)
+    async with async_session_factory() as session:
+        await Database(session).news_run.finish(run.run_id)
+
+    text = f'Рассылку провели 😎\n{stats}\n{await log.report()}'
+    if stats.failures:
+        failed = ', '.join(map(str, list(stats.failures)[:20]))
+        text += f'\nНе доставлено после повторов: {failed}' + (' …' if len(stats.failures) > 20 else '')
+    await status.answer(text, reply_markup=boss_other_menu)
+
+
+async def resume_news_mailings() -> None:
+    """Продолжить рассылки новостей, прерванные остановкой бота"""
+    async with async_session_factory() as session:
+        runs = await Database(session).news_run.unfinished()
+    if runs:
+        background.spawn(_resume_news_mailings(runs), name='news-mailing')
+
+
+async def _resume_news_mailings(runs: List[NewsRun]):
+    """Прерванные рассылки по очереди"""
+    for run in runs:
+        logging.info('News mailing %s: продолжаем после перезапуска', run.run_id)
+        status = await bot.send_message(run.chat_id, 'Продолжаем прерванную рассылку ⏳',
+                                        reply_to_message_id=run.message_id, allow_sending_without_reply=True,
+                                        reply_markup=boss_other_menu)
+        await _news_mailing(run, status)
 
 
 @router.message(F.text.lower() == '💰 выручка за вчера')
@@ -10,6 +10,7 @@ from common.questions import help_msg
 from core.config import settings
 from database import Database, User
 from filters.filters import ChatTypeFilter
+from services.metrics import metrics
 
 from structures.keybords import (
     main_menu,
@@ -90,7 +91,7 @@ async def boss_other(message: Message):
     await message.answer('Выбери нужное 👇', reply_markup=boss_other_menu)
 
 
-@router.message(and_f(Command("log", "db_sqlite", "del"), (F.from_user.id == settings.bot.MASTER)))
+@router.message(and_f(Command("log", "db_sqlite", "metrics", "del"), (F.from_user.id == settings.bot.MASTER)))
 async def commands_admin(message: Message):
     user_id = message.from_user.id
     text = message.text.lower()
@@ -105,6 +106,8 @@ async def commands_admin(message: Message):
             elif text == '/db_sqlite':
                 return await message.answer_document(
                     FSInputFile(os.path.join(os.getcwd(), 'database', 'bot.db'), filename='bot.db'))
+            elif text == '/metrics':
+                return await message.answer(metrics.report())
             elif text == '/del' and user_id == settings.bot.MASTER:
                 ...
                 # return await mailing.drop_records()
@@ -1,5 +1,3 @@
-import pytils
-
 from aiogram import Router, F
 from aiogram.filters import and_f
 from aiogram.types import (Message)
@@ -15,7 +13,7 @@ from core.bot import bot
 from database import Database
 
 from utils.check_media import media_create
-from utils.utils import dt_formatted
+from utils.utils import dt_formatted, ru_strftime
 
 from core.config import settings, GoogleSheetsSettings
 
@@ -48,7 +46,7 @@ async def send_reports(message: Message, db: Database):
                 comment = report.comment
 
                 caption = (
-                    f'<b>{report_type}</b> ({pytils.dt.ru_strftime(u"%d %B %Y", inflected=True, date=add_date)})\n'
+                    f'<b>{report_type}</b> ({ru_strftime(u"%d %B %Y", inflected=True, date=add_date)})\n'
                     f'{"*" * 25}\n'
                     f'Точка: {point}\n'
                     f'Сотрудник: {employee}\n'
@@ -2,7 +2,6 @@ import logging
 import time
 from datetime import datetime, timezone
 
-import pytils
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 
@@ -34,7 +33,7 @@ from services.async_google_service import google_exits_by_point
 from common.questions import check_q, BIG_CONFIG
 from structures.role import Role
 
-from utils.utils import dt_formatted, get_current_datetime, time_in_range
+from utils.utils import dt_formatted, get_current_datetime, time_in_range, ru_strftime
 from utils.check_media import media_create
 
 tg: TgBot = settings.bot
@@ -189,7 +188,7 @@ async def morning_file1(message: Message, state: FSMContext, db: Database):
         user = await db.user.get_one(user_id=user_id)
 
         msg = f'<b>Настройка эспрессо</b>\n' \
-              f'{pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=get_current_datetime())}\n' \
+              f'{ru_strftime(u"%d %B %y, %a", inflected=True, date=get_current_datetime())}\n' \
               f'{"*" * 25}\n' \
               f'Точка: <b>{point}</b>\n' \
               f'Сотрудник: {user.full_name}\n' \
@@ -264,7 +263,7 @@ async def morning_file2(message: Message, state: FSMContext, db: Database):
         logging.info(f'"{report_type}" {report_id=} {point} за {add_date} добавлен, отправил > {user.full_name}')
 
         caption = f'<b>{report_type}</b>\n' \
-                  f'{pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=get_current_datetime())}\n' \
+                  f'{ru_strftime(u"%d %B %y, %a", inflected=True, date=get_current_datetime())}\n' \
                   f'{"*" * 25}\n' \
                   f'Точка: <b>{point}</b>\n' \
                   f'Сотрудник: {user.full_name}\n' \
@@ -334,7 +333,7 @@ async def morning_file3(message: Message, state: FSMContext, db: Database):
         logging.info(f'"{report_type}" {report_id=} {point} за {add_date} добавлен, отправил > {user.full_name}')
 
         caption = f'<b>{report_type}</b>\n' \
-                  f'{pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=get_current_datetime())}\n' \
+                  f'{ru_strftime(u"%d %B %y, %a", inflected=True, date=get_current_datetime())}\n' \
                   f'{"*" * 25}\n' \
                   f'Точка: <b>{point}</b>\n' \
                   f'Сотрудник: {user.full_name}\n' \
@@ -458,7 +457,7 @@ async def evening_file3(message: Message, state: FSMContext, db: Database):
             data = await state.get_data()
             date = data.get('date')
 
-            weekday = pytils.dt.ru_strftime(u'%A', inflected=True, date=datetime.strptime(date, '%d.%m.%Y'))
+            weekday = ru_strftime(u'%A', inflected=True, date=datetime.strptime(date, '%d.%m.%Y'))
 
             if weekday != 'понедельник':
 
@@ -489,7 +488,7 @@ async def evening_file3(message: Message, state: FSMContext, db: Database):
                     f'"{report_type}" {point} за {date} добавлен, отправил > {user.full_name}')
 
                 caption = f'<b>{report_type}</b>\n' \
-                          f'{pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=add_date)}\n' \
+                          f'{ru_strftime(u"%d %B %y, %a", inflected=True, date=add_date)}\n' \
                           f'{"*" * 25}\n' \
                           f'Точка: <b>{point}</b>\n' \
                           f'Сотрудник: {user.full_name}\n' \
@@ -596,7 +595,7 @@ async def evening_file7(message: Message, state: FSMContext, db: Database):
             logging.info(f'"{report_type}" {report_id=} {point} за {add_date} добавлен, отправил > {user.full_name}')
 
             caption = f'<b>{report_type}</b>\n' \
-                      f'{pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=add_date)}\n' \
+                      f'{ru_strftime(u"%d %B %y, %a", inflected=True, date=add_date)}\n' \
                       f'{"*" * 25}\n' \
                       f'Точка: <b>{point}</b>\n' \
                       f'Сотрудник: {user.full_name}\n' \
@@ -686,7 +685,7 @@ async def check_report_comment(message: Message, state: FSMContext, db: Database
 
     smile = '☀' if report_type in ['Утренний до 10', 'Утренний до 12'] else '🌘'
     msg = f'<b>{smile} {report_type} отчёт</b>\n' \
-          f'{pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=add_date)}\n' \
+          f'{ru_strftime(u"%d %B %y, %a", inflected=True, date=add_date)}\n' \
           f'{"*" * 25}\n' \
           f'Точка: <b>{point}</b>\n' \
           f'Комментарий: {comment}\n' \
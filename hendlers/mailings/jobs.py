@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Реестр плановых задач бота.
+
+Задачи описываются один раз в JOBS и ставятся в планировщик со стабильным id и
+replace_existing, поэтому перезапуск бота с RedisJobStore не плодит копии. Пропущенные
+запуски схлопываются в один (coalesce), одновременно идёт не больше одного запуска
+задачи, опоздание допускается на misfire_grace_time секунд. Каждый запуск идёт через
+run_job: время и результат пишутся в лог и в ``metrics`` (``job.<id>``, ``job.<id>.ok``,
+``job.<id>.error``), последний запуск задачи доступен в ``last_runs``.
+
+Если реплик бота несколько, каждая ставит задачи в свой планировщик, и запуск выполняет
+только та, что первой взяла в Redis аренду ``job:<id>:<время по расписанию>`` (``LeaseLock``).
+Аренда продлевается, пока задача идёт, и держится ещё misfire_grace_time после окончания,
+остальные реплики пропускают запуск (``job.<id>.skipped``). Если продлить аренду не удалось
+и её взяла другая реплика, задача отменяется (``job.<id>.lease_lost``), чтобы запуск не шёл
+на двух репликах сразу. Ключ и fencing token аренды задача получает через
+``services.delivery_log.current_fence``: журнал доставок пишет пачки только с последним
+выданным token, и реплика, у которой аренду перехватили, останавливается на первой же
+записи (``job.<id>.stale``), даже если ещё не заметила потерю аренды. Без Redis (use_redis=False) или при его недоступности задача
+запускается без блокировки.
+
+Задачи объявляют в needs снимки листов, которые читают. За JOB_WARM_LEAD минут до каждой
+группы задач одного времени суток идёт задача прогрева ``warm_<ЧЧММ>``, она перечитывает
+снимки группы (``services.warmup``), и задачи начинают рассылку сразу. Снимки живут в памяти
+процесса, поэтому прогрев идёт на каждой реплике, без аренды (exclusive=False).
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from apscheduler.schedulers.base import BaseScheduler
+from apscheduler.triggers.cron import CronTrigger
+from redis.asyncio.client import Redis
+
+from cache.adapter import build_redis_client
+from cache.lock import LeaseLock
+from core.config import settings, TgBot
+from hendlers.mailings import mailing
+from services.async_google_service import salary, schedule
+from database import StaleFenceError
+from services.delivery_log import DeliveryLog, current_fence
+from services.metrics import metrics
+from services.warmup import warm
+from utils.utils import get_current_datetime
+
+tg: TgBot = settings.bot
+
+TIMEZONE = 'Europe/Moscow'
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# снимки, которые задачи объявляют в needs
+SCHEDULE = schedule.name
+SALARY = salary.snapshot.name
+
+
+@dataclass(frozen=True)
+class Job:
+    """Плановая задача: корутина func по расписанию cron."""
+    id: str
+    func: Callable[..., Awaitable]
+    cron: Dict[str, object]
+    kwargs: Dict[str, object] = field(default_factory=dict)
+    misfire_grace_time: int = 10 * 60
+    needs: Tuple[str, ...] = ()
+    # False - запуск на каждой реплике, без аренды в Redis
+    exclusive: bool = True
+
+    def trigger(self) -> CronTrigger:
+        return CronTrigger(timezone=TIMEZONE, **self.cron)
+
+    def fire_time(self, now: datetime) -> datetime:
+        """Время по расписанию запуска, который выполняется в now (с учётом опоздания)."""
+        since = now - timedelta(seconds=self.misfire_grace_time)
+        return self.trigger().get_next_fire_time(None, since) or now
+
+
+JOBS: Dict[str, Job] = {job.id: job for job in (
+    Job('write_off_coffee', mailing.write_off_coffee, {'day_of_week': 'mon', 'hour': 8}, misfire_grace_time=2 * 3600),
+    Job('reminder_order_mon', mailing.send_reminder_order, {'day_of_week': 'mon', 'hour': 10}),
+    Job('reminder_order_tue', mailing.send_reminder_order, {'day_of_week': 'tue', 'hour': 10}),
+    Job('reminder_order_sun', mailing.send_reminder_order, {'day_of_week': 'sun', 'hour': 9, 'minute': 30}),
+    Job('coffee_machine_morning', mailing.send_reminder_coffee_machine, {'day_of_week': 'mon', 'hour': 10},
+        needs=(SCHEDULE,)),
+    Job('coffee_machine_evening', mailing.send_reminder_coffee_machine, {'day_of_week': 'mon', 'hour': 21},
+        needs=(SCHEDULE,)),
+    Job('revenue_by_day', mailing.revenue_by_day, {'hour': 0, 'minute': 30}, kwargs={'user_id': None},
+        misfire_grace_time=3600, needs=(SALARY,)),
+    # Job('not_send_evening_reports', mailing.not_send_evening_reports, {'hour': 3}),
+    Job('safe', mailing.safe, {'hour': 9}, needs=(SCHEDULE, SALARY)),
+    Job('check_up_morning', mailing.send_check_up, {'hour': 10}, needs=(SCHEDULE,)),
+    # Job('not_send_morning_reports', mailing.not_send_morning_reports, {'hour': 13}),
+    Job('check_up_evening', mailing.send_check_up, {'hour': 21}, needs=(SCHEDULE,)),
+    Job('comes_out', mailing.send_comes_out, {'hour': 22}, needs=(SCHEDULE,)),
+    Job('prune_deliveries', DeliveryLog.prune, {'hour': 4}, misfire_grace_time=6 * 3600),
+)}
+
+
+def warm_jobs(jobs: Iterable[Job], lead: int) -> List[Job]:
+    """Задачи прогрева: за lead минут до задач одного времени суток перечитать снимки из их needs.
+
+    Поддерживаются расписания из чисел hour, minute и day_of_week из названий дней через запятую,
+    прогрев группы идёт в те дни, когда идёт хоть одна её задача.
+
+    :param jobs: задачи
+    :param lead: за сколько минут до задач прогревать, 0 - без прогрева
+    """
+    if lead <= 0:
+        return []
+    # минута суток прогрева -> (дни недели, None - каждый день; снимки)
+    clusters: Dict[int, Tuple[Set[Optional[str]], Set[str]]] = {}
+    for job in jobs:
+        if not job.needs:
+            continue
+        hour, minute = job.cron.get('hour'), job.cron.get('minute', 0)
+        day_of_week = job.cron.get('day_of_week')
+        job_days = [day.strip() for day in str(day_of_week).split(',')] if day_of_week is not None else [None]
+        if (not isinstance(hour, int) or not isinstance(minute, int)
+                or set(job.cron) - {'day_of_week', 'hour', 'minute'}
+                or day_of_week is not None and not set(job_days) <= set(DAYS)):
+            logging.warning('Прогрев: расписание задачи %s не поддерживается: %s', job.id, job.cron)
+            continue
+        at = hour * 60 + minute - lead
+        # прогрев до полуночи идёт накануне
+        shift = -1 if at < 0 else 0
+        days, needs = clusters.setdefault(at % (24 * 60), (set(), set()))
+        days.update(day and DAYS[(DAYS.index(day) + shift) % 7] for day in job_days)
+        needs.update(job.needs)
+
+    result = []
+    for at, (days, needs) in sorted(clusters.items()):
+        cron: Dict[str, object] = {'hour': at // 60, 'minute': at % 60}
+        if None not in days:
+            cron['day_of_week'] = ','.join(sorted(days, key=DAYS.index))
+        result.append(Job(
+            f'warm_{at // 60:02d}{at % 60:02d}', warm, cron,
+            # снимки держатся до начала задач и ещё 5 минут на их работу
+            kwargs={'names': tuple(sorted(needs)), 'hold': (lead + 5) * 60},
+            misfire_grace_time=lead * 60,
+            exclusive=False,
+        ))
+    return result
+
+
+JOBS.update((job.id, job) for job in warm_jobs(list(JOBS.values()), tg.JOB_WARM_LEAD))
+
+# id задачи -> (время запуска, результат, длительность)
+last_runs: Dict[str, Tuple[datetime, str, float]] = {}
+
+
+_redis: Optional[Redis] = None
+
+
+def _lock_client() -> Optional[Redis]:
+    global _redis
+    if _redis is None and settings.use_redis:
+        _redis = build_redis_client()
+    return _redis
+
+
+async def run_job(job_id: str) -> None:
+    """Запуск задачи из планировщика, при нескольких репликах - только на одной из них
+    (кроме задач с exclusive=False)."""
+    job = JOBS[job_id]
+    redis = _lock_client() if job.exclusive else None
+    if redis is None:
+        return await _execute(job)
+
+    fire_time = job.fire_time(get_current_datetime())
+    lock = LeaseLock(redis, f'job:{job.id}:{fire_time:%Y-%m-%dT%H:%M}', ttl=tg.JOB_LOCK_TTL,
+                     fence_key=f'job:{job.id}:fence', keep=job.misfire_grace_time)
+    try:
+        acquired = await lock.acquire()
+    except Exception as ex:
+        metrics.inc(f'job.{job_id}.lock_error')
+        logging.warning('Job %s: Redis недоступен, запуск без блокировки: %r', job_id, ex)
+        return await _execute(job)
+
+    if not acquired:
+        metrics.inc(f'job.{job_id}.skipped')
+        logging.info('Job %s: запуск %s выполняет другая реплика', job_id, fire_time)
+        return
+    task = asyncio.ensure_future(_execute(job, (lock.fence_key, lock.token)))
+    lock.on_lost = task.cancel
+    try:
+        await task
+    except asyncio.CancelledError:
+        if not lock.lost:
+            raise
+        metrics.inc(f'job.{job_id}.lease_lost')
+        logging.error('Job %s: аренда запуска %s потеряна, задача остановлена (token %s)',
+                      job_id, fire_time, lock.token)
+    finally:
+        await lock.release()
+
+
+async def _execute(job: Job, fence: Optional[Tuple[str, int]] = None) -> None:
+    """Выполнить задачу с замером времени и результата.
+
+    :param job: задача
+    :param fence: (optional) ключ и fencing token аренды запуска, задача получает их через current_fence
+    """
+    job_id = job.id
+    token = fence[1] if fence else None
+    current_fence.set(fence)
+    started_at = get_current_datetime()
+    started = time.monotonic()
+    outcome = 'ok'
+    try:
+        await job.func(**job.kwargs)
+    except asyncio.CancelledError:
+        outcome = 'cancelled'
+        raise
+    except StaleFenceError as ex:
+        outcome = 'stale'
+        logging.error('Job %s: аренду взяла другая реплика, задача остановлена: %s', job_id, ex)
+    except Exception as ex:
+        outcome = 'error'
+        logging.error('Job %s: ошибка', job_id, exc_info=ex)
+    finally:
+        duration = time.monotonic() - started
+        metrics.observe(f'job.{job_id}', duration)
+        metrics.inc(f'job.{job_id}.{outcome}')
+        last_runs[job_id] = (started_at, outcome, duration)
+        logging.info('Job %s: %s за %.1f с (token %s)', job_id, outcome, duration, token)
+
+
+def schedule_jobs(scheduler: BaseScheduler) -> None:
+    """Поставить задачи JOBS в запущенный планировщик и убрать из хранилища задачи не из реестра
+    (копии без id, которые ставились при каждом старте старых версий)."""
+    for job in JOBS.values():
+        scheduler.add_job(
+            run_job,
+            trigger=job.trigger(),
+            args=[job.id],
+            id=job.id,
+            name=job.id,
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=job.misfire_grace_time,
+        )
+
+    for stale in scheduler.get_jobs():
+        if stale.id not in JOBS:
+            logging.info('Scheduler: удалена задача не из реестра %s (%s)', stale.id, stale.name)
+            scheduler.remove_job(stale.id)
@@ -1,22 +1,24 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import logging
-from datetime import timedelta
-from typing import Union
+from functools import partial
+from typing import Dict, List, Optional, Set, Tuple, Union
 
-import pytils
 from aiogram.utils.chat_action import ChatActionSender
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.bot import bot
 from core.config import settings, TgBot, GoogleSheetsSettings
-from database import async_engine, db, WriteOff, Database
+from database import async_engine, WriteOff, Database, Recipient
 
 from structures.keybords import boss_main_menu, get_points
 from structures.keybords.cb_makers import create_inline_kb, create_inline_url_kb
 
-from services.google_service import (google_exit, google_revenue, google_add_row, google_safe)
-from services.async_google_service import google_safe, google_revenue, google_exits
+from services.async_google_service import google_safe, google_revenue, google_exits, google_add_row
+from services.broadcast import broadcaster
+from services.delivery_log import DeliveryLog, run_id
+from services.fanout import Recipients, fan_out, message
+from services.render import RenderContext, Template, by_point
 from common.questions import sheets
 from utils.utils import get_current_datetime, dt_formatted
 
@@ -24,85 +26,82 @@ tg: TgBot = settings.bot
 gs: GoogleSheetsSettings = settings.gs
 
 
-async def send_reminder_order():
-    """Рассылка заказ кофе и десертов"""
+ORDER_POSITIONS = ('Ст. бариста', 'Супервайзер', 'Бариста')
 
-    curr_datetime = get_current_datetime()
-    tomorrow = pytils.dt.ru_strftime(u'%d.%m.%y', inflected=True, date=curr_datetime + timedelta(days=1))
-    weekday = pytils.dt.ru_strftime(u'%A', inflected=True, date=curr_datetime)
-    now = pytils.dt.ru_strftime(u'%d.%m.%y', inflected=True, date=curr_datetime)
 
-    async with AsyncSession(async_engine) as session:
-        users = await db.users_active_get(session)
-
-    for user in users:
-        position = user.position
-        point = user.point
-        name = user.full_name
-        user_id = user.user_id
-
-        inline_order = create_inline_url_kb(btns={'Перейти в заказ': 'https://clck.ru/Vrxcr'})
-        inline_rotation = create_inline_kb(btns={'Проверил! Ротация соблюдена': f'checkRotation_{point}'})
-
-        try:
-            if position in ['Ст. бариста', 'Супервайзер', 'Бариста']:
-                if weekday == 'воскресенье':
-                    await bot.send_message(
-                        chat_id=user_id,
-                        text=f'<strong>{name}</strong>, привет!\n\n'
-                             f'Если ты в смене, проверь дату изготовления следующих позиций:\n'
-                             f'🔸 кофе;\n'
-                             f'🔸 молоко обычное;\n'
-                             f'🔸 молоко безлактозное;\n'
-                             f'🔸 молоко банановое;\n'
-                             f'🔸 молоко кокосовое;\n'
-                             f'🔸 молоко миндальное.\n\n'
-                             f'<i>При наличии, нескольких шт. товаров одного вида из перечисленных, '
-                             f'товар с подходящим сроком годности помести вперёд!</i>',
-                        reply_markup=inline_rotation
-                    )
-                if weekday == 'понедельник':
-                    await bot.send_message(
-                        user_id,
-                        f'<strong>{name}</strong>, привет!\n'
-                        f'Завтра <strong>{tomorrow} до 12:00</strong>, отправь заказ.\n'
-                        f'Поставщик: Мастер РТК\nСумма заказа от 5000 руб.',
-                        reply_markup=inline_order
-                    )
-                if weekday == 'вторник':
-                    await bot.send_message(
-                        user_id,
-                        f'<strong>{name}</strong>, привет!\n'
-                        f'Сегодня <strong>{now} до 12:00</strong>, отправь заказ.\n'
-                        f'Поставщик: Мастер РТК\nСумма заказа от 5000 руб.',
-                        reply_markup=inline_order
-                    )
-                if weekday == 'понедельник' and point != 'Балашиха':
-                    await bot.send_message(
-                        user_id,
-                        f'<strong>{name}</strong>, привет!\n'
-                        f'Завтра <strong>{tomorrow} до 16:00</strong>, отправь заказ.\n'
-                        f'Поставщик: Десерт фентези\n'
-                        f'Сумма заказа от 5000 руб.',
-                        reply_markup=inline_order
-                    )
-                if weekday == 'вторник' and point != 'Балашиха':
-                    await bot.send_message(
-                        user_id,
-                        f'<strong>{name}</strong>, привет!\n'
-                        f'Сегодня <strong>{now} до 16:00</strong>, отправь заказ.\n'
-                        f'Поставщик: Десерт фентези\n'
-                        f'Сумма заказа от 5000 руб.',
-                        reply_markup=inline_order
-                    )
-
-                logging.info('Send reminder order: %s, %s %s > OK', user_id, name,
-                             curr_datetime.strftime("%d.%m.%Y %H:%M:%S"))
-        except Exception as ex:
-            logging.warning('Send reminder order: %s, %s ошибка рассылки > %s', user_id, name, ex)
-            continue
-
-    logging.info('Send reminder order: %s > OK', curr_datetime)
+def segment(**where) -> Recipients:
+    """Получатели рассылки из БД: активные сотрудники с фильтрами UserRepo.segment(**where),
+    фамилии тех, кто в смене, тоже фильтруются запросом"""
+
+    async def query(last_names: Optional[Set[str]] = None) -> List[Recipient]:
+        async with AsyncSession(async_engine) as session:
+            return await Database(session).user.segment(last_names=last_names, **where)
+
+    return query
+
+
+schedule_today = partial(google_exits, offset=0, scheduled=True)
+schedule_tomorrow = partial(google_exits, offset=1, scheduled=True)
+
+
+async def send_reminder_order():
+    """Рассылка заказ кофе и десертов"""
+    context = RenderContext.now()
+    inline_order = create_inline_url_kb(btns={'Перейти в заказ': 'https://clck.ru/Vrxcr'})
+
+    rotation: Dict[str, Template] = {}
+    # (шаблон, кроме Балашихи)
+    orders: List[Tuple[Template, bool]] = []
+    if context.weekday == 'понедельник':
+        orders.append((Template('<strong>{full_name}</strong>, привет!\n'
+                                'Завтра <strong>{tomorrow} до 12:00</strong>, отправь заказ.\n'
+                                'Поставщик: Мастер РТК\nСумма заказа от 5000 руб.',
+                                context, reply_markup=inline_order), False))
+    if context.weekday == 'вторник':
+        orders.append((Template('<strong>{full_name}</strong>, привет!\n'
+                                'Сегодня <strong>{today} до 12:00</strong>, отправь заказ.\n'
+                                'Поставщик: Мастер РТК\nСумма заказа от 5000 руб.',
+                                context, reply_markup=inline_order), False))
+    if context.weekday == 'понедельник':
+        orders.append((Template('<strong>{full_name}</strong>, привет!\n'
+                                'Завтра <strong>{tomorrow} до 16:00</strong>, отправь заказ.\n'
+                                'Поставщик: Десерт фентези\n'
+                                'Сумма заказа от 5000 руб.',
+                                context, reply_markup=inline_order), True))
+    if context.weekday == 'вторник':
+        orders.append((Template('<strong>{full_name}</strong>, привет!\n'
+                                'Сегодня <strong>{today} до 16:00</strong>, отправь заказ.\n'
+                                'Поставщик: Десерт фентези\n'
+                                'Сумма заказа от 5000 руб.',
+                                context, reply_markup=inline_order), True))
+
+    def rotation_template(point: str) -> Template:
+        # кнопка проверки своя у каждой точки, шаблон собирается один раз на точку
+        if point not in rotation:
+            rotation[point] = Template(
+                '<strong>{full_name}</strong>, привет!\n\n'
+                'Если ты в смене, проверь дату изготовления следующих позиций:\n'
+                '🔸 кофе;\n'
+                '🔸 молоко обычное;\n'
+                '🔸 молоко безлактозное;\n'
+                '🔸 молоко банановое;\n'
+                '🔸 молоко кокосовое;\n'
+                '🔸 молоко миндальное.\n\n'
+                '<i>При наличии, нескольких шт. товаров одного вида из перечисленных, '
+                'товар с подходящим сроком годности помести вперёд!</i>',
+                context,
+                reply_markup=create_inline_kb(btns={'Проверил! Ротация соблюдена': f'checkRotation_{point}'}))
+        return rotation[point]
+
+    def render(user: Recipient) -> list:
+        messages = []
+        if context.weekday == 'воскресенье':
+            messages.append(rotation_template(user.point).message(user))
+        messages += [template.message(user) for template, other_points in orders
+                     if not other_points or user.point != 'Балашиха']
+        return messages
+
+    await fan_out('reminder_order', segment(positions=ORDER_POSITIONS), render)
 
 
 # TODO оживить
@@ -216,7 +215,7 @@ async def send_reminder_order():
 async def revenue_by_day(user_id: Union[str, int] = None):
     """Отправка выручки за день в 00:05"""
 
-    date = pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=get_current_datetime(days=-1))
+    date = RenderContext.now().yesterday
     revenue = await google_revenue()  # await google_revenue(gs.BOOK_SALARY, gs.SHEET_SALARY)
 
     msg = f'<b>INFO {date}</b>\n' \
@@ -228,60 +227,35 @@ async def revenue_by_day(user_id: Union[str, int] = None):
     if user_id:
         await bot.send_message(user_id, msg)
     else:
-        for user_id in tg.BOSS:
-            try:
-                await bot.send_message(user_id, msg, reply_markup=boss_main_menu)
-            except Exception as ex:
-                logging.warning('Revenue by day: %s ошибка рассылки > %s', user_id, ex)
-                continue
+        await broadcaster.run('revenue', tg.BOSS, [message(msg, reply_markup=boss_main_menu)],
+                              log=DeliveryLog(run_id('revenue', '%Y-%m-%d')))
 
     logging.info('Revenue by day: %s > OK', dt_formatted())
 
 
 async def safe():
     """Отправка остатка в сейфе в 9:00 тем кто в смене"""
-    curr_datetime = get_current_datetime()
     data = await google_safe()  # await google_safe(gs.BOOK_SALARY, gs.SHEET_SAFE)
+    safe_by_point = by_point(data)
+    template = Template('<b>INFO {date}</b>\n'
+                        '💰 Остаток в сейфе\n'
+                        f'{"*" * 25}\n'
+                        '{safe}\n'
+                        '#Сейф', RenderContext.now())
 
-    async with AsyncSession(async_engine) as session:
-        users = await db.users_active_get(session)
-
-    schedule_today = await google_exits(offset=0, scheduled=True)
-
-    if schedule_today:
-        check = []
-        for user in users:
-            user_id = user.user_id
-            last_name = user.last_name
-            point = user.point
-            try:
-                if last_name in schedule_today and user_id not in check and user_id not in tg.BOSS:
-                    d = '\n'.join([f'{el[0]} {el[1]}' for el in data if el[0] == point and el[1] is not None])
-                    msg = f'<b>INFO {pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=curr_datetime)}</b>\n' \
-                          f'💰 Остаток в сейфе\n' \
-                          f'{"*" * 25}\n' \
-                          f'{d}\n' \
-                          f'#Сейф'
-                    logging.info(f'safe: {last_name} > {msg}')
-                    check.append(user_id)
-                    await bot.send_message(user_id, msg)
-            except Exception as ex:
-                logging.warning('Safe: %s %s ошибка рассылки > %s', user_id, user.full_name, ex)
-                continue
-
-        logging.info('Safe: %s > OK', dt_formatted())
-    else:
-        logging.warning('Safe: %s', curr_datetime)
+    def render(user: Recipient) -> list:
+        return [template.message(safe=safe_by_point.get(user.point, ''))]
+
+    await fan_out('safe', segment(exclude_user_ids=tg.BOSS), render, schedule=schedule_today)
 
 
 async def safe_boss(user_id: Union[str, int] = None, reply_markup=boss_main_menu):
     """Отправка остатка в сейфе"""
 
-    curr_datetime = get_current_datetime()
     values = await google_safe(boss=True)  # await google_safe(gs.BOOK_SALARY, gs.SHEET_SAFE, boss=True)
 
     if values:
-        msg = f'<b>INFO {pytils.dt.ru_strftime(u"%d %B %y, %a", inflected=True, date=curr_datetime)}</b>\n' \
+        msg = f'<b>INFO {RenderContext.now().date}</b>\n' \
               f'💰 Остаток в сейфе\n' \
               f'{"*" * 25}\n' \
               f'{values}\n' \
@@ -295,73 +269,35 @@ async def safe_boss(user_id: Union[str, int] = None, reply_markup=boss_main_menu
 
 async def send_comes_out():
     """`Выход завтра` напоминание"""
-    curr_datetime = get_current_datetime()
 
-    async with AsyncSession(async_engine) as session:
-        users = await db.users_active_get(session)
-
-    schedule_tomorrow = await google_exits(offset=1, scheduled=True)
-    # await exit_google(gs.BOOK_TABLE_ID, gs.SHEET_EXITS, period=2, staff_array=True)
-    if schedule_tomorrow:
-        check = []
-        for user in users:
-            user_id = user.user_id
-            last_name = user.last_name
-            first_name = user.first_name
-            point = user.point
-
-            try:
-                if last_name in schedule_tomorrow and user_id not in check and user_id not in tg.BOSS:
-                    msg = f'<strong>{first_name}</strong>, привет!\nЗавтра на работу: {point}.\n' \
-                          f'Если это не так, сообщи Александре @sasha_izy, она поправит график.'
-                    check.append(user_id)
-                    await bot.send_message(user_id, msg)
-                    logging.info(f'comes_out: {last_name} > OK')
-            except Exception as ex:
-                logging.warning('Send comes out: %s %s ошибка рассылки > %s', user_id, user.full_name, ex)
-                continue
-
-        logging.info('Send comes out: %s > OK', dt_formatted())
-    else:
-        logging.warning("Send comes out: %s", curr_datetime)
+    template = Template('<strong>{first_name}</strong>, привет!\nЗавтра на работу: {point}.\n'
+                        'Если это не так, сообщи Александре @sasha_izy, она поправит график.')
+
+    def render(user: Recipient) -> list:
+        return [template.message(user)]
+
+    await fan_out('comes_out', segment(exclude_user_ids=tg.BOSS), render, schedule=schedule_tomorrow)
 
 
 async def send_check_up():
     """Напоминание заполнить `Чек UP`"""
-    curr_datetime = get_current_datetime()
-
-    async with AsyncSession(async_engine) as session:
-        users = await db.users_active_get(session)
-
-    schedule_today = await google_exits(offset=0, scheduled=True)
-    # await exit_google(gs.BOOK_TABLE_ID, gs.SHEET_EXITS, period=1, staff_array=True)
-    if schedule_today:
-        check = []
-        for user in users:
-            user_id = user.user_id
-            last_name = user.last_name
-            first_name = user.first_name
-
-            try:
-                if last_name in schedule_today and user_id not in check:
-                    time = dt_formatted(5)
-                    check.append(user_id)
-
-                    if time == '09':
-                        await bot.send_message(user_id,
-                                               f'<strong>${first_name}</strong>, сфотографируй настроенный эспрессо и '
-                                               f'отправь фото с 9:50 до 10:00.\n'
-                                               f'"До 10", фото по точке отправь до 10:00!'
-                                               f'"До 12", видео по точке отправь до 12:00!')
-                    elif time == '21':
-                        await bot.send_message(user_id, f'<strong>${first_name}</strong>, смена подходит к концу.\n'
-                                                        f'Не забудь отправить отчет по точке после закрытия, до 00:00!')
-            except Exception as e:
-                logging.warning(f'{user_id}, {user.full_name} ошибка рассылки > {e}')
-                continue
-        logging.info(f'send_check_up {curr_datetime} > OK')
+    time = RenderContext.now().hour
+    if time == '09':
+        template = Template('<strong>{first_name}</strong>, сфотографируй настроенный эспрессо и '
+                            'отправь фото с 9:50 до 10:00.\n'
+                            '"До 10", фото по точке отправь до 10:00!'
+                            '"До 12", видео по точке отправь до 12:00!')
+    elif time == '21':
+        template = Template('<strong>{first_name}</strong>, смена подходит к концу.\n'
+                            'Не забудь отправить отчет по точке после закрытия, до 00:00!')
     else:
-        logging.warning(f'send_check_up {curr_datetime}')
+        logging.warning('send_check_up: нет напоминания на %s ч', time)
+        return
+
+    def render(user: Recipient) -> list:
+        return [template.message(user)]
+
+    await fan_out('check_up', segment(), render, schedule=schedule_today)
 
 
 async def write_off_coffee():
@@ -405,46 +341,28 @@ async def write_off_coffee():
 
 async def send_reminder_coffee_machine():
     """Напоминание `Очистка кофемолки по понедельникам`"""
-    curr_datetime = get_current_datetime()
-    weekday = pytils.dt.ru_strftime(u'%A', inflected=True, date=curr_datetime)
+    context = RenderContext.now()
+
+    if context.weekday != "понедельник":
+        logging.warning('send_reminder_coffee_machine %s', context.moment)
+        return
+
+    if context.hour == '10':
+        inline = create_inline_url_kb(btns={'Обучающее видео': 'https://clck.ru/gki6W'})
+        template = Template('<strong>{first_name}</strong>, привет!\n'
+                            'Сегодня {today} после смены нужно почистить кофемолку.\n'
+                            'Если не один в смене, распределите обязанности.',
+                            context, reply_markup=inline)
+    elif context.hour == '21':
+        template = Template('Уверен, ты не забыл почистить кофемолку.')
+    else:
+        logging.warning('send_reminder_coffee_machine: нет напоминания на %s ч', context.hour)
+        return
 
-    if weekday == "понедельник":
+    def render(user: Recipient) -> list:
+        return [template.message(user)]
 
-        async with AsyncSession(async_engine) as session:
-            users = await db.users_active_get(session)
-
-        now = pytils.dt.ru_strftime(u'%d.%m.%y', inflected=True, date=curr_datetime)
-        schedule_today = await google_exits(offset=0, scheduled=True)
-
-        if schedule_today:
-            check = []
-            for user in users:
-                user_id = user.user_id
-                last_name = user.last_name
-                first_name = user.first_name
-
-                try:
-                    if last_name in schedule_today and user_id not in check:
-                        time = dt_formatted(5)
-                        check.append(user_id)
-                        if time == '10':
-
-                            inline = create_inline_url_kb(
-                                btns={'Обучающее видео': 'https://clck.ru/gki6W'},
-                            )
-
-                            msg = f'<strong>{first_name}</strong>, привет!\n' \
-                                  f'Сегодня {now} после смены нужно почистить кофемолку.\n' \
-                                  f'Если не один в смене, распределите обязанности.'
-                            await bot.send_message(user_id, msg, reply_markup=inline)
-                        elif time == '21':
-                            await bot.send_message(user_id, f'Уверен, ты не забыл почистить кофемолку.')
-                except Exception as e:
-                    logging.warning(f'{user_id}, {user.full_name} ошибка рассылки > {e}')
-                    continue
-        logging.info(f'send_reminder_coffee_machine {curr_datetime} > OK')
-    else:
-        logging.warning(f'send_reminder_coffee_machine {curr_datetime}')
+    await fan_out('coffee_machine', segment(), render, schedule=schedule_today)
 
 # TODO оживить
 # async def update_supervisor_report():
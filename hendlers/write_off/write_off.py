@@ -1,15 +1,17 @@
+import contextlib
 import logging
 import os
 import re
 import decimal
+import time
 
 import aiofiles
-import pprintpp as pp
 from typing import Union
 
 from aiocsv import AsyncWriter
 from aiogram import Router, F
-from aiogram.filters import Command, or_f
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, and_f, or_f
 from aiogram.filters import StateFilter
 from aiogram.types import Message, FSInputFile, CallbackQuery
 from aiogram.fsm.context import FSMContext
@@ -20,10 +22,9 @@ from common.questions import sheets
 from core.bot import bot
 
 from core.config import settings, TgBot, GoogleSheetsSettings
-from database import async_engine, WriteOff, Product, Database
-from database.tabels import truncate_table
+from database import async_engine, WriteOff, Database
 
-from filters.filters import ChatTypeFilter
+from filters.filters import AdminFilter, ChatTypeFilter
 
 from structures.keybords import (
     points_menu,
@@ -51,12 +52,11 @@ from services.async_google_service import (
     google_write_off,
 )
 
-from services.path import create_dir, clear_dir, create_src
+from services import background
+from services.path import create_dir, clear_dir
 from structures.role import Role
 from utils.utils import includes_number, get_current_datetime
 
-pp = pp.PrettyPrinter(indent=4)
-
 tg: TgBot = settings.bot
 gs: GoogleSheetsSettings = settings.gs
 
@@ -87,28 +87,31 @@ async def cancel_write_off_handler(message: Message, state: FSMContext, db: Data
     await message.answer(answer_text, disable_web_page_preview=True, reply_markup=reply_markup)
 
 
-async def load_codes() -> Union[None, str]:
-    """Загрузка `кодов` товаров в БД(codes)"""
-    products = await google_get_all_records(gs.BOOK_WRITE_OFF_ID, gs.SHEET_CODES)
-    if len(products) > 0:
-        async with AsyncSession(async_engine) as session:
-
-            await truncate_table(Product)
-            products_list = [
-                Product(**{k: decimal.Decimal(str(v).replace(' ', ',')) if k == 'price' else v for k, v in p.items()})
-                for p in products]
-            await Database(session).product.add_all(products=products_list)
-
-            # for product in products:
-            #     try:
-            #         product['price'] = decimal.Decimal(str(product['price']).replace(' ', ','))
-            #         await Database(session).product.add(Product(**product))
-            #     except decimal.ConversionSyntax:
-            #         logging.warning("Invalid price value: %s", product.get("price"))
-            #         continue
-    else:
+def _product_row(row: dict) -> Union[None, dict]:
+    """Строка листа кодов в поля Product, None если код или цена не читаются"""
+    try:
+        return {**row,
+                'code': int(row['code']),
+                'price': float(decimal.Decimal(str(row['price']).replace(' ', '').replace(',', '.') or 0))}
+    except (KeyError, ValueError, decimal.InvalidOperation):
+        logging.warning('Invalid product row: %s', row)
+        return None
+
+
+async def load_codes() -> str:
+    """Синхронизация `кодов` товаров в БД(products) с гугл таблицей, только изменившиеся строки"""
+    records = await google_get_all_records(gs.BOOK_WRITE_OFF_ID, gs.SHEET_CODES)
+    products = [product for product in map(_product_row, records) if product]
+    if not products:
         return 'Нет данных для добавления 🤷‍♂'
 
+    async with AsyncSession(async_engine) as session:
+        report = await Database(session).product.sync(products)
+    logging.info('Products sync: %s', report)
+    if not report.changed:
+        return f'Коды товаров не изменились 👌 ({report.unchanged})'
+    return f'Базу кодов обновили 😁\n{report}'
+
 
 @router.message(StateFilter(None), F.text.lower().in_(['♻ списать', 'списание', 'списать']))
 async def write_off_start(message: Message, state: FSMContext, db: Database):
@@ -226,10 +229,10 @@ async def write_off_file(message: Message, state: FSMContext, db: Database):
         await state.update_data(file=message.photo[-1].file_id)
         d = await state.get_data()
 
-        src, date_time, product = await _get_src(message, d, db=db)
+        file, date_time, product = await _get_src(message, d, db=db)
         name = f'{d["point"]}_{date_time.strftime("%d_%m_%y %H_%M_%S")}_code_{d["code"]}'
 
-        file_id = await google_save_file(name=name, file_path=src)
+        file_id = await google_save_file(name=name, source=file)
 
         expense_company = 'Списание без МОЛ' if d['reason'] == 'Реклама' else None
 
@@ -248,7 +251,6 @@ async def write_off_file(message: Message, state: FSMContext, db: Database):
                                   expense_company])
 
         # TODO product.product в product.name
-        clear_dir(user_id)
         msg = (f'<b>⚠ Новое списание</b>\n'
                f'{"*" * 25}\n'
                f'Точка: <b>{d["point"]}</b>\n'
@@ -424,10 +426,10 @@ async def grind_setting_file(message: Message, state: FSMContext, db: Database):
                 await state.update_data(file=message.video.file_id)
                 d = await state.get_data()
 
-                src, date_time, product = await _get_src(message, d, dir_type="video", db=db)
+                file, date_time, product = await _get_src(message, d, dir_type="video", db=db)
                 name = f'{d["point"]}_{date_time.strftime("%d_%m_%y %H_%M_%S")}_setting_coffee_machine'
 
-                file_id = await google_save_file(name=name, file_path=src, mime_type='video/mp4')
+                file_id = await google_save_file(name=name, source=file, mime_type='video/mp4')
 
                 if d['point'] in sheets:
                     await google_add_row(
@@ -446,7 +448,6 @@ async def grind_setting_file(message: Message, state: FSMContext, db: Database):
                          expense_company]
                     )
 
-                clear_dir(user_id, dir_type="video")
                 msg = f'Добавили списание 👍\n' \
                       f'{"*" * 25}\n' \
                       f'Точка: <b>{d["point"]}</b>\n' \
@@ -492,10 +493,10 @@ async def grind_setting_file(message: Message, state: FSMContext, db: Database):
                 await state.update_data(file=message.photo[-1].file_id)
                 d = await state.get_data()
 
-                src, date_time, product = await _get_src(message, await state.get_data(), db=db)
+                file, date_time, product = await _get_src(message, await state.get_data(), db=db)
                 name = f'{d["point"]}_{date_time.strftime("%d_%m_%y %H_%M_%S")}_setting_coffee_machine'
 
-                file_id = await google_save_file(name=name, file_path=src)
+                file_id = await google_save_file(name=name, source=file)
 
                 if d['point'] in sheets:
                     await google_add_row(
@@ -514,7 +515,6 @@ async def grind_setting_file(message: Message, state: FSMContext, db: Database):
                          expense_company]
                     )
 
-                clear_dir(user_id)
                 msg = f'Добавили списание 👍\n' \
                       f'{"*" * 25}\n' \
                       f'Точка: <b>{d["point"]}</b>\n' \
@@ -580,14 +580,10 @@ async def _send_other(message, msg):
 
 
 async def _get_src(message: Message, state: dict, db: Database, dir_type: str = None):
-    """Вспомогательная функция"""
-    create_dir(message.from_user.id, dir_type=dir_type) if dir_type == "video" else create_dir(message.from_user.id)
+    """Вспомогательная функция, файл скачивается в память (BytesIO) без записи на диск"""
     file_info = await bot.get_file(message.video.file_id) if dir_type == "video" else await bot.get_file(
         message.photo[len(message.photo) - 1].file_id)
-    downloaded_file = await bot.download_file(file_info.file_path)
-    src = create_src(message.from_user.id, file_info.file_path)
-    with open(src, 'wb') as new_file:
-        new_file.write(downloaded_file.getvalue())
+    file = await bot.download_file(file_info.file_path)
 
     date_time = get_current_datetime()
     logging.info("State: %s", state)
@@ -597,7 +593,7 @@ async def _get_src(message: Message, state: dict, db: Database, dir_type: str =
     code = state["code"]
     product = await db.product.get_one(code)
 
-    return src, date_time, product
+    return file, date_time, product
 
 
 @router.message(StateFilter(None), F.text.lower() == '📩 списания')
@@ -638,19 +634,50 @@ async def write_off_send_end(message: Message, state: FSMContext):
 async def update_codes_base(message: Message):
     """Обновляет базу кодов товаров"""
     async with ChatActionSender.typing(chat_id=message.from_user.id, bot=bot):
-        msg = await load_codes()
-        if msg:
-            await message.answer(msg, reply_markup=boss_other_menu)
-        else:
-            await message.answer('Базу кодов обновили 😁', reply_markup=boss_other_menu)
-
-
-@router.message(F.text.lower() == '🆑 удалить фото')
-async def clear_folder(message: Message):
-    """Очистить папку с фотографиями списаний"""
-    async with ChatActionSender.typing(chat_id=message.from_user.id, bot=bot):
-        await google_clear_folder(gs.FOLDER_ID_PHOTO_SAVE)
-        await message.answer('Очистили папку списаний', reply_markup=boss_other_menu)
+        await message.answer(await load_codes(), reply_markup=boss_other_menu)
+
+
+@router.message(and_f(AdminFilter(), or_f(F.text.lower() == '🆑 удалить фото', Command('clear_photo'))))
+async def clear_folder(message: Message, command: CommandObject = None):
+    """Очистить папку с фотографиями списаний в фоне, /clear_photo N - только старше N дней"""
+    if background.running('clear-photo'):
+        await message.answer('Папку списаний уже очищаем ⏳', reply_markup=boss_other_menu)
+        return
+
+    days = None
+    if command and command.args:
+        if not command.args.strip().isdigit():
+            await message.answer('Укажи число дней: /clear_photo 30 - удалить фото старше 30 дней',
+                                 reply_markup=boss_other_menu)
+            return
+        days = int(command.args)
+    status = await message.answer('Собираем фото для удаления ⏳')
+    background.spawn(_clear_photo(status, days), name='clear-photo')
+
+
+async def _clear_photo(status: Message, days: int = None):
+    """Очистка папки списаний с обновлением сообщения о прогрессе"""
+    edited_at = 0.0
+
+    async def progress(deleted: int, failed: int, total: int):
+        nonlocal edited_at
+        if deleted + failed < total and time.monotonic() - edited_at < 3:
+            return
+        edited_at = time.monotonic()
+        with contextlib.suppress(TelegramBadRequest):
+            await status.edit_text(f'Удаляем фото: {deleted + failed} из {total} ⏳')
+
+    try:
+        deleted, failed = await google_clear_folder(gs.FOLDER_ID_PHOTO_SAVE, older_than_days=days, progress=progress)
+    except Exception as ex:
+        logging.error('Clear folder: %s', ex, exc_info=True)
+        await status.answer('Не получилось очистить папку списаний 😔', reply_markup=boss_other_menu)
+        return
+
+    msg = f'Очистили папку списаний, удалено фото: {deleted}'
+    if failed:
+        msg += f', не удалось удалить: {failed}'
+    await status.answer(msg, reply_markup=boss_other_menu)
 
 
 @router.message(or_f(Command("cancel"), (F.text.lower().in_({'отмена', 'отменить', '❌ отмена', '⬆ выйти'}))))
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Отложенная пакетная запись строк в гугл таблицы.
+
+``put()`` сохраняет строку в локальный SQLite спул и сразу возвращает управление.
+Фоновая задача раз в ``flush_interval`` секунд (или при накоплении ``batch_size`` строк)
+отправляет накопленные строки одним ``append_rows`` на каждый лист (book_id, sheet_name).
+Строка удаляется из спула только после успешной отправки, поэтому сбой Google API или
+перезапуск бота не теряют данные: при старте неотправленное досылается. Временные ошибки
+(429, 5xx, сеть) повторяются без ограничения числа попыток с паузой до 60 с; пока идёт пауза,
+новые строки её не сокращают. Постоянные ошибки 4xx (лист удалён или переименован, неверное
+значение) не повторяются: строки уходят в таблицу dead_rows спула, пачка с неверным значением
+делится пополам, чтобы отложить только саму строку. Строки берутся по каждому листу отдельно,
+поэтому сломанный лист не задерживает остальные. Размер спула, число отложенных строк и число
+неудачных попыток самой старой строки отдаются в ``metrics`` (``append.pending``, ``append.dead``,
+``append.attempts``), после alert_after попыток пишется ошибка в лог.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from cache.snapshot import Snapshot
+from core.config import settings, GoogleSheetsSettings
+from services.metrics import metrics
+from services.rate_limit import error_status, is_retryable
+
+gs: GoogleSheetsSettings = settings.gs
+
+Key = Tuple[str, str]
+
+
+class _Spool:
+    """SQLite файл с неотправленными строками, вызовы идут из потоков asyncio.to_thread."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS rows ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'book_id TEXT NOT NULL, '
+            'sheet_name TEXT NOT NULL, '
+            'row TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS dead_rows ('
+            'id INTEGER PRIMARY KEY, '
+            'book_id TEXT NOT NULL, '
+            'sheet_name TEXT NOT NULL, '
+            'row TEXT NOT NULL, '
+            'error TEXT NOT NULL, '
+            "dead_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+
+    def add(self, book_id: str, sheet_name: str, row: str) -> None:
+        with self._lock:
+            self._conn.execute('INSERT INTO rows (book_id, sheet_name, row) VALUES (?, ?, ?)',
+                               (book_id, sheet_name, row))
+
+    def pending(self, limit: int) -> List[tuple]:
+        """Самые старые строки каждого листа, не больше limit на лист."""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT id, book_id, sheet_name, row FROM ('
+                'SELECT *, ROW_NUMBER() OVER (PARTITION BY book_id, sheet_name ORDER BY id) AS n FROM rows'
+                ') WHERE n <= ? ORDER BY id', (limit,)
+            ).fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+
+    def count_sheet(self, book_id: str, sheet_name: str) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM rows WHERE book_id = ? AND sheet_name = ?',
+                                      (book_id, sheet_name)).fetchone()[0]
+
+    def attempts(self) -> int:
+        """Наибольшее число неудачных попыток среди неотправленных строк."""
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(MAX(attempts), 0) FROM rows').fetchone()[0]
+
+    def dead_count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM dead_rows').fetchone()[0]
+
+    def bury(self, where: str, params: list, error: str) -> int:
+        """Перенести строки rows WHERE where в dead_rows, отправка их больше не повторяет."""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                count = self._conn.execute(
+                    'INSERT INTO dead_rows (id, book_id, sheet_name, row, error) '
+                    f'SELECT id, book_id, sheet_name, row, ? FROM rows WHERE {where}', [error, *params]).rowcount
+                self._conn.execute(f'DELETE FROM rows WHERE {where}', params)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return count
+
+    def bury_rows(self, ids: List[int], error: str) -> int:
+        return self.bury(f'id IN ({", ".join("?" * len(ids))})', ids, error)
+
+    def bury_sheet(self, book_id: str, sheet_name: str, error: str) -> int:
+        return self.bury('book_id = ? AND sheet_name = ?', [book_id, sheet_name], error)
+
+    def done(self, ids: List[int]) -> None:
+        with self._lock:
+            self._conn.executemany('DELETE FROM rows WHERE id = ?', [(i,) for i in ids])
+
+    def retry(self, ids: List[int]) -> None:
+        with self._lock:
+            self._conn.executemany('UPDATE rows SET attempts = attempts + 1 WHERE id = ?', [(i,) for i in ids])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class AppendQueue:
+    """Очередь строк для google_add_row."""
+
+    def __init__(self, path: str, flush_interval: float = 2.0, batch_size: int = 50, alert_after: int = 20,
+                 max_delay: float = 60.0):
+        """
+        :param path: путь до файла спула
+        :param flush_interval: как часто отправлять накопленные строки, сек.
+        :param batch_size: сколько строк отправлять не дожидаясь интервала
+        :param alert_after: после скольких неудачных отправок строки писать ошибку в лог
+        :param max_delay: наибольшая пауза между попытками после неудачи, сек.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.alert_after = alert_after
+        self.max_delay = max_delay
+
+        self._spool: Union[_Spool, None] = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Union[asyncio.Task, None] = None
+        self._queued = 0
+        # последняя отправка не удалась, ждём паузу и не будим отправку новыми строками
+        self._backoff = False
+
+    @property
+    def spool(self) -> _Spool:
+        if self._spool is None:
+            self._spool = _Spool(self.path)
+        return self._spool
+
+    async def start(self) -> None:
+        """Запуск фоновой отправки, неотправленное до перезапуска уходит первым."""
+        dead = await asyncio.to_thread(self.spool.dead_count)
+        if dead:
+            logging.error('Append queue: %s строк отложено после постоянных ошибок (dead_rows в %s)', dead, self.path)
+        self._queued = await asyncio.to_thread(self.spool.count)
+        await self._report()
+        if self._queued:
+            logging.info('Append queue: %s строк ожидают отправки', self._queued)
+            self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='google-append-queue')
+
+    async def stop(self) -> None:
+        """Остановка с последней попыткой отправить накопленное."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    async def put(self, book_id: str, sheet_name: str, row: Union[list, tuple]) -> None:
+        """Поставить строку в очередь на лист (sheet_name) книги book_id.
+
+        :param book_id: id гугл таблицы
+        :param sheet_name: имя листа гугл таблицы
+        :param row: массив данных
+        """
+        await asyncio.to_thread(self.spool.add, book_id, sheet_name, json.dumps(list(row), ensure_ascii=False))
+        self._queued += 1
+        if self._queued >= self.batch_size and not self._backoff:
+            self._wakeup.set()
+
+    async def queued(self, book_id: str, sheet_name: str) -> int:
+        """Кол-во неотправленных строк листа (sheet_name) книги book_id."""
+        if not self._queued:
+            return 0
+        return await asyncio.to_thread(self.spool.count_sheet, book_id, sheet_name)
+
+    async def flush(self) -> int:
+        """Отправить всё накопленное, возвращает кол-во отправленных строк."""
+        async with self._flush_lock:
+            sent = 0
+            # листы, отправка на которые в этом проходе не удалась
+            failed: Set[Key] = set()
+            while True:
+                rows = await asyncio.to_thread(self.spool.pending, self.batch_size)
+                groups: Dict[Key, List[tuple]] = defaultdict(list)
+                for row_id, book_id, sheet_name, row in rows:
+                    if (book_id, sheet_name) not in failed:
+                        groups[(book_id, sheet_name)].append((row_id, json.loads(row)))
+                if not groups:
+                    break
+
+                for key, items in groups.items():
+                    appended = await self._send(key, items)
+                    if appended is None:
+                        failed.add(key)
+                    else:
+                        sent += appended
+
+            self._queued = await asyncio.to_thread(self.spool.count)
+            await self._report()
+            return sent
+
+    async def _report(self) -> None:
+        attempts = await asyncio.to_thread(self.spool.attempts)
+        metrics.set('append.pending', self._queued)
+        metrics.set('append.dead', await asyncio.to_thread(self.spool.dead_count))
+        metrics.set('append.attempts', attempts)
+        if attempts and attempts % self.alert_after == 0:
+            logging.error('Append queue: %s строк не отправляются уже %s попыток', self._queued, attempts)
+
+    async def _send(self, key: Key, items: List[tuple]) -> Optional[int]:
+        """Отправить строки на лист, возвращает кол-во дописанных строк,
+        None - временная ошибка, строки остались в спуле."""
+        from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
+        from gspread.utils import ValueInputOption
+        from services.async_google_service import GoogleSheetAsyncClient
+
+        book_id, sheet_name = key
+        ids = [row_id for row_id, _ in items]
+        try:
+            ws = await GoogleSheetAsyncClient.worksheet(book_id, sheet_name)
+        except (SpreadsheetNotFound, WorksheetNotFound) as ex:
+            # листа нет: откладываем все его строки, а не только эту пачку
+            await self._bury(key, ex)
+            return 0
+        except Exception as ex:
+            return await self._failed(key, ids, ex)
+
+        try:
+            await ws.append_rows(values=[row for _, row in items], value_input_option=ValueInputOption.user_entered)
+        except Exception as ex:
+            if not _permanent(ex):
+                return await self._failed(key, ids, ex)
+            if len(items) == 1 or error_status(ex) != 400:
+                await self._bury(key, ex, ids)
+                return 0
+            # неверное значение в одной из строк: делим пачку, чтобы отложить только её
+            half = len(items) // 2
+            first, second = await self._send(key, items[:half]), await self._send(key, items[half:])
+            return None if first is None or second is None else first + second
+
+        await asyncio.to_thread(self.spool.done, ids)
+        for snapshot in Snapshot.by_sheet(book_id, sheet_name):
+            snapshot.invalidate()
+        logging.info('Google add rows: %s: %s строк', sheet_name, len(ids))
+        return len(ids)
+
+    async def _failed(self, key: Key, ids: List[int], ex: Exception) -> None:
+        logging.warning('Append queue: %s!%s не отправили %s строк', *key, len(ids), exc_info=ex)
+        metrics.inc('append.errors')
+        await asyncio.to_thread(self.spool.retry, ids)
+        return None
+
+    async def _bury(self, key: Key, ex: Exception, ids: Optional[List[int]] = None) -> None:
+        """Отложить в dead_rows строки ids или, без ids, все строки листа."""
+        if ids is None:
+            count = await asyncio.to_thread(self.spool.bury_sheet, *key, repr(ex))
+        else:
+            count = await asyncio.to_thread(self.spool.bury_rows, ids, repr(ex))
+        metrics.inc('append.dead_rows', count)
+        logging.error('Append queue: %s!%s постоянная ошибка, %s строк отложено в dead_rows: %r', *key, count, ex)
+
+    async def _run(self) -> None:
+        delay = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as ex:
+                logging.error('Append queue: ошибка отправки', exc_info=ex)
+
+            # пока есть что слать после неудачи, увеличиваем паузу, чтобы не долбить API
+            self._backoff = bool(self._queued)
+            delay = min(delay * 2, self.max_delay) if self._backoff else self.flush_interval
+
+
+def _permanent(ex: Exception) -> bool:
+    """Ошибка 4xx, которую повтор не исправит."""
+    status = error_status(ex)
+    return status is not None and 400 <= status < 500 and not is_retryable(ex)
+
+
+append_queue = AppendQueue(
+    path=gs.APPEND_SPOOL,
+    flush_interval=gs.APPEND_FLUSH_INTERVAL,
+    batch_size=gs.APPEND_BATCH_SIZE,
+)
@@ -1,28 +1,28 @@
 import logging
-from datetime import datetime, timedelta, time
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta
 from pprint import pformat
-from typing import List, Union
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional, Set, Tuple, Union
 import calendar
 
-import pandas as pd
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
-
-import google.auth.transport.requests
-
-from gspread.utils import ValueRenderOption, ValueInputOption
-
-from gspread_asyncio import (
-    AsyncioGspreadClientManager,
-    AsyncioGspreadClient,
-    AsyncioGspreadSpreadsheet,
-    AsyncioGspreadWorksheet,
-)
-
+from cache.snapshot import Snapshot
 from core.config import settings, GoogleSheetsSettings
-from utils.utils import get_current_datetime
+from services import google_drive
+from services.append_queue import append_queue
+from services.metrics import metrics
+from services.schedule import SCHEDULE_COLUMNS, ScheduleSnapshot
+from services.sheet_reader import BookRanges, column_letter, column_number, sheet_reader
+from utils.utils import get_current_datetime, parse_datetime
+
+if TYPE_CHECKING:
+    # gspread и gspread_asyncio импортируются при первом обращении к таблицам, не при старте бота
+    from google.oauth2.service_account import Credentials
+    from gspread_asyncio import (
+        AsyncioGspreadClientManager,
+        AsyncioGspreadClient,
+        AsyncioGspreadSpreadsheet,
+        AsyncioGspreadWorksheet,
+    )
 
 gs: GoogleSheetsSettings = settings.gs
 
@@ -36,30 +36,106 @@ SCOPES = [
 
 
 class GoogleSheetAsyncClient:
-    def __init__(self):
-        self.table_id = None
-        self.sheet_name = None
-        self.agcm = None
-        self.agc = None
-        self.ss = None
-        self.ws = None
-
-    @staticmethod
-    def __get_credentials():
-        return Credentials.from_service_account_file(filename=gs.credentials).with_scopes(
-            SCOPES)  # gs.credentials
-
-    async def __aenter__(self) -> AsyncioGspreadClient:
-        self.agcm = AsyncioGspreadClientManager(self.__get_credentials)
-        self.agc = await self.agcm.authorize()
-        # self.ss = await self.agc.open_by_key(self.table_id)
-        # self.ws = await self.ss.worksheet(self.sheet_name)
-        return self.agc
+    """Общий на процесс клиент Google Sheets.
+
+    Менеджер клиента создаётся один раз и сам обновляет токен: ``authorize()`` кеширует
+    авторизацию и переавторизуется только по истечении ``reauth_interval``.
+    Открытые книги и листы хранятся в LRU по ключу (book_id, sheet_name), поэтому
+    повторные вызовы не тратят запросы на ``open_by_key``/``worksheet``.
+
+    Использование::
+
+        ws = await GoogleSheetAsyncClient.worksheet(gs.BOOK_SALARY, gs.SHEET_SAFE)
+
+        async with GoogleSheetAsyncClient() as client:
+            ss = await client.open_by_key(book_id)
+    """
+
+    max_handles: int = 32
+
+    _agcm: Optional['AsyncioGspreadClientManager'] = None
+    _handles: "OrderedDict[Tuple[str, Optional[str]], Any]" = OrderedDict()
+
+    async def __aenter__(self) -> 'AsyncioGspreadClient':
+        return await self.client()
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        self.agc = None
-        self.agcm = None
-    #
+        pass
+
+    @classmethod
+    def manager(cls) -> 'AsyncioGspreadClientManager':
+        """Менеджер клиента, создаётся при первом обращении."""
+        if cls._agcm is None:
+            from services.sheets_manager import QuotaClientManager
+            cls._agcm = QuotaClientManager(get_credentials)
+        return cls._agcm
+
+    @classmethod
+    def use(cls, agcm: Optional['AsyncioGspreadClientManager']) -> None:
+        """Подменить менеджер клиента (benchmarks.google_fake), None - вернуть настоящий.
+
+        LRU открытых книг и листов очищается, они принадлежат прежнему менеджеру.
+        """
+        cls._agcm = agcm
+        cls._handles.clear()
+
+    @classmethod
+    async def client(cls) -> 'AsyncioGspreadClient':
+        """Авторизованный клиент (токен обновляется менеджером)."""
+        return await cls.manager().authorize()
+
+    @classmethod
+    async def spreadsheet(cls, book_id: str) -> 'AsyncioGspreadSpreadsheet':
+        """Книга по id из LRU, открывается при промахе.
+
+        :param book_id: id гугл таблицы
+        """
+        key = (book_id, None)
+        ss = cls._cached(key)
+        if ss is None:
+            client = await cls.client()
+            ss = await client.open_by_key(book_id)
+            cls._remember(key, ss)
+        return ss
+
+    @classmethod
+    async def worksheet(cls, book_id: str, sheet_name: str) -> 'AsyncioGspreadWorksheet':
+        """Лист книги из LRU, открывается при промахе.
+
+        :param book_id: id гугл таблицы
+        :param sheet_name: имя листа гугл таблицы
+        """
+        key = (book_id, sheet_name)
+        ws = cls._cached(key)
+        if ws is None:
+            ss = await cls.spreadsheet(book_id)
+            ws = await ss.worksheet(sheet_name)
+            cls._remember(key, ws)
+        return ws
+
+    @classmethod
+    def evict(cls, book_id: str, sheet_name: str = None) -> None:
+        """Удалить из LRU лист или книгу со всеми её листами (лист переименовали, удалили)."""
+        if sheet_name is not None:
+            cls._handles.pop((book_id, sheet_name), None)
+            return
+        for key in [key for key in cls._handles if key[0] == book_id]:
+            del cls._handles[key]
+
+    @classmethod
+    def _cached(cls, key: Tuple[str, Optional[str]]):
+        handle = cls._handles.get(key)
+        if handle is not None:
+            cls._handles.move_to_end(key)
+        return handle
+
+    @classmethod
+    def _remember(cls, key: Tuple[str, Optional[str]], handle) -> None:
+        cls._handles[key] = handle
+        cls._handles.move_to_end(key)
+        while len(cls._handles) > cls.max_handles:
+            cls._handles.popitem(last=False)
+
     # async def spreadsheet(self, table_id):
     #     self.table_id = table_id
     #     self.ss = await self.agc.open_by_key(self.table_id)
@@ -112,17 +188,20 @@ class GoogleSheetAsyncClient:
     #     await self.ws.clear()
 
 
+# выручка и сейф читаются одним запросом, кнопки админов и рассылка в 9:00 берут значения из кеша
+salary = BookRanges(
+    'salary',
+    gs.BOOK_SALARY,
+    {'revenue': (gs.SHEET_SALARY, 'A2:B7'), 'safe': (gs.SHEET_SAFE, 'A2:B7')},
+    ttl=gs.DASHBOARD_TTL,
+)
+
+
 async def google_safe(boss: bool = False) -> str | list:
     """`Выручка за день` из гугл таблицы.
     :param boss: строка для отчета остатки в сейфе
     """
-    async with GoogleSheetAsyncClient() as client:
-        # ws = await client.worksheet(gs.BOOK_SALARY, gs.SHEET_SAFE)
-
-        ss = await client.open_by_key(gs.BOOK_SALARY)
-        ws = await ss.worksheet(gs.SHEET_SAFE)
-
-        values = await ws.get_values('A2:B7')
+    values = await salary.get('safe')
     if boss:
         return '\n'.join([f'{v[0]} {v[1]}' for v in values if any(v) and v[0] != '']).replace('Итого', '<b>Итого</b>')
     return values[:-1]
@@ -130,15 +209,33 @@ async def google_safe(boss: bool = False) -> str | list:
 
 async def google_revenue() -> str:
     """`Выручка за день` из гугл таблицы."""
-    async with GoogleSheetAsyncClient() as client:
-        # ws = await client.worksheet(gs.BOOK_SALARY, gs.SHEET_SALARY)
+    values = await salary.get('revenue')
+
+    return '\n'.join([f'{v[0]} {v[1]}' for v in values if any(v) and v[0] != '']).replace('Итого', '<b>Итого</b>')
 
-        ss = await client.open_by_key(gs.BOOK_SALARY)
-        ws = await ss.worksheet(gs.SHEET_SALARY)
 
-        values = await ws.get_values('A2:B7')
+async def _load_schedule() -> ScheduleSnapshot:
+    # запросы идут не раньше начала текущего месяца (offset=30), старые смены не читаем
+    since = get_current_datetime().date().replace(day=1)
+    reader = sheet_reader(gs.BOOK_TABLE_ID, gs.SHEET_EXITS)
+    return ScheduleSnapshot.from_rows(await reader.tail(SCHEDULE_COLUMNS, 'Дата', since))
 
-    return '\n'.join([f'{v[0]} {v[1]}' for v in values if any(v) and v[0] != '']).replace('Итого', '<b>Итого</b>')
+
+schedule = Snapshot('schedule', _load_schedule, ttl=gs.SCHEDULE_TTL, book_id=gs.BOOK_TABLE_ID,
+                    sheet_name=gs.SHEET_EXITS)
+
+
+def _exits_period(offset: int) -> Tuple[date, date]:
+    """Период [start, end) для google_exits по offset."""
+    today = get_current_datetime().date()
+    if offset == 1:
+        return today + timedelta(days=1), today + timedelta(days=2)
+    if offset == 7:
+        return today, today + timedelta(days=7)
+    if offset == 30:
+        month_start = today.replace(day=1)
+        return month_start, month_start + timedelta(days=calendar.monthrange(today.year, today.month)[1])
+    return today, today + timedelta(days=1)
 
 
 async def google_exits(
@@ -160,67 +257,32 @@ async def google_exits(
             30 + employee - месяц, по сотруднику.
     :param boss: True, если отчет для администратора
     """
+    snapshot = await schedule.get()
+    if not len(snapshot):
+        return None
 
-    async with GoogleSheetAsyncClient() as client:
-        # ws = await client.worksheet(gs.BOOK_TABLE_ID, gs.SHEET_EXITS)
-
-        ss = await client.open_by_key(gs.BOOK_TABLE_ID)
-        ws = await ss.worksheet(gs.SHEET_EXITS)
-
-        values = await ws.get_values()
-
-    if values:
-
-        df = pd.DataFrame(values[1:], columns=values[0])
-        df['Дата'] = pd.to_datetime(df['Дата'])
-        date_start = None
-        date_end = None
-
-        if offset == 0:
-            # сегодня
-            date_start = datetime.combine(datetime.now(), time(0, 0))
-            date_end = datetime.combine(date_start + timedelta(days=1), time(0, 0))
-
-        elif offset == 1:
-            # завтра
-            date_start = datetime.combine(datetime.now() + timedelta(days=1), time(0, 0))
-            date_end = datetime.combine(date_start + timedelta(days=1), time(0, 0))
-
-        elif offset == 30:
-            # месяц по сотруднику
-            date = get_current_datetime()
-            date_start = datetime(date.year, date.month, 1)
-            date_end = datetime(date.year, date.month, 1) + timedelta(
-                days=calendar.monthrange(date.year, date.month)[1])
-
-        elif offset == 7:
-            date_start = datetime.combine(datetime.now(), time(0, 0))
-            date_end = datetime.combine(date_start + timedelta(days=7), time(0, 0))
-
-        df = df.loc[
-            (df['Сотрудник'] == employee) & (df['Дата'] >= date_start) & (df['Дата'] < date_end)] if employee else \
-            df.loc[(df['Дата'] >= date_start) & (df['Дата'] < date_end)]
+    date_start, date_end = _exits_period(offset)
+    shifts = snapshot.employee(employee, date_start, date_end) if employee else \
+        snapshot.between(date_start, date_end)
+    shifts = sorted(shifts, key=lambda shift: (shift.point, shift.employee))
 
-        df['Дата'] = df['Дата'].dt.strftime('%d.%m.%y')
-        df = df[['Дата', 'Сотрудник', 'Точка', 'Смена']].sort_values(['Точка', 'Сотрудник'])
+    if scheduled:
+        return [shift.last_name for shift in shifts]
+    elif not scheduled and not boss and not employee and len(shifts):
+        return tuple(f'Дата: {s.date:%d.%m.%y}\nСотрудник: {s.employee}\nТочка: {s.point}\nСмена: {s.hours} часов'
+                     for s in shifts)
+    else:
 
-        if scheduled:
-            return [i[1].split(" ")[0] for i in df.values if i[1] is not None]
-        elif not scheduled and not boss and not employee and len(df.values):
-            return tuple(f'Дата: {i[0]}\nСотрудник: {i[1]}\nТочка: {i[2]}\nСмена: {i[3]} часов' for i in df.values)
+        if boss:
+            data = tuple(f'Дата: {s.date:%d.%m.%y}\nСотрудник: {s.employee}\nТочка: {s.point}\nСмена: {s.hours} часов'
+                         for s in shifts)
         else:
+            data = tuple(f'Дата: {s.date:%d.%m.%y}\nТочка: {s.point}\nСмена: {s.hours} часов' for s in shifts)
 
-            if boss:
-                data = tuple(f'Дата: {i[0]}\nСотрудник: {i[1]}\nТочка: {i[2]}\nСмена: {i[3]} часов' for i in df.values)
-            else:
-                data = tuple(f'Дата: {i[0]}\nТочка: {i[2]}\nСмена: {i[3]} часов' for i in df.values)
-
-            if len(data):
-                return f'\n{"*" * 15}\n'.join(data)
-            else:
-                return 'Не могу найти график 😕'
-    else:
-        return None
+        if len(data):
+            return f'\n{"*" * 15}\n'.join(data)
+        else:
+            return 'Не могу найти график 😕'
 
 
 async def google_exits_by_point(point: str, s_date: int = 1, e_date: int = 2) -> list:
@@ -230,30 +292,13 @@ async def google_exits_by_point(point: str, s_date: int = 1, e_date: int = 2) ->
     :param s_date: тип даты старт 0 (сегодня), 1 (завтра)
     :param e_date: тип даты старт 1 (завтра), 2 (послезавтра)
     """
-    async with GoogleSheetAsyncClient() as client:
-        # ws = await client.worksheet(gs.BOOK_TABLE_ID, gs.SHEET_EXITS)
-
-        ss = await client.open_by_key(gs.BOOK_TABLE_ID)
-        ws = await ss.worksheet(gs.SHEET_EXITS)
-
-        values = await ws.get_values()
+    snapshot = await schedule.get()
 
-    df = pd.DataFrame(values[1:], columns=values[0])
-    df['Дата'] = pd.to_datetime(df['Дата'])
+    today = get_current_datetime().date()
+    shifts = snapshot.at_point(point, today + timedelta(days=s_date), today + timedelta(days=e_date))
 
-    # date_start = get_current_datetime(s_date)
-    # date_start = datetime(date_start.year, date_start.month, date_start.day)
-    # date_end = get_current_datetime(e_date)
-    # date_end = datetime(date_end.year, date_end.month, date_end.day)
-
-    date_start = datetime.combine(datetime.now() + timedelta(days=s_date), time(0, 0))
-    date_end = datetime.combine(datetime.now() + timedelta(days=e_date), time(0, 0))
-
-    df = df.loc[(df['Дата'] >= date_start) & (df['Дата'] < date_end) & (df['Точка'] == point)]
-    df = df[['chat_id']].sort_values(['chat_id'])
-
-    if len(df.values):
-        return [int(i[0]) for i in df.values if i[0] is not None]
+    if shifts:
+        return sorted(shift.chat_id for shift in shifts if shift.chat_id is not None)
 
 
 # async def google_exits(employee: str = None, period: int = 1, boss: bool = False) -> str:
@@ -322,23 +367,23 @@ async def google_exits_by_point(point: str, s_date: int = 1, e_date: int = 2) ->
 #         return 'Не могу найти график 😕'
 
 
-async def google_write_off(sheet_name: str, cols: list) -> list:
+async def google_write_off(sheet_name: str, cols: list) -> List[tuple]:
     """``Файл списания`` получить массив данных для создания файла списания.
 
+    Читаются только столбцы cols, строки сортируются по сотруднику и дате.
+
     :param sheet_name: имя листа гугл таблицы
-    :param cols: названия столбцов, результирующего отчета
+    :param cols: названия столбцов, результирующего отчета (должны быть 'Дата' и 'Сотрудник')
     """
-    async with GoogleSheetAsyncClient() as client:
-        # ws = await client.worksheet(gs.BOOK_WRITE_OFF_ID, sheet_name)
-
-        ss = await client.open_by_key(gs.BOOK_WRITE_OFF_ID)
-        ws = await ss.worksheet(sheet_name)
-
-        values = await ws.get_values()
-
-    df = pd.DataFrame(values[1:], columns=values[0])
-    df['Дата'] = pd.to_datetime(df['Дата'])
-    return df[cols].sort_values(['Сотрудник', 'Дата']).values
+    i_date, i_employee = cols.index('Дата'), cols.index('Сотрудник')
+    data = []
+    for row in await sheet_reader(gs.BOOK_WRITE_OFF_ID, sheet_name).rows(cols):
+        moment = parse_datetime(row[i_date])
+        if moment is not None:
+            row = row[:i_date] + (moment,) + row[i_date + 1:]
+        data.append((row[i_employee], moment or datetime.min, row))
+    data.sort(key=lambda item: item[:2])
+    return [row for _, _, row in data]
 
 
 async def google_get_all_records(book_id: str, sheet_name: str) -> List[dict]:
@@ -347,33 +392,99 @@ async def google_get_all_records(book_id: str, sheet_name: str) -> List[dict]:
     :param book_id: id гугл таблицы
     :param sheet_name: имя листа гугл таблицы
     """
-    async with GoogleSheetAsyncClient() as client:
-        ss = await client.open_by_key(book_id)
-        ws = await ss.worksheet(sheet_name)
-        return await ws.get_all_records(value_render_option=ValueRenderOption.unformatted)
+    ws = await GoogleSheetAsyncClient.worksheet(book_id, sheet_name)
+    from gspread.utils import ValueRenderOption
+    return await ws.get_all_records(value_render_option=ValueRenderOption.unformatted)
 
 
 async def google_add_row(book_id: str, sheet_name: str, array: Union[list, tuple]) -> None:
     """`Добавляет строку с данными в конец таблицы` на лист (sheet_name) таблицы по book_id.
 
+    Строка ставится в очередь append_queue и уходит пакетом вместе с соседними,
+    управление возвращается сразу.
+
     :param book_id: id гугл таблицы
     :param sheet_name: имя листа гугл таблицы
     :param array: массив данных
     """
+    await append_queue.put(book_id, sheet_name, array)
+    logging.info('Google add row: %s:\n%s', sheet_name, pformat(array))
+
+
+class SheetRows:
+    """Значения листа из ``ws.get_values()`` и индексы `значение в столбце` -> номера строк.
+
+    Индекс столбца строится из уже загруженных значений при первом обращении. В missing
+    запоминаются ключи, которых нет на листе, до следующего чтения листа.
+    """
+
+    def __init__(self, values: List[list]):
+        """
+        :param values: строки листа с первой
+        """
+        self.values = values
+        self._indexes: Dict[int, Dict[str, List[int]]] = {}
+        # (столбец, значение), которых нет на листе
+        self.missing: Set[Tuple[int, str]] = set()
+
+    def rows(self, col: int, query: str) -> List[int]:
+        """Номера строк (с 1), у которых в столбце col значение query.
+
+        :param col: номер столбца-ключа
+        :param query: значение ключа
+        """
+        if col not in self._indexes:
+            index = defaultdict(list)
+            for row, values in enumerate(self.values, start=1):
+                if len(values) >= col and values[col - 1] != '':
+                    index[str(values[col - 1])].append(row)
+            self._indexes[col] = dict(index)
+        return self._indexes[col].get(query, [])
+
+
+_sheet_rows: Dict[Tuple[str, str], Snapshot] = {}
 
-    async with GoogleSheetAsyncClient() as client:
-        ss = await client.open_by_key(book_id)
-        ws = await ss.worksheet(sheet_name)
-        try:
-            await ws.append_row(values=array, value_input_option=ValueInputOption.user_entered, nowait=True)
-            logging.info('Google add row: %s:\n%s', ws.title, pformat(array))
-        except Exception as ex:
-            logging.warning('Google add row:', exc_info=ex)
+
+def sheet_rows(book_id: str, sheet_name: str) -> Snapshot:
+    """Общий на процесс снимок значений листа (sheet_name) книги book_id.
+
+    :param book_id: id гугл таблицы
+    :param sheet_name: имя листа гугл таблицы
+    """
+    key = (book_id, sheet_name)
+    if key not in _sheet_rows:
+        async def load() -> SheetRows:
+            ws = await GoogleSheetAsyncClient.worksheet(book_id, sheet_name)
+            return SheetRows(await ws.get_values())
+
+        _sheet_rows[key] = Snapshot(f'sheet:{book_id}:{sheet_name}', load, ttl=gs.ROW_INDEX_TTL,
+                                    book_id=book_id, sheet_name=sheet_name)
+    return _sheet_rows[key]
+
+
+async def _matching_rows(ws: 'AsyncioGspreadWorksheet', rows: List[int], col: int, query: str) -> List[int]:
+    """Строки из rows, в которых ключ в столбце col на листе всё ещё равен query."""
+    if not rows:
+        return []
+    letter = column_letter(col)
+    cells = await ws.batch_get([f'{letter}{row}' for row in rows])
+    return [row for row, value in zip(rows, cells) if value and value[0] and str(value[0][0]) == query]
 
 
 async def google_update_row(book_id: str, sheet_name: str, array: Union[list, tuple], query: str,
                             col: int = 1, col_s: str = 'A', col_f: str = 'H') -> bool:
-    """`Добавляет строку с данными` на лист (sheet_name) таблицы по book_id.
+    """`Обновляет строки с данными` на листе (sheet_name) таблицы по book_id.
+
+    Строки ищутся по индексу столбца col из снимка листа. Если снимок прочитан или подтверждён
+    наблюдателем (sheet_watcher) не раньше WATCH_INTERVAL секунд назад, строки пишутся сразу,
+    а ключ пишется в той же пачке вместе с данными. Иначе перед записью ключ в найденных строках
+    перечитывается: если строки на листе сдвинули (сортировка, вставка, удаление), снимок
+    перечитывается и строки ищутся заново. Все строки обновляются одним batch_update.
+
+    Если ключа нет в снимке, сначала дописываются неотправленные строки листа из очереди, а
+    снимок перечитывается, только если очередь дописала строки или он старше WATCH_INTERVAL.
+    Отсутствие ключа запоминается до следующего чтения листа, повторные вызовы с тем же
+    ключом не идут в API.
 
     :param array: массив
     :param query: данные для поиска в столбце n
@@ -384,87 +495,92 @@ async def google_update_row(book_id: str, sheet_name: str, array: Union[list, tu
     :param sheet_name: имя листа гугл таблицы
     """
     try:
+        query = str(query)
+        snapshot = sheet_rows(book_id, sheet_name)
+        ws = await GoogleSheetAsyncClient.worksheet(book_id, sheet_name)
+        index = await snapshot.get()
+        rows = index.rows(col, query)
+        fresh = snapshot.age < gs.WATCH_INTERVAL
+        if rows:
+            stale = not fresh and await _matching_rows(ws, rows, col, query) != rows
+        elif await append_queue.queued(book_id, sheet_name):
+            # строка могла только что уйти в очередь, дописанные строки сбрасывают снимок
+            await append_queue.flush()
+            stale = not snapshot.fresh
+        elif (col, query) in index.missing:
+            stale = False
+            metrics.inc('google.update_row.missing')
+        else:
+            stale = not fresh
+        if stale:
+            # строки на листе сдвинули или ключ появился после чтения снимка
+            metrics.inc('google.update_row.reindex')
+            index = await snapshot.refresh()
+            rows = index.rows(col, query)
+            fresh = True
+        if not rows:
+            index.missing.add((col, query))
+
+        ranges = [f'{col_s}{row}:{col_f}{row}' for row in rows]
+        if ranges:
+            from gspread.utils import ValueInputOption
+            updates = [{'range': range_name, 'values': array} for range_name in ranges]
+            if fresh and not column_number(col_s) <= col <= column_number(col_f):
+                # без проверочного чтения ключ пишется вместе с данными
+                letter = column_letter(col)
+                updates += [{'range': f'{letter}{row}', 'values': [[query]]} for row in rows]
+            await ws.batch_update(updates, value_input_option=ValueInputOption.user_entered)  # обновить значение
+
+        logging.info('Google update row: %s!%s %s: %s', sheet_name, ', '.join(ranges), query, array)
+        return True
+    except Exception as ex:
+        logging.warning('Google update row: %s', ex)
+        return False
 
-        async with GoogleSheetAsyncClient() as client:
-            ss: AsyncioGspreadSpreadsheet = await client.open_by_key(book_id)
-            ws: AsyncioGspreadWorksheet = await ss.worksheet(sheet_name)
 
-            cells = await ws.findall(query, in_column=col)
+def get_credentials() -> 'Credentials':
+    from google.oauth2.service_account import Credentials
+    return Credentials.from_service_account_file(gs.credentials).with_scopes(SCOPES)
 
-            for cell in cells:
-                await ws.update(
-                    values=array,
-                    range_name=f'{col_s}{cell.row}:{col_f}{cell.row}',
-                    value_input_option=ValueInputOption.user_entered,
-                    nowait=True
-                )  # обновить значение
 
-                logging.info('Google update row: %s!%s %s: %s', ws.title,
-                             f"{col_s}{cell.row}:{col_f}{cell.row}", query, array)
+async def google_authorize_token() -> str:
+    """Access token сервисного аккаунта для прямых запросов к API."""
+    return await google_drive.authorize_token()
 
-            return True
-    except Exception as ex:
-        logging.warning('Google update row: %s', ex)
-        return False
 
+async def google_save_file(
+        name: str,
+        file_path: Optional[str] = None,
+        parent_folder: str = gs.FOLDER_ID_PHOTO_SAVE,
+        mime_type: str = 'image/png',
+        source: Union[BinaryIO, bytes, None] = None,
+) -> str:
+    """`Загрузка файла на гугл диск` без записи на локальный диск и без блокировки event loop.
 
-def get_credentials():
-    return Credentials.from_service_account_file(gs.credentials).with_scopes(SCOPES)
+    :param name: название файла
+    :param file_path: (optional) путь до файла, если source не передан
+    :param parent_folder: id папки на гугл диске
+    :param mime_type: тип сохраняемого файла, по умолчанию 'image/png'
+    :param source: (optional) поток или bytes, например BytesIO из bot.download_file
+    :returns: id файла
+    """
+    return await google_drive.upload_file(name, source if source is not None else file_path, parent_folder, mime_type)
 
 
-async def google_authorize_token():
-    credentials = get_credentials()
-    credentials.refresh(google.auth.transport.requests.Request())
-    return credentials.token
-
-
-async def google_save_file(name, file_path, parent_folder=gs.FOLDER_ID_PHOTO_SAVE, mime_type='image/png'):
-    credentials = get_credentials()
-    service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
-    file_metadata = {
-        'name': name,
-        'mimeType': mime_type,
-        'parents': [parent_folder]
-    }
-
-    media = MediaFileUpload(file_path, mimetype='image/jpeg', resumable=True)
-    return service.files().create(body=file_metadata, media_body=media, fields='id').execute()['id']
-
-
-async def google_clear_folder(folder_id: str) -> None:
-    credentials = get_credentials()
-    service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
-    results = service.files().list(
-        pageSize=1000,
-        fields="nextPageToken, files(id, name, mimeType, parents, createdTime)",
-        q=f"'{folder_id}' in parents and mimeType contains 'image'").execute()
-
-    # data = []
-    # for file in results['files']:
-    #     try:
-    #         service.files().delete(fileId=file['id']).execute()
-    #         data.append(file['id'])
-    #     except Exception as ex:
-    #         logging.warning('Google clear folder: проблема с id > %s', {file["id"]}, exc_info=ex)
-    #         continue
-    #
-    # data = "\n".join(data)
-    # logging.info("Удалили файлы с id:\n %s", data)
+async def google_clear_folder(
+        folder_id: str,
+        older_than_days: Optional[int] = None,
+        progress: Optional[google_drive.Progress] = None,
+) -> Tuple[int, int]:
+    """`Очистка папки на гугл диске` от изображений.
+
+    :param folder_id: id папки на гугл диске
+    :param older_than_days: (optional) удалять только созданные раньше N дней назад
+    :param progress: (optional) корутина progress(deleted, failed, total)
+    :returns: (удалено, не удалено)
+    """
+    return await google_drive.clear_folder(folder_id, older_than_days=older_than_days, progress=progress)
 
-    data = [file['id'] for file in results['files']]
-    try:
-        response = service.files().batchDelete(body={'ids': data}).execute()
-        success_count = response.get('deletedIds', [])
-        failed_count = response.get('failedErrors', [])
-        logging.info("Deleted files with ids:\n %s", '\n'.join(success_count))
-        logging.warning("Failed to delete files with ids:\n %s", '\n'.join(failed_count))
-    except HttpError as ex:
-        if ex.resp.status == 403:
-            logging.warning('Google clear folder: problem with id > %s', data, exc_info=ex)
-            logging.warning("One or more files cannot be deleted due to access restrictions.")
-        else:
-            logging.error('Google clear folder: problem with id > %s', data, exc_info=ex)
-            raise
 
 # class Gspread:
 #     def __init__(self, table_id=None, sheet_name=None):
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Фоновые задачи, запущенные из хендлеров.
+
+Event loop хранит только слабые ссылки на задачи, поэтому запущенные задачи держим
+в множестве до завершения, ошибки пишем в лог, а при остановке бота отменяем.
+"""
+import asyncio
+import logging
+from typing import Coroutine, Set
+
+_tasks: Set[asyncio.Task] = set()
+
+
+def _done(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error('Background task %s: ошибка', task.get_name(), exc_info=task.exception())
+
+
+def spawn(coro: Coroutine, name: str) -> asyncio.Task:
+    """Запустить корутину в фоне.
+
+    :param coro: корутина
+    :param name: имя задачи для логов
+    """
+    task = asyncio.create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_done)
+    return task
+
+
+def running(name: str) -> bool:
+    """Выполняется ли задача с именем name."""
+    return any(task.get_name() == name for task in _tasks)
+
+
+async def shutdown() -> None:
+    """Отменить все фоновые задачи."""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Массовая рассылка в телеграм с учётом лимитов Bot API.
+
+Сообщения уходят параллельно (BROADCAST_CONCURRENCY отправителей), но не быстрее
+общего лимита бота (BROADCAST_RATE сообщений в секунду, у телеграм около 30) и не чаще
+одного сообщения в BROADCAST_CHAT_INTERVAL секунд в один чат. На ``TelegramRetryAfter``
+рассылка целиком ждёт retry_after и повторяет сообщение до BROADCAST_FLOOD_RETRIES раз,
+сетевые ошибки повторяются до BROADCAST_RETRIES раз, дальше получатель считается недоставленным. Заблокировавшие бота считаются отдельно и не повторяются.
+Недоставленные из-за других ошибок попадают в очередь повтора (``BroadcastStats.failures``)
+и после основного прохода повторяются до BROADCAST_RETRY_ROUNDS раз через
+BROADCAST_RETRY_DELAY секунд, оставшиеся в очереди отдаются в итоге рассылки. Повтор
+продолжает с сообщения, на котором получатель остановился: уже доставленные ему сообщения
+(например, заголовок перед видео) второй раз не уходят.
+Ход рассылки раз в BROADCAST_PROGRESS_INTERVAL секунд передаётся в progress.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, Optional, Sequence
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+
+from core.config import settings, TgBot
+from services.metrics import metrics
+from services.rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    from services.delivery_log import DeliveryLog
+
+tg: TgBot = settings.bot
+
+# отправка одного сообщения рассылки: chat_id -> вызов Bot API
+Send = Callable[[int], Awaitable[Any]]
+
+
+@dataclass
+class BroadcastStats:
+    """Ход и итог рассылки."""
+    name: str
+    total: int
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    retries: int = 0
+    skipped: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+    # очередь повтора: chat_id -> последняя ошибка
+    failures: Dict[int, str] = field(default_factory=dict)
+    # chat_id из очереди повтора -> ещё не доставленные ему сообщения
+    remaining: Dict[int, Sequence[Send]] = field(default_factory=dict)
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.blocked
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def __str__(self) -> str:
+        text = (f'{self.done}/{self.total}: доставлено {self.sent}, ошибок {self.failed}, '
+                f'заблокировали бота {self.blocked}, {self.elapsed:.0f} с')
+        if self.skipped:
+            text += f', доставлено ранее {self.skipped}'
+        return text
+
+
+Progress = Callable[[BroadcastStats], Awaitable[None]]
+
+
+class ChatLimiter:
+    """Не чаще одного сообщения в interval секунд в один чат."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next: Dict[int, float] = {}
+        self._sweep_at = 0.0
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        if now >= self._sweep_at:
+            # чаты, чьё время уже прошло, больше не ждут, раз в interval убираем их
+            self._next = {chat: at for chat, at in self._next.items() if at > now}
+            self._sweep_at = now + self.interval
+        at = max(now, self._next.get(chat_id, now))
+        self._next[chat_id] = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+
+class Broadcaster:
+    """Общие для всех рассылок процесса лимиты бота."""
+
+    def __init__(self, rate: float, chat_interval: float, concurrency: int, retries: int,
+                 retry_rounds: int = 0, retry_delay: float = 0.0, flood_retries: int = 5):
+        """
+        :param rate: сообщений в секунду на бота
+        :param chat_interval: минимальный интервал между сообщениями в один чат, сек.
+        :param concurrency: одновременных отправок
+        :param retries: повторов сообщения при сетевой ошибке
+        :param retry_rounds: (optional) повторных проходов по очереди недоставленных
+        :param retry_delay: (optional) пауза перед повторным проходом, сек.
+        :param flood_retries: (optional) повторов сообщения после TelegramRetryAfter
+        """
+        self.bucket = TokenBucket(rate=rate, capacity=max(1, int(rate)))
+        self.chats = ChatLimiter(chat_interval)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.retry_rounds = retry_rounds
+        self.retry_delay = retry_delay
+        self.flood_retries = flood_retries
+        self._paused_until = 0.0
+
+    async def _pause(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _deliver(self, chat_id: int, send: Send, stats: BroadcastStats) -> None:
+        attempt = flood = 0
+        while True:
+            await self._pause()
+            await self.chats.wait(chat_id)
+            metrics.observe('broadcast.limiter_wait', await self.bucket.wait())
+            try:
+                await send(chat_id)
+                return
+            except TelegramRetryAfter as ex:
+                # flood control действует на весь бот, останавливаем всех отправителей
+                self._paused_until = max(self._paused_until, time.monotonic() + ex.retry_after)
+                logging.warning('Рассылка %s: flood control, ждём %s с', stats.name, ex.retry_after)
+                if flood >= self.flood_retries:
+                    raise
+                flood += 1
+            except TelegramNetworkError:
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+                attempt += 1
+            stats.retries += 1
+            metrics.inc('broadcast.retries')
+
+    async def _send(self, chat_id: int, messages: Sequence[Send], stats: BroadcastStats) -> str:
+        """Отправить сообщения получателю, возвращает статус: sent, blocked или failed."""
+        done = 0
+        try:
+            for send in messages:
+                await self._deliver(chat_id, send, stats)
+                done += 1
+        except TelegramForbiddenError:
+            status = 'blocked'
+        except Exception as ex:
+            status = 'failed'
+            stats.failures[chat_id] = repr(ex)
+            stats.remaining[chat_id] = messages[done:]
+            logging.warning('Рассылка %s: %s ошибка рассылки: %r', stats.name, chat_id, ex)
+        else:
+            status = 'sent'
+        if status != 'failed':
+            stats.failures.pop(chat_id, None)
+            stats.remaining.pop(chat_id, None)
+        setattr(stats, status, getattr(stats, status) + 1)
+        metrics.inc(f'broadcast.{status}')
+        return status
+
+    async def run(self, name: str, chat_ids: Iterable[int], messages: Sequence[Send],
+                  progress: Optional[Progress] = None,
+                  progress_interval: float = tg.BROADCAST_PROGRESS_INTERVAL,
+                  log: Optional['DeliveryLog'] = None) -> BroadcastStats:
+        """Разослать одни и те же messages каждому чату из chat_ids по одному разу.
+
+        :param name: имя рассылки для логов
+        :param chat_ids: получатели, повторы отбрасываются
+        :param messages: сообщения получателю по порядку, например текст и видео
+        :param progress: (optional) корутина, получает BroadcastStats во время и после рассылки
+        :param progress_interval: период вызова progress, сек.
+        :param log: (optional) журнал доставок, см. dispatch()
+        """
+        plan = {chat_id: messages for chat_id in chat_ids}
+        return await self.dispatch(name, plan, progress, progress_interval, log)
+
+    async def dispatch(self, name: str, plan: Dict[int, Sequence[Send]], progress: Optional[Progress] = None,
+                       progress_interval: float = tg.BROADCAST_PROGRESS_INTERVAL,
+                       log: Optional['DeliveryLog'] = None) -> BroadcastStats:
+        """Разослать каждому чату свои сообщения.
+
+        :param name: имя рассылки для логов
+        :param plan: chat_id -> сообщения получателю по порядку
+        :param progress: (optional) корутина, получает BroadcastStats во время и после рассылки
+        :param progress_interval: период вызова progress, сек.
+        :param log: (optional) журнал доставок: кому уже доставлено в этом запуске, тем не отправляем,
+                результаты остальных записываются в журнал
+        """
+        skipped = 0
+        if log is not None:
+            delivered = await log.delivered()
+            skipped = len(delivered.intersection(plan))
+            plan = {chat_id: messages for chat_id, messages in plan.items() if chat_id not in delivered}
+        stats = BroadcastStats(name=name, total=len(plan), skipped=skipped)
+
+        async def worker(queue):
+            for chat_id, messages in queue:
+                status = await self._send(chat_id, messages, stats)
+                if log is not None:
+                    await log.record(chat_id, status)
+
+        async def send_all(part: Dict[int, Sequence[Send]]):
+            queue = iter(part.items())
+            await asyncio.gather(*(worker(queue) for _ in range(min(self.concurrency, len(part)) or 1)))
+
+        async def report():
+            while True:
+                await asyncio.sleep(progress_interval)
+                await _safe_progress(progress, stats)
+
+        reporter = asyncio.create_task(report()) if progress else None
+        try:
+            await send_all(plan)
+            for attempt in range(1, self.retry_rounds + 1):
+                if not stats.failures:
+                    break
+                if log is not None:
+                    await log.flush()
+                retry = {chat_id: stats.remaining[chat_id] for chat_id in stats.failures}
+                stats.failed -= len(retry)
+                metrics.inc('broadcast.requeued', len(retry))
+                logging.info('Рассылка %s: повтор %s для %s недоставленных через %s с',
+                             name, attempt, len(retry), self.retry_delay)
+                await asyncio.sleep(self.retry_delay)
+                await send_all(retry)
+        finally:
+            stats.finished = time.monotonic()
+            if reporter:
+                reporter.cancel()
+            if log is not None:
+                await log.flush()
+        metrics.observe('broadcast.run', stats.elapsed)
+        logging.info('Рассылка %s: %s', name, stats)
+        await _safe_progress(progress, stats)
+        return stats
+
+
+async def _safe_progress(progress: Optional[Progress], stats: BroadcastStats) -> None:
+    if progress is None:
+        return
+    try:
+        await progress(stats)
+    except Exception as ex:
+        logging.warning('Рассылка %s: не удалось обновить прогресс: %r', stats.name, ex)
+
+
+broadcaster = Broadcaster(
+    rate=tg.BROADCAST_RATE,
+    chat_interval=tg.BROADCAST_CHAT_INTERVAL,
+    concurrency=tg.BROADCAST_CONCURRENCY,
+    retries=tg.BROADCAST_RETRIES,
+    retry_rounds=tg.BROADCAST_RETRY_ROUNDS,
+    retry_delay=tg.BROADCAST_RETRY_DELAY,
+    flood_retries=tg.BROADCAST_FLOOD_RETRIES,
+)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Журнал доставок рассылок (таблица mailing_deliveries) для повторного запуска без дублей.
+
+Каждый запуск рассылки получает run_id, результат по каждому получателю пишется
+пачками по DELIVERY_BATCH_SIZE записей. При повторном запуске с тем же run_id
+получатели со статусом sent или blocked пропускаются, рассылка продолжается с места
+остановки. Ошибки БД не останавливают рассылку, а только пишутся в лог.
+
+Плановые задачи идут под арендой в Redis (``hendlers.mailings.jobs``) и передают её ключ
+и fencing token через ``current_fence``. Пачка пишется вместе с проверкой token
+(``MailingDeliveryRepo.add_many``): если аренду уже взяла другая реплика с большим token,
+пачка отклоняется, журнал больше ничего не пишет, а ``record`` и ``flush`` поднимают
+``StaleFenceError``, чтобы устаревший владелец остановил рассылку.
+"""
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import List, Optional, Set, Tuple
+
+from core.config import settings, TgBot
+from database import DeliveryReport, Database, StaleFenceError, async_session_factory
+from services.metrics import metrics
+from utils.utils import get_current_datetime
+
+tg: TgBot = settings.bot
+
+# (ключ, fencing token) аренды задачи, в которой идёт рассылка
+current_fence: ContextVar[Optional[Tuple[str, int]]] = ContextVar('current_fence', default=None)
+
+
+class DeliveryLog:
+    """Журнал доставок одного запуска рассылки."""
+
+    def __init__(self, run_id: str, batch_size: int = tg.DELIVERY_BATCH_SIZE,
+                 fence: Optional[Tuple[str, int]] = None):
+        """
+        :param run_id: id запуска, например 'safe:2024-06-01T09'
+        :param batch_size: записей в одной вставке
+        :param fence: (optional) (ключ, token) аренды, по умолчанию из current_fence
+        """
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.fence = fence or current_fence.get()
+        self.stale = False
+        self._buffer: List[Tuple[int, str]] = []
+        self._lock = asyncio.Lock()
+
+    async def delivered(self) -> Set[int]:
+        """user_id, которым в этом запуске уже доставлено."""
+        try:
+            async with async_session_factory() as session:
+                return await Database(session).mailing_delivery.delivered(self.run_id)
+        except Exception as ex:
+            logging.warning('Delivery log %s: не удалось прочитать журнал: %r', self.run_id, ex)
+            return set()
+
+    async def record(self, user_id: int, status: str) -> None:
+        """Записать результат доставки, в БД уходит пачкой."""
+        if self.stale:
+            raise StaleFenceError(f'{self.run_id}: аренда задачи потеряна')
+        self._buffer.append((user_id, status))
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Записать накопленные результаты."""
+        async with self._lock:
+            # по получателю остаётся последний статус, повтор в одной пачке upsert не принимает
+            rows, self._buffer = list(dict(self._buffer).items()), []
+            if not rows or self.stale:
+                return
+            try:
+                async with async_session_factory() as session:
+                    await Database(session).mailing_delivery.add_many(self.run_id, rows, self.fence)
+            except StaleFenceError as ex:
+                self.stale = True
+                metrics.inc('delivery_log.stale')
+                logging.error('Delivery log %s: %s, %s доставок не записано', self.run_id, ex, len(rows))
+                raise
+            except Exception as ex:
+                logging.warning('Delivery log %s: не удалось записать %s доставок: %r', self.run_id, len(rows), ex)
+
+    async def report(self) -> DeliveryReport:
+        """Итог запуска по журналу: статусы и скорость доставки."""
+        await self.flush()
+        try:
+            async with async_session_factory() as session:
+                return await Database(session).mailing_delivery.report(self.run_id)
+        except Exception as ex:
+            logging.warning('Delivery log %s: не удалось получить отчёт: %r', self.run_id, ex)
+            return DeliveryReport(run_id=self.run_id, statuses={})
+
+    @staticmethod
+    async def prune(days: int = tg.DELIVERY_KEEP_DAYS) -> None:
+        """Удалить записи журнала и завершённые рассылки новостей старше days дней."""
+        # created_at хранится по Мск без часового пояса
+        moment = get_current_datetime(-days).replace(tzinfo=None)
+        async with async_session_factory() as session:
+            db = Database(session)
+            await db.mailing_delivery.delete_before(moment)
+            await db.news_run.delete_before(moment)
+
+
+def run_id(name: str, period: str = '%Y-%m-%dT%H') -> str:
+    """id запуска плановой рассылки: имя и текущий период (по умолчанию час)."""
+    return f'{name}:{get_current_datetime().strftime(period)}'
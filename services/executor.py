@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Ограниченный пул потоков для блокирующих клиентов (googleapiclient, gspread).
+
+Очередь и время вызовов пишутся в ``metrics`` с префиксом имени пула: ``<name>.queued``
+и ``<name>.running`` (текущие), ``<name>.wait`` (ожидание потока), ``<name>.call``
+(выполнение) и ``<name>.timeouts``.
+"""
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+from services.metrics import metrics
+
+
+class BoundedExecutor:
+    """Пул из max_workers потоков, блокирующие вызовы не занимают event loop."""
+
+    def __init__(self, name: str, max_workers: int, timeout: Optional[float] = None):
+        """
+        :param name: префикс имени потоков
+        :param max_workers: размер пула
+        :param timeout: (optional) таймаут вызова по умолчанию, сек.
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._pool
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Выполнить fn(*args, **kwargs) в пуле.
+
+        :param fn: блокирующая функция
+        :param timeout: (optional) таймаут, по умолчанию self.timeout
+        """
+        job = {'submitted': time.monotonic(), 'started': False, 'dropped': False}
+        with self._lock:
+            self._queued += 1
+            self._gauges()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, functools.partial(self._job, job, fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout or self.timeout)
+        except asyncio.TimeoutError:
+            metrics.inc(f'{self.name}.timeouts')
+            # поток не прервать: вызов, который уже выполняется, доработает в фоне
+            self._drop(job)
+            raise
+        except asyncio.CancelledError:
+            self._drop(job)
+            raise
+
+    def blocking(self, fn: Optional[Callable] = None, *, timeout: Optional[float] = None) -> Callable[..., Awaitable]:
+        """Декоратор: синхронная функция становится корутиной, выполняемой в пуле.
+
+        :param fn: блокирующая функция
+        :param timeout: (optional) таймаут вызова, по умолчанию self.timeout
+        """
+        if fn is None:
+            return functools.partial(self.blocking, timeout=timeout)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.run(fn, *args, timeout=timeout, **kwargs)
+
+        return wrapper
+
+    def _job(self, job: dict, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            if job['dropped']:
+                return None
+            job['started'] = True
+            self._queued -= 1
+            self._running += 1
+            self._gauges()
+        started = time.monotonic()
+        metrics.observe(f'{self.name}.wait', started - job['submitted'])
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.observe(f'{self.name}.call', time.monotonic() - started)
+            with self._lock:
+                self._running -= 1
+                self._gauges()
+
+    def _drop(self, job: dict) -> None:
+        """Снять с очереди вызов, который ещё не начался."""
+        with self._lock:
+            if not job['started'] and not job['dropped']:
+                job['dropped'] = True
+                self._queued -= 1
+                self._gauges()
+
+    def _gauges(self) -> None:
+        metrics.set(f'{self.name}.queued', self._queued)
+        metrics.set(f'{self.name}.running', self._running)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Конвейер плановых рассылок сотрудникам.
+
+График -> получатели (фильтр по фамилиям в смене передаётся в запрос к БД) -> исключения ->
+render -> отправка через ``broadcaster``. Повторы отбрасываются по множеству, сообщения уходят параллельно
+в пределах лимитов бота, итог каждой рассылки пишется в лог и в ``metrics``
+(``mailing.<name>.recipients``, ``.sent``, ``.failed``, ``.duration``). Доставки пишутся
+в ``DeliveryLog``: перезапуск после падения в том же периоде досылает только оставшимся.
+"""
+import logging
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Awaitable, Callable, Collection, Iterable, Optional, Sequence, Set
+
+from core.bot import bot
+from services.broadcast import BroadcastStats, Send, broadcaster
+from services.delivery_log import DeliveryLog, run_id as current_run_id
+from services.metrics import metrics
+
+if TYPE_CHECKING:
+    from database import Recipient
+
+# сообщения сотруднику, пусто или None - не отправлять
+Render = Callable[['Recipient'], Optional[Sequence[Send]]]
+# получатели: фамилии тех, кто в смене (None - без графика) -> сотрудники
+Recipients = Callable[[Optional[Set[str]]], Awaitable[Iterable['Recipient']]]
+
+
+@dataclass
+class FanOutStats:
+    """Итог плановой рассылки."""
+    name: str
+    users: int = 0
+    recipients: int = 0
+    sent: int = 0
+    failed: int = 0
+    resumed: int = 0
+    duration: float = 0.0
+    skipped: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.skipped:
+            return f'пропущена: {self.skipped}'
+        return (f'получателей {self.recipients} из {self.users}, доставлено {self.sent}, '
+                f'ошибок {self.failed}, доставлено ранее {self.resumed}, {self.duration:.1f} с')
+
+
+def message(text: str, **kwargs) -> Send:
+    """Текстовое сообщение для render: ``message(text, reply_markup=...)``."""
+    return partial(bot.send_message, text=text, **kwargs)
+
+
+async def fan_out(
+        name: str,
+        recipients: Recipients,
+        render: Render,
+        schedule: Optional[Callable[[], Awaitable[Optional[Collection[str]]]]] = None,
+        exclude: Collection[int] = (),
+        run_id: Optional[str] = None,
+) -> FanOutStats:
+    """Разослать сотрудникам сообщения, которые для каждого строит render.
+
+    :param name: имя рассылки для логов и метрик
+    :param recipients: корутина, получает фамилии тех, кто в смене (или None), возвращает сотрудников
+    :param render: сообщения сотруднику, вызывается один раз на сотрудника
+    :param schedule: (optional) корутина, возвращает фамилии тех, кто в смене;
+            если задана и график пуст, рассылка пропускается
+    :param exclude: (optional) user_id, которым не отправлять
+    :param run_id: (optional) id запуска для журнала доставок, по умолчанию имя и текущий час
+    """
+    stats = FanOutStats(name=name)
+    on_shift = None
+    if schedule is not None:
+        on_shift = set(await schedule() or ())
+        if not on_shift:
+            stats.skipped = 'нет графика'
+            logging.warning('Mailing %s: %s', name, stats)
+            return stats
+
+    users = list(await recipients(on_shift))
+    stats.users = len(users)
+
+    exclude = set(exclude)
+    plan, seen = {}, set()
+    for user in users:
+        if user.user_id in seen or user.user_id in exclude:
+            continue
+        seen.add(user.user_id)
+        messages = render(user)
+        if messages:
+            plan[user.user_id] = messages
+
+    log = DeliveryLog(run_id or current_run_id(name))
+    result: BroadcastStats = await broadcaster.dispatch(name, plan, log=log)
+    stats.recipients = result.total
+    stats.sent = result.sent
+    stats.failed = result.failed + result.blocked
+    stats.resumed = result.skipped
+    stats.duration = result.elapsed
+
+    metrics.inc(f'mailing.{name}.recipients', stats.recipients)
+    metrics.inc(f'mailing.{name}.sent', stats.sent)
+    metrics.inc(f'mailing.{name}.failed', stats.failed)
+    metrics.observe(f'mailing.{name}.duration', stats.duration)
+    logging.info('Mailing %s: %s', name, stats)
+    return stats
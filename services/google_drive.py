@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Google Drive без блокировки event loop.
+
+Все вызовы googleapiclient выполняются в ограниченном пуле ``drive_executor``.
+Реквизиты читаются один раз, сервис Drive собирается из встроенного в googleapiclient
+discovery документа один раз на поток пула (httplib2 не потокобезопасен).
+"""
+import asyncio
+import functools
+import io
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+from core.config import settings, GoogleSheetsSettings
+from services.executor import BoundedExecutor
+from services.rate_limit import call
+
+if TYPE_CHECKING:
+    # googleapiclient и google.auth импортируются в потоке пула при первом обращении к Drive
+    from google.oauth2.service_account import Credentials
+
+gs: GoogleSheetsSettings = settings.gs
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive',
+]
+
+drive_executor = BoundedExecutor('google-drive', max_workers=gs.DRIVE_WORKERS, timeout=gs.DRIVE_TIMEOUT)
+
+# лимит Drive API на кол-во вызовов в одном batch запросе
+BATCH_LIMIT = 100
+
+Progress = Callable[[int, int, int], Awaitable[None]]
+
+_local = threading.local()
+
+# подмена сервиса и реквизитов (benchmarks.google_fake), None - настоящий Google
+_override: Dict[str, Any] = {'service': None, 'credentials': None}
+
+
+def override(service: Any = None, credentials: Any = None) -> None:
+    """Подменить сервис Drive и реквизиты, без аргументов - вернуть настоящие.
+
+    :param service: объект с интерфейсом сервиса drive v3 (files(), new_batch_http_request())
+    :param credentials: объект с интерфейсом google.auth credentials (valid, token, refresh())
+    """
+    _override.update(service=service, credentials=credentials)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_credentials() -> 'Credentials':
+    from google.oauth2.service_account import Credentials
+    return Credentials.from_service_account_file(gs.credentials).with_scopes(SCOPES)
+
+
+def get_credentials() -> 'Credentials':
+    """Реквизиты сервисного аккаунта, файл читается один раз."""
+    return _override['credentials'] or _load_credentials()
+
+
+def get_service():
+    """Сервис Drive v3 текущего потока."""
+    if _override['service'] is not None:
+        return _override['service']
+    service = getattr(_local, 'service', None)
+    if service is None:
+        import google_auth_httplib2
+        import httplib2
+        from googleapiclient.discovery import build
+
+        http = google_auth_httplib2.AuthorizedHttp(get_credentials(), http=httplib2.Http(timeout=gs.DRIVE_TIMEOUT))
+        service = build('drive', 'v3', http=http, cache_discovery=False, static_discovery=True)
+        _local.service = service
+    return service
+
+
+def _token() -> str:
+    credentials = get_credentials()
+    if not credentials.valid:
+        import google.auth.transport.requests
+        credentials.refresh(google.auth.transport.requests.Request())
+    return credentials.token
+
+
+def _upload(name: str, source: Union[BinaryIO, bytes, str], parent_folder: str, mime_type: str) -> str:
+    from googleapiclient.http import MediaIoBaseUpload
+
+    if isinstance(source, str):
+        source = open(source, 'rb')
+    elif isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    with source:
+        media = MediaIoBaseUpload(source, mimetype='image/jpeg' if mime_type.startswith('image') else mime_type,
+                                  chunksize=gs.DRIVE_CHUNK_SIZE, resumable=True)
+        request = get_service().files().create(
+            body={'name': name, 'mimeType': mime_type, 'parents': [parent_folder]},
+            media_body=media,
+            fields='id',
+        )
+        response = None
+        while response is None:
+            _, response = call(request.next_chunk, api='drive')
+    return response['id']
+
+
+async def authorize_token() -> str:
+    """Access token сервисного аккаунта, обновляется только когда истёк."""
+    return await drive_executor.run(_token)
+
+
+async def upload_file(
+        name: str,
+        source: Union[BinaryIO, bytes, str],
+        parent_folder: str = gs.FOLDER_ID_PHOTO_SAVE,
+        mime_type: str = 'image/png',
+) -> str:
+    """`Загрузка файла на гугл диск` частями (resumable upload) в пуле drive_executor.
+
+    :param name: название файла
+    :param source: поток (BytesIO из bot.download_file), bytes или путь до файла
+    :param parent_folder: id папки на гугл диске
+    :param mime_type: тип сохраняемого файла, по умолчанию 'image/png'
+    :returns: id файла
+    """
+    return await drive_executor.run(_upload, name, source, parent_folder, mime_type)
+
+
+def _modified_time(file_id: str) -> str:
+    response = get_service().files().get(fileId=file_id, fields='modifiedTime', supportsAllDrives=True).execute()
+    return response['modifiedTime']
+
+
+async def modified_time(file_id: str) -> str:
+    """Время последнего изменения файла (книги) на гугл диске, RFC 3339.
+
+    :param file_id: id файла или гугл таблицы
+    """
+    return await drive_executor.run(call, _modified_time, file_id, api='drive')
+
+
+def _list_page(query: str, page_token: Optional[str]) -> Tuple[List[str], Optional[str]]:
+    response = get_service().files().list(
+        q=query,
+        pageSize=1000,
+        pageToken=page_token,
+        fields='nextPageToken, files(id)',
+    ).execute()
+    return [file['id'] for file in response.get('files', [])], response.get('nextPageToken')
+
+
+def _delete_batch(ids: List[str]) -> Tuple[int, int]:
+    from googleapiclient.errors import HttpError
+
+    service = get_service()
+    failed = []
+
+    def callback(request_id, _, exception):
+        if exception is not None:
+            failed.append(request_id)
+            if isinstance(exception, HttpError) and exception.resp.status == 403:
+                logging.warning('Google clear folder: нет прав на удаление %s', request_id)
+            else:
+                logging.warning('Google clear folder: %s не удалили', request_id, exc_info=exception)
+
+    batch = service.new_batch_http_request(callback=callback)
+    for file_id in ids:
+        batch.add(service.files().delete(fileId=file_id), request_id=file_id)
+    # квота считает каждый вложенный запрос batch
+    call(batch.execute, api='drive', tokens=len(ids))
+    return len(ids) - len(failed), len(failed)
+
+
+async def list_files(folder_id: str, mime_type: str = 'image', older_than_days: Optional[int] = None) -> List[str]:
+    """id всех файлов папки, постранично через nextPageToken.
+
+    :param folder_id: id папки на гугл диске
+    :param mime_type: часть mimeType файлов
+    :param older_than_days: (optional) только созданные раньше N дней назад
+    """
+    query = f"'{folder_id}' in parents and mimeType contains '{mime_type}' and trashed = false"
+    if older_than_days:
+        created = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+        query += f" and createdTime < '{created.strftime('%Y-%m-%dT%H:%M:%S')}'"
+
+    ids, page_token = await drive_executor.run(call, _list_page, query, None, api='drive')
+    while page_token:
+        page, page_token = await drive_executor.run(call, _list_page, query, page_token, api='drive')
+        ids.extend(page)
+    return ids
+
+
+async def clear_folder(
+        folder_id: str,
+        older_than_days: Optional[int] = None,
+        progress: Optional[Progress] = None,
+        chunk_size: int = BATCH_LIMIT,
+) -> Tuple[int, int]:
+    """`Очистка папки на гугл диске` от изображений.
+
+    Сначала собираются id всех файлов (удаление во время листания сдвигает страницы),
+    затем они удаляются batch запросами по chunk_size, не более DRIVE_CLEANUP_CONCURRENCY
+    одновременно, чтобы очистка не занимала все потоки drive_executor и не задерживала загрузку фото.
+
+    :param folder_id: id папки на гугл диске
+    :param older_than_days: (optional) удалять только созданные раньше N дней назад
+    :param progress: (optional) корутина progress(deleted, failed, total) после каждого batch
+    :param chunk_size: кол-во файлов в одном batch запросе, не больше BATCH_LIMIT
+    :returns: (удалено, не удалено)
+    """
+    ids = await list_files(folder_id, older_than_days=older_than_days)
+    total = len(ids)
+    chunk_size = min(chunk_size, BATCH_LIMIT)
+    semaphore = asyncio.Semaphore(max(1, gs.DRIVE_CLEANUP_CONCURRENCY))
+    deleted = failed = 0
+
+    async def delete(chunk: List[str]) -> None:
+        nonlocal deleted, failed
+        async with semaphore:
+            try:
+                ok, bad = await drive_executor.run(_delete_batch, chunk)
+            except Exception as ex:
+                logging.error('Google clear folder: batch из %s файлов не выполнен', len(chunk), exc_info=ex)
+                ok, bad = 0, len(chunk)
+            deleted += ok
+            failed += bad
+            if progress is not None:
+                await progress(deleted, failed, total)
+
+    await asyncio.gather(*(delete(ids[i:i + chunk_size]) for i in range(0, total, chunk_size)))
+    logging.info('Google clear folder: %s удалено %s, ошибок %s из %s', folder_id, deleted, failed, total)
+    return deleted, failed
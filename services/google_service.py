@@ -9,6 +9,7 @@ from typing import Union, List
 
 import gspread
 from gspread import Client, Spreadsheet, Worksheet
+from gspread.http_client import HTTPClient
 from gspread.utils import ValueRenderOption, ValueInputOption, GridRangeType
 
 from google.oauth2.service_account import Credentials
@@ -17,10 +18,13 @@ from googleapiclient.http import MediaFileUpload
 import google.auth.transport.requests
 
 import pandas as pd
+from requests import Response
 import pprintpp as pp
 from alive_progress import alive_bar
 
 from core.config import settings, GoogleSheetsSettings
+from services.executor import BoundedExecutor
+from services.rate_limit import call
 from utils.utils import get_current_datetime, dt_formatted
 
 pp = pp.PrettyPrinter(indent=4)
@@ -31,6 +35,23 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive',
 ]
 
+# все функции модуля блокирующие (gspread, googleapiclient) и выполняются в этом пуле, а не в event loop
+sheets_executor = BoundedExecutor('google-sheets', max_workers=gs.SHEETS_WORKERS, timeout=gs.SHEETS_TIMEOUT)
+
+
+# повтор такого запроса после 5xx или обрыва не запишет данные второй раз
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE'))
+
+
+class QuotaHTTPClient(HTTPClient):
+    """HTTP клиент gspread, каждый запрос идёт через общий лимитер квоты,
+    повторяются только идемпотентные запросы: POST (append_row, delete_rows, batch_update)
+    после 5xx мог уже выполниться."""
+
+    def request(self, method: str, *args, **kwargs) -> Response:
+        return call(super().request, method, *args, api='sheets',
+                    retry=method.upper() in IDEMPOTENT_METHODS, **kwargs)
+
 
 def get_client() -> Client:
     """
@@ -39,28 +60,21 @@ def get_client() -> Client:
     Returns:
         Client: A gspread Client instance for interacting with Google Sheets.
     """
-    return gspread.service_account(filename=gs.credentials, scopes=SCOPES)
+    return gspread.service_account(filename=gs.credentials, scopes=SCOPES, http_client=QuotaHTTPClient)
 
 
-async def get_credentials():
+def _get_credentials() -> Credentials:
     """Получение реквизитов для входа в аккаунт Google Drive
     """
     return Credentials.from_service_account_file(filename=gs.credentials, scopes=SCOPES)
 
 
-async def authorize():
+def _authorize() -> Client:
     """Авторизация на Google Drive"""
-    credentials = await get_credentials()
-    return gspread.authorize(credentials)
-
-
-async def google_authorize_token():
-    credentials = await get_credentials()
-    credentials.refresh(google.auth.transport.requests.Request())
-    return credentials.token
+    return gspread.authorize(_get_credentials(), http_client=QuotaHTTPClient)
 
 
-async def get_spreadsheet(book_id: str, version_6: bool = True) -> Spreadsheet:
+def _get_spreadsheet(book_id: str, version_6: bool = True) -> Spreadsheet:
     """Открыть таблицу.
 
     :param version_6: gspread version > 6*
@@ -69,42 +83,58 @@ async def get_spreadsheet(book_id: str, version_6: bool = True) -> Spreadsheet:
     if version_6:
         gc = get_client()
     else:
-        gc = await authorize()
+        gc = _authorize()
     return gc.open_by_key(book_id)
 
 
-async def getting_all_values(ws: Worksheet, to_dict: bool = False) -> list[list] | list[dict]:
+get_credentials = sheets_executor.blocking(_get_credentials)
+authorize = sheets_executor.blocking(_authorize)
+get_spreadsheet = sheets_executor.blocking(_get_spreadsheet)
+
+
+@sheets_executor.blocking
+def google_authorize_token():
+    credentials = _get_credentials()
+    credentials.refresh(google.auth.transport.requests.Request())
+    return credentials.token
+
+
+@sheets_executor.blocking
+def getting_all_values(ws: Worksheet, to_dict: bool = False) -> list[list] | list[dict]:
     if to_dict:
         return ws.get_all_records()
     return ws.get_all_values()
 
 
-async def google_revenue(book_id: str, sheet_name: str) -> str:
+@sheets_executor.blocking
+def google_revenue(book_id: str, sheet_name: str) -> str:
     """`Выручка за день` из гугл таблицы.
 
     :param book_id: id гугл таблицы
     :param sheet_name: имя листа гугл таблицы
     """
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
     values = ss.worksheet(sheet_name).get_values('A2:B7')
     return '\n'.join([f'{v[0]} {v[1]}' for v in values if any(v) and v[0] != '']).replace('Итого', '<b>Итого</b>')
 
 
-async def google_safe(book_id: str, sheet_name: str, boss: bool = False) -> str | list:
+@sheets_executor.blocking
+def google_safe(book_id: str, sheet_name: str, boss: bool = False) -> str | list:
     """`Выручка за день` из гугл таблицы.
 
     :param book_id: id гугл таблицы
     :param sheet_name: имя листа гугл таблицы
     :param boss: строка для отчета остатки в сейфе
     """
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
     if boss:
         values = ss.worksheet(sheet_name).get_values('A2:B7')
         return '\n'.join([f'{v[0]} {v[1]}' for v in values if any(v) and v[0] != '']).replace('Итого', '<b>Итого</b>')
     return ss.worksheet(sheet_name).get_values('A2:B6')
 
 
-async def google_exit(book_id: str, sheet_name: str, period: int = 1, staff_array: bool = False) -> [list, None]:
+@sheets_executor.blocking
+def google_exit(book_id: str, sheet_name: str, period: int = 1, staff_array: bool = False) -> [list, None]:
     """`Выход сотрудника` за период из гугл таблицы.
 
     :param book_id: id гугл таблицы
@@ -112,7 +142,7 @@ async def google_exit(book_id: str, sheet_name: str, period: int = 1, staff_arra
     :param period: (optional) 1 - сегодня; 2 - завтра.
     :param staff_array: bool
     """
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
     values = ss.worksheet(sheet_name).get_values()
     if values:
         df = pd.DataFrame(values, index=None)
@@ -146,7 +176,8 @@ async def google_exit(book_id: str, sheet_name: str, period: int = 1, staff_arra
         return None
 
 
-async def google_exits_by_point(book_id: str, sheet_name: str, point: str, s_date: int = 1, e_date: int = 2) -> list:
+@sheets_executor.blocking
+def google_exits_by_point(book_id: str, sheet_name: str, point: str, s_date: int = 1, e_date: int = 2) -> list:
     """`Chat_id` сотрудников, которые в смене на точке из гугл таблицы.
 
     :param book_id: id гугл таблицы
@@ -155,7 +186,7 @@ async def google_exits_by_point(book_id: str, sheet_name: str, point: str, s_dat
     :param s_date: тип даты старт 0 (сегодня), 1 (завтра)
     :param e_date: тип даты старт 1 (завтра), 2 (послезавтра)
     """
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
     values = ss.worksheet(sheet_name).get_values()
 
     df = pd.DataFrame(values, index=None)
@@ -174,7 +205,8 @@ async def google_exits_by_point(book_id: str, sheet_name: str, point: str, s_dat
         return [int(i[0]) for i in df.values if i[0] is not None]
 
 
-async def exits_google(book_id: str, sheet_name: str, employee: str = None, period: int = 1, boss: bool = False) -> str:
+@sheets_executor.blocking
+def exits_google(book_id: str, sheet_name: str, employee: str = None, period: int = 1, boss: bool = False) -> str:
     """`Выходы сотрудников` за период из гугл таблицы.
 
     :param book_id: id гугл таблицы
@@ -183,7 +215,7 @@ async def exits_google(book_id: str, sheet_name: str, employee: str = None, peri
     :param period: (optional) 1 - за месяц, по сотруднику; 2 - 7 дн., по сотруднику; 3 - сегодня; 4 - завтра; 5 - 7 дн.
     :param boss: True, если отчет для администратора
     """
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
     values = ss.worksheet(sheet_name).get_values()
 
     df = pd.DataFrame(values, index=None)
@@ -239,14 +271,15 @@ async def exits_google(book_id: str, sheet_name: str, employee: str = None, peri
         return 'Не могу найти график 😕'
 
 
-async def google_write_off(book_id: str, sheet_name: str, cols: list) -> list:
+@sheets_executor.blocking
+def google_write_off(book_id: str, sheet_name: str, cols: list) -> list:
     """``Файл списания`` получить массив данных для создания файла списания.
 
     :param book_id: id гугл таблицы
     :param sheet_name: имя листа гугл таблицы
     :param cols: названия столбцов, результирующего отчета
     """
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
     values = ss.worksheet(sheet_name).get_values()
     logging.info('Write off values\n%s', pformat(values))
 
@@ -263,17 +296,19 @@ async def google_write_off(book_id: str, sheet_name: str, cols: list) -> list:
     return df[cols].sort_values(['Сотрудник', 'Дата']).values
 
 
-async def google_get_all_records(book_id: str, sheet_name: str) -> List[dict]:
+@sheets_executor.blocking
+def google_get_all_records(book_id: str, sheet_name: str) -> List[dict]:
     """Получить все записи со страницы из гугл таблицы.
 
     :param book_id: id гугл таблицы
     :param sheet_name: имя листа гугл таблицы
     """
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
     return ss.worksheet(sheet_name).get_all_records(value_render_option=ValueRenderOption.unformatted)
 
 
-async def google_add_row(book_id: str, sheet_name: str, array: Union[list, tuple]) -> None:
+@sheets_executor.blocking
+def google_add_row(book_id: str, sheet_name: str, array: Union[list, tuple]) -> None:
     """`Добавляет строку с данными` на лист (sheet_name) таблицы по book_id.
 
     :param book_id: id гугл таблицы
@@ -281,7 +316,7 @@ async def google_add_row(book_id: str, sheet_name: str, array: Union[list, tuple
     :param array: массив данных
     """
     cur_date = dt_formatted(3)
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
 
     try:
         if sheet_name == '':
@@ -299,7 +334,8 @@ async def google_add_row(book_id: str, sheet_name: str, array: Union[list, tuple
         logging.warning('Google add row:', exc_info=ex)
 
 
-async def google_add_rows(book_id: str, sheet_name: str, array: Union[list, tuple]) -> None:
+@sheets_executor.blocking
+def google_add_rows(book_id: str, sheet_name: str, array: Union[list, tuple]) -> None:
     """`Добавляет строку с данными` на лист (sheet_name) таблицы по book_id.
 
     :param array: массив данных
@@ -307,7 +343,7 @@ async def google_add_rows(book_id: str, sheet_name: str, array: Union[list, tupl
     :param sheet_name: имя листа гугл таблицы
     """
 
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
 
     try:
         worksheet: Worksheet = ss.worksheet(sheet_name)
@@ -317,7 +353,8 @@ async def google_add_rows(book_id: str, sheet_name: str, array: Union[list, tupl
         logging.warning('Google add rows:', exc_info=ex)
 
 
-async def google_worksheet_update(book_id: str, sheet_name: str, array: List[dict]) -> None:
+@sheets_executor.blocking
+def google_worksheet_update(book_id: str, sheet_name: str, array: List[dict]) -> None:
     """`Заменяет данные` на листе (sheet_name) таблицы по book_id.
     `Лист перед вставкой очищается.`
     https://docs.gspread.org/en/v5.3.2/user-guide.html#updating-cells
@@ -326,7 +363,7 @@ async def google_worksheet_update(book_id: str, sheet_name: str, array: List[dic
     :param sheet_name: имя листа гугл таблицы
     :param array: массив содержащий словарь значений для добавления
     """
-    ss: Spreadsheet = await get_spreadsheet(book_id)
+    ss: Spreadsheet = _get_spreadsheet(book_id)
     worksheet: Worksheet = ss.worksheet(sheet_name)
     data = pd.DataFrame(array)
     worksheet.clear()
@@ -334,7 +371,8 @@ async def google_worksheet_update(book_id: str, sheet_name: str, array: List[dic
                      value_input_option=ValueInputOption.user_entered)
 
 
-async def google_update_row(book_id: str, sheet_name: str, array: Union[list, tuple], query: str,
+@sheets_executor.blocking
+def google_update_row(book_id: str, sheet_name: str, array: Union[list, tuple], query: str,
                             col: int = 1, col_s: str = 'A', col_f: str = 'H') -> bool:
     """`Добавляет строку с данными` на лист (sheet_name) таблицы по book_id.
 
@@ -347,7 +385,7 @@ async def google_update_row(book_id: str, sheet_name: str, array: Union[list, tu
     :param sheet_name: имя листа гугл таблицы
     """
     try:
-        ss: Spreadsheet = await get_spreadsheet(book_id)
+        ss: Spreadsheet = _get_spreadsheet(book_id)
         worksheet: Worksheet = ss.worksheet(sheet_name)
         cells = worksheet.findall(query, in_column=col)
 
@@ -363,7 +401,8 @@ async def google_update_row(book_id: str, sheet_name: str, array: Union[list, tu
         return False
 
 
-async def google_delete_row(book_id: str, sheet_name: str, query: Union[str, int], col: int = 1) -> None:
+@sheets_executor.blocking
+def google_delete_row(book_id: str, sheet_name: str, query: Union[str, int], col: int = 1) -> None:
     """`Добавляет строку с данными` на лист (sheet_name) таблицы по book_id.
 
     :param query: данные для поиска в столбце n
@@ -372,7 +411,7 @@ async def google_delete_row(book_id: str, sheet_name: str, query: Union[str, int
     :param sheet_name: имя листа гугл таблицы
     """
     try:
-        ss: Spreadsheet = await get_spreadsheet(book_id)
+        ss: Spreadsheet = _get_spreadsheet(book_id)
         worksheet: Worksheet = ss.worksheet(sheet_name)
         cell = worksheet.find(query, in_column=col)
         worksheet.delete_rows(cell.row, cell.row)  # удалить строку
@@ -381,7 +420,8 @@ async def google_delete_row(book_id: str, sheet_name: str, query: Union[str, int
         logging.warning('Google delete row:', exc_info=ex)
 
 
-async def google_save_file(name: str, file_path: str, mime_type: str = 'image/png') -> str:
+@sheets_executor.blocking(timeout=gs.DRIVE_TIMEOUT)
+def google_save_file(name: str, file_path: str, mime_type: str = 'image/png') -> str:
     """`Сохранение фотографии на` из гугл диске.
 
     :param name: название файла
@@ -389,7 +429,7 @@ async def google_save_file(name: str, file_path: str, mime_type: str = 'image/pn
     :param mime_type: тип сохраняемого файла, по умолчанию 'image/png'
     :returns: id файла
     """
-    credentials = await get_credentials()
+    credentials = _get_credentials()
     service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
 
     file_metadata = {
@@ -402,8 +442,9 @@ async def google_save_file(name: str, file_path: str, mime_type: str = 'image/pn
     return service.files().create(body=file_metadata, media_body=media, fields='id').execute()['id']
 
 
-async def google_clear_folder(folder_id: str) -> None:
-    credentials = await get_credentials()
+@sheets_executor.blocking(timeout=gs.DRIVE_TIMEOUT)
+def google_clear_folder(folder_id: str) -> None:
+    credentials = _get_credentials()
     service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
     results = service.files().list(
         pageSize=1000,
@@ -423,8 +464,9 @@ async def google_clear_folder(folder_id: str) -> None:
     logging.info("Удалили файлы с id:\n %s", data)
 
 
-async def folder_in_google(folder_id: str) -> None:
-    credentials = await get_credentials()
+@sheets_executor.blocking(timeout=gs.DRIVE_TIMEOUT)
+def folder_in_google(folder_id: str) -> None:
+    credentials = _get_credentials()
     service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
     results = service.files().list(
         pageSize=1000,
@@ -446,8 +488,9 @@ async def folder_in_google(folder_id: str) -> None:
             bar()
 
 
-async def get_folder_info(folder_id: str) -> List:
-    credentials = await get_credentials()
+@sheets_executor.blocking
+def get_folder_info(folder_id: str) -> List:
+    credentials = _get_credentials()
     service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
     q = f"'{folder_id}' in parents and mimeType contains 'application/vnd.google-apps.folder'"
     results = service.files().list(pageSize=50,
@@ -456,8 +499,9 @@ async def get_folder_info(folder_id: str) -> List:
     return results.get('files', [])
 
 
-async def get_folder_files_info(folder_id: str) -> List:
-    credentials = await get_credentials()
+@sheets_executor.blocking(timeout=gs.DRIVE_TIMEOUT)
+def get_folder_files_info(folder_id: str) -> List:
+    credentials = _get_credentials()
     service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
     contains = "in parents and (mimeType contains 'application/vnd.google-apps.document' or " \
                "mimeType contains 'pdf' " \
@@ -480,8 +524,9 @@ async def get_folder_files_info(folder_id: str) -> List:
     return results.get('files', [])
 
 
-async def google_delete_file(file_id: str) -> None:
-    gc = await authorize()
+@sheets_executor.blocking
+def google_delete_file(file_id: str) -> None:
+    gc = _authorize()
     gc.del_spreadsheet(file_id)
 
 
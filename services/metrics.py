@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Счётчики и тайминги процесса (лимитер Google API, очереди, рассылки).
+
+Значения живут в памяти процесса, снимок отдаётся командой /metrics.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator
+
+
+@dataclass
+class Timing:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Потокобезопасный реестр: счётчики (inc), тайминги (observe) и текущие значения (set)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.timings: Dict[str, Timing] = defaultdict(Timing)
+        self.gauges: Dict[str, float] = {}
+
+    def inc(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self.timings[name]
+            timing.count += 1
+            timing.total += seconds
+            timing.max = max(timing.max, seconds)
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Замер времени блока кода в тайминг name."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timings': {name: Timing(t.count, t.total, t.max) for name, t in self.timings.items()},
+                'gauges': dict(self.gauges),
+            }
+
+    def report(self) -> str:
+        """Снимок метрик текстом для сообщения в телеграм."""
+        snapshot = self.snapshot()
+        lines = [f'{name}: {value}' for name, value in sorted(snapshot['counters'].items())]
+        lines += [f'{name}: {value:g}' for name, value in sorted(snapshot['gauges'].items())]
+        lines += [
+            f'{name}: n={t.count} avg={t.avg:.3f}s max={t.max:.3f}s'
+            for name, t in sorted(snapshot['timings'].items())
+        ]
+        return '\n'.join(lines) or 'Метрик пока нет'
+
+
+metrics = Metrics()
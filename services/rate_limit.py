@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Общий лимитер квоты и повторы запросов к Google Sheets / Drive.
+
+Все вызовы таблиц (gspread_asyncio, синхронный gspread) берут токен из одного
+``google_quota``, размер которого задаётся квотой проекта (QUOTA_PER_MINUTE, QUOTA_BURST).
+У Drive своя квота в Google, его вызовы (api='drive') берут токены из ``drive_quota``
+(DRIVE_QUOTA_PER_MINUTE, DRIVE_QUOTA_BURST), batch-запрос - по токену на вложенный запрос.
+429, 5xx, 403 rateLimitExceeded и сетевые ошибки повторяются с экспоненциальной
+задержкой со случайным разбросом (full jitter), не более RETRY_MAX раз и не дольше
+RETRY_MAX_TOTAL секунд на запрос.
+Ожидание в лимитере, повторы и отказы пишутся в ``metrics`` с префиксом api.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from core.config import settings, GoogleSheetsSettings
+from services.metrics import metrics
+
+gs: GoogleSheetsSettings = settings.gs
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+class TokenBucket:
+    """Потокобезопасное ведро токенов.
+
+    Токен резервируется сразу, даже если его ещё нет: баланс уходит в минус, а вызывающий
+    ждёт, пока долг восполнится. Так ожидающие обслуживаются по очереди, без гонок.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: токенов в секунду
+        :param capacity: размер всплеска
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 1) -> float:
+        """Зарезервировать токены, возвращает сколько секунд ждать."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Получить токены в потоке (googleapiclient, gspread), возвращает время ожидания."""
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def wait(self, tokens: int = 1) -> float:
+        """Получить токены в event loop, возвращает время ожидания."""
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+google_quota = TokenBucket(rate=gs.QUOTA_PER_MINUTE / 60, capacity=gs.QUOTA_BURST)
+drive_quota = TokenBucket(rate=gs.DRIVE_QUOTA_PER_MINUTE / 60, capacity=gs.DRIVE_QUOTA_BURST)
+
+
+def error_status(ex: Exception) -> Optional[int]:
+    """HTTP статус ошибки gspread / googleapiclient."""
+    # ошибку бросил уже загруженный клиент, импорт ничего не стоит
+    from googleapiclient.errors import HttpError
+    from gspread.exceptions import APIError
+
+    if isinstance(ex, APIError):
+        return ex.response.status_code
+    if isinstance(ex, HttpError):
+        return ex.resp.status
+    return None
+
+
+def is_retryable(ex: Exception) -> bool:
+    """Стоит ли повторять запрос после ошибки ex."""
+    import httplib2
+    import requests
+
+    if isinstance(ex, (requests.RequestException, httplib2.HttpLib2Error, ConnectionError, TimeoutError)):
+        return True
+    status = error_status(ex)
+    if status in RETRY_STATUSES:
+        return True
+    # Drive отвечает 403 и на превышение квоты
+    return status == 403 and any(reason in str(ex) for reason in RATE_LIMIT_REASONS)
+
+
+def backoff(attempt: int) -> float:
+    """Задержка перед повтором attempt (с 0): случайная в [0, min(RETRY_MAX_DELAY, RETRY_BASE * 2 ** attempt)]."""
+    return random.uniform(0, min(gs.RETRY_MAX_DELAY, gs.RETRY_BASE * 2 ** attempt))
+
+
+def give_up(attempt: int, delay: float, deadline: float) -> bool:
+    """Прекратить повторы: исчерпаны RETRY_MAX попыток или пауза выходит за deadline (time.monotonic())."""
+    return attempt >= gs.RETRY_MAX or time.monotonic() + delay > deadline
+
+
+def call(fn: Callable, *args, api: str = 'google', tokens: int = 1, retry: bool = True, **kwargs) -> Any:
+    """Синхронный вызов Google API через лимитер и с повторами, выполняется в потоке пула.
+
+    :param fn: блокирующая функция запроса
+    :param api: префикс метрик ('sheets', 'drive')
+    :param tokens: токенов квоты на вызов, для batch-запроса - по одному на вложенный запрос
+    :param retry: повторять временные ошибки, False для неидемпотентных запросов (дописать строки)
+    """
+    quota = drive_quota if api == 'drive' else google_quota
+    attempt = 0
+    deadline = time.monotonic() + gs.RETRY_MAX_TOTAL
+    while True:
+        metrics.observe(f'{api}.limiter_wait', quota.acquire(tokens))
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as ex:
+            if not retry or not is_retryable(ex):
+                metrics.inc(f'{api}.errors')
+                raise
+            delay = backoff(attempt)
+            if give_up(attempt, delay, deadline):
+                metrics.inc(f'{api}.failures')
+                raise
+            attempt += 1
+            metrics.inc(f'{api}.retries')
+            logging.warning('Google %s: %s, повтор %s через %.1f с', api, ex, attempt, delay)
+            time.sleep(delay)
+            continue
+        metrics.inc(f'{api}.calls')
+        return result
+
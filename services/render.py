@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Общие для запуска рассылки данные и шаблоны сообщений.
+
+``RenderContext`` один раз на запуск считает даты прописью (pytils) и час рассылки,
+``Template`` при создании подставляет поля контекста и разбирает текст на куски, так
+что на сотрудника остаётся склейка кусков с его полями (first_name, full_name, point, ...)
+и данными, заранее разложенными по точкам (``by_point``).
+
+    context = RenderContext.now()
+    template = Template('<b>INFO {date}</b>\\n{first_name}, остаток: {safe}', context)
+    safe = by_point(await google_safe())
+    render = lambda user: [template.message(user, safe=safe.get(user.point, ''))]
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import partial
+from string import Formatter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.bot import bot
+from utils.utils import get_current_datetime, ru_strftime
+
+if TYPE_CHECKING:
+    from database import Recipient
+    from services.broadcast import Send
+
+_formatter = Formatter()
+
+
+def _format_field(value: Any, spec: str, conversion: Optional[str]) -> str:
+    """Значение поля с преобразованием !r/!s/!a и форматом после двоеточия, как в str.format."""
+    return _formatter.format_field(_formatter.convert_field(value, conversion), spec)
+
+
+@dataclass(frozen=True)
+class RenderContext:
+    """Даты и время запуска рассылки в том виде, в каком они идут в текст."""
+    moment: datetime
+    # 01 июня 24, сб
+    date: str
+    yesterday: str
+    # 01.06.24
+    today: str
+    tomorrow: str
+    # суббота
+    weekday: str
+    # 09
+    hour: str
+
+    @classmethod
+    def at(cls, moment: datetime) -> 'RenderContext':
+        """Контекст рассылки в момент moment."""
+        long_date = partial(ru_strftime, u'%d %B %y, %a', inflected=True)
+        short_date = partial(ru_strftime, u'%d.%m.%y', inflected=True)
+        return cls(
+            moment=moment,
+            date=long_date(date=moment),
+            yesterday=long_date(date=moment - timedelta(days=1)),
+            today=short_date(date=moment),
+            tomorrow=short_date(date=moment + timedelta(days=1)),
+            weekday=ru_strftime(u'%A', inflected=True, date=moment),
+            hour=moment.strftime('%H'),
+        )
+
+    @classmethod
+    def now(cls) -> 'RenderContext':
+        """Контекст рассылки на текущее время по Мск."""
+        return cls.at(get_current_datetime())
+
+
+class Template:
+    """Текст сообщения с полями ``{name}`` и параметры отправки, разобранные один раз.
+
+    Поля RenderContext подставляются при создании, остальные при render: из именованных
+    аргументов, иначе из одноимённого атрибута сотрудника (Recipient). Формат и
+    преобразование поля (``{safe:>8}``, ``{name!r}``) применяются как в str.format.
+    """
+
+    def __init__(self, text: str, context: Optional[RenderContext] = None, **kwargs):
+        """
+        :param text: текст с полями в фигурных скобках, {{ и }} - сами скобки
+        :param context: (optional) контекст рассылки, его поля подставляются сразу
+        :param kwargs: параметры bot.send_message, например reply_markup
+        """
+        self.kwargs = kwargs
+        # (текст перед полем, имя поля, форматирование значения)
+        self._parts: List[Tuple[str, str, Callable[[Any], str]]] = []
+        literal = ''
+        for text_part, name, spec, conversion in _formatter.parse(text):
+            literal += text_part
+            if name is None:
+                continue
+            if '{' in spec:
+                raise ValueError(f'Template: вложенные поля в формате {{{name}:{spec}}} не поддерживаются')
+            if conversion not in (None, 'r', 's', 'a'):
+                raise ValueError(f'Template: неизвестное преобразование !{conversion} поля {name}')
+            if context is not None and hasattr(context, name):
+                literal += _format_field(getattr(context, name), spec, conversion)
+            else:
+                fmt = str if not spec and conversion is None else partial(
+                    _format_field, spec=spec, conversion=conversion)
+                self._parts.append((literal, name, fmt))
+                literal = ''
+        self._tail = literal
+
+    def render(self, user: Optional['Recipient'] = None, **fields) -> str:
+        """Текст сообщения.
+
+        :param user: (optional) сотрудник, поля берутся из его атрибутов
+        :param fields: значения полей, приоритетнее атрибутов сотрудника
+        """
+        return ''.join([literal + fmt(fields[name] if name in fields else getattr(user, name))
+                        for literal, name, fmt in self._parts]) + self._tail
+
+    def message(self, user: Optional['Recipient'] = None, **fields) -> 'Send':
+        """Сообщение для fan_out с текстом render(user, **fields)."""
+        return partial(bot.send_message, text=self.render(user, **fields), **self.kwargs)
+
+
+def by_point(rows: Iterable[Sequence]) -> Dict[str, str]:
+    """Строки вида [точка, значение] по точкам: точка -> строки 'точка значение' через перевод строки.
+
+    :param rows: строки листа, первая ячейка - точка
+    """
+    lines: Dict[str, List[str]] = {}
+    for row in rows:
+        if len(row) < 2 or row[1] is None:
+            continue
+        lines.setdefault(row[0], []).append(f'{row[0]} {row[1]}')
+    return {point: '\n'.join(point_lines) for point, point_lines in lines.items()}
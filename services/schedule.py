@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Разобранный график выходов (лист gs.SHEET_EXITS), проиндексированный по дате."""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from utils.utils import parse_date
+
+SCHEDULE_COLUMNS = ('Дата', 'Сотрудник', 'Точка', 'Смена', 'chat_id')
+
+
+class Shift(NamedTuple):
+    """Одна смена сотрудника из графика."""
+    date: date
+    employee: str
+    point: str
+    hours: str
+    chat_id: Optional[int]
+
+    @property
+    def last_name(self) -> str:
+        return self.employee.split(' ')[0]
+
+
+class _DateIndex:
+    """Смены, отсортированные по дате, с бинарным поиском по диапазону."""
+
+    def __init__(self, shifts: List[Shift]):
+        self.shifts = shifts
+        self.dates = [shift.date for shift in shifts]
+
+    def between(self, start: date, end: date) -> List[Shift]:
+        return self.shifts[bisect_left(self.dates, start):bisect_left(self.dates, end)]
+
+
+class ScheduleSnapshot:
+    """График выходов в памяти.
+
+    Строки разбираются один раз при загрузке листа, запросы ``[start, end)`` по дате,
+    точке или сотруднику отвечают бинарным поиском без обращения к сети.
+    """
+
+    def __init__(self, shifts: Iterable[Shift]):
+        shifts = sorted(shifts, key=lambda shift: shift.date)
+        by_point: Dict[str, List[Shift]] = defaultdict(list)
+        by_employee: Dict[str, List[Shift]] = defaultdict(list)
+        for shift in shifts:
+            by_point[shift.point].append(shift)
+            by_employee[shift.employee].append(shift)
+
+        self._all = _DateIndex(shifts)
+        self._by_point = {point: _DateIndex(items) for point, items in by_point.items()}
+        self._by_employee = {employee: _DateIndex(items) for employee, items in by_employee.items()}
+
+    def __len__(self) -> int:
+        return len(self._all.shifts)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[str]]) -> 'ScheduleSnapshot':
+        """Разбор строк в порядке SCHEDULE_COLUMNS, строки без даты пропускаются."""
+        shifts = []
+        for day, employee, point, hours, chat_id in rows:
+            parsed = parse_date(day)
+            if parsed is None:
+                continue
+            chat_id = str(chat_id).strip()
+            shifts.append(Shift(parsed, employee, point, hours, int(chat_id) if chat_id.isdigit() else None))
+        return cls(shifts)
+
+    def between(self, start: date, end: date) -> List[Shift]:
+        """Все смены в периоде [start, end)."""
+        return self._all.between(start, end)
+
+    def on(self, day: date) -> List[Shift]:
+        """Кто работает в день day."""
+        return self._all.between(day, date.fromordinal(day.toordinal() + 1))
+
+    def at_point(self, point: str, start: date, end: date) -> List[Shift]:
+        """Кто работает на точке в периоде [start, end)."""
+        index = self._by_point.get(point)
+        return index.between(start, end) if index else []
+
+    def employee(self, employee: str, start: date, end: date) -> List[Shift]:
+        """Смены сотрудника в периоде [start, end)."""
+        index = self._by_employee.get(employee)
+        return index.between(start, end) if index else []
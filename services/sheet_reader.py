@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Чтение только нужных столбцов и строк листа вместо ``ws.get_values()`` целиком.
+
+Заголовки листа читаются один раз и кешируются, нужные столбцы запрашиваются одним
+``batch_get`` по диапазонам вида ``C2:C``. Для листов, в которые строки дописываются
+по порядку даты (график, списания), столбец даты читается целиком один раз и держится
+в памяти, дальше дочитываются только строки, добавленные в конец листа. Первая строка
+периода находится бинарным поиском, и с листа запрашивается только хвост.
+Строки отдаются генератором кортежей в порядке запрошенных столбцов.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from datetime import date
+from itertools import zip_longest
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from cache.snapshot import Snapshot
+from core.config import settings, GoogleSheetsSettings
+from utils.utils import parse_date
+
+gs: GoogleSheetsSettings = settings.gs
+
+if TYPE_CHECKING:
+    from gspread_asyncio import AsyncioGspreadWorksheet
+
+
+class SheetReader:
+    """Проекция листа (sheet_name) книги book_id по названиям столбцов."""
+
+    def __init__(self, book_id: str, sheet_name: str, header_row: int = 1):
+        """
+        :param book_id: id гугл таблицы
+        :param sheet_name: имя листа гугл таблицы
+        :param header_row: номер строки заголовков
+        """
+        self.book_id = book_id
+        self.sheet_name = sheet_name
+        self.header_row = header_row
+        self.header = Snapshot(f'header:{book_id}:{sheet_name}', self._load_header, ttl=gs.HEADER_TTL,
+                               book_id=book_id, sheet_name=sheet_name)
+        self._dates: Dict[str, DateColumn] = {}
+        self._dates_lock = asyncio.Lock()
+
+    async def _worksheet(self) -> 'AsyncioGspreadWorksheet':
+        from services.async_google_service import GoogleSheetAsyncClient
+        return await GoogleSheetAsyncClient.worksheet(self.book_id, self.sheet_name)
+
+    async def _load_header(self) -> List[str]:
+        ws = await self._worksheet()
+        values = await ws.get_values(f'{self.header_row}:{self.header_row}')
+        return [str(name).strip() for name in values[0]] if values else []
+
+    async def _letters(self, columns: Sequence[str]) -> List[Optional[str]]:
+        header = await self.header.get()
+        return [column_letter(header.index(name) + 1) if name in header else None for name in columns]
+
+    async def rows(self, columns: Sequence[str], start_row: Optional[int] = None) -> Iterator[Tuple[str, ...]]:
+        """Строки листа с start_row до конца, только столбцы columns.
+
+        :param columns: названия столбцов, отсутствующие в заголовках отдаются пустыми
+        :param start_row: (optional) первая строка, по умолчанию следующая за заголовками
+        """
+        start_row = start_row or self.header_row + 1
+        letters = await self._letters(columns)
+        present = [letter for letter in letters if letter is not None]
+        if not present:
+            return iter(())
+
+        ws = await self._worksheet()
+        ranges = await ws.batch_get([f'{letter}{start_row}:{letter}' for letter in present], major_dimension='COLUMNS')
+        values: Dict[str, list] = {letter: (value_range[0] if value_range else []) for letter, value_range in
+                                   zip(present, ranges)}
+        empty: list = []
+        return _project(*(values[letter] if letter is not None else empty for letter in letters))
+
+    async def _column(self, letter: str, start_row: int) -> list:
+        ws = await self._worksheet()
+        ranges = await ws.batch_get([f'{letter}{start_row}:{letter}'], major_dimension='COLUMNS')
+        return ranges[0][0] if ranges and ranges[0] else []
+
+    async def first_row(self, date_column: str, since) -> int:
+        """Номер первой строки с датой >= since.
+
+        Столбец даты читается целиком при первом вызове и раз в HEADER_TTL, в остальных
+        вызовах дочитывается только конец листа начиная с последних известных строк.
+        Если даты в столбце идут не по порядку, возвращается первая строка после заголовков.
+
+        :param date_column: название столбца с датой
+        :param since: дата начала периода
+        """
+        first = self.header_row + 1
+        letter, = await self._letters([date_column])
+        if letter is None:
+            return first
+
+        async with self._dates_lock:
+            column = self._dates.get(letter)
+            if column is None or time.monotonic() - column.loaded_at >= gs.HEADER_TTL:
+                column = self._dates[letter] = DateColumn(first)
+            if not column.extend(await self._column(letter, column.start)):
+                # строки выше конца вставили или удалили, читаем столбец заново
+                column = self._dates[letter] = DateColumn(first)
+                column.extend(await self._column(letter, first))
+
+        if not column.ordered:
+            return first
+        i = bisect_left(column.dates, since)
+        return column.rows[i] if i < len(column.rows) else column.end
+
+    async def tail(self, columns: Sequence[str], date_column: str, since) -> Iterator[Tuple[str, ...]]:
+        """Строки с датой >= since для листа, упорядоченного по date_column.
+
+        :param columns: названия столбцов
+        :param date_column: название столбца с датой
+        :param since: дата начала периода
+        """
+        return await self.rows(columns, start_row=await self.first_row(date_column, since))
+
+
+class DateColumn:
+    """Разобранный столбец даты листа, который дочитывается с конца."""
+
+    # сколько последних строк читается повторно, чтобы заметить вставку или удаление строк
+    OVERLAP = 5
+
+    def __init__(self, first: int):
+        """
+        :param first: первая строка данных
+        """
+        self.first = first
+        # первая непрочитанная строка
+        self.end = first
+        self.dates: List[date] = []
+        self.rows: List[int] = []
+        self.ordered = True
+        self.loaded_at = time.monotonic()
+        self._tail: list = []
+
+    @property
+    def start(self) -> int:
+        """Строка, с которой читать продолжение: последние OVERLAP известных строк и дальше."""
+        return self.end - len(self._tail)
+
+    def extend(self, values: list) -> bool:
+        """Дописать значения столбца, прочитанные со строки start.
+
+        :param values: значения со строки start до конца листа
+        :return: False, если повторно прочитанные строки не совпали с известными
+        """
+        if values[:len(self._tail)] != self._tail:
+            return False
+        new = values[len(self._tail):]
+        for offset, value in enumerate(new):
+            parsed = parse_date(value)
+            if parsed is None:
+                continue
+            if self.dates and parsed < self.dates[-1]:
+                self.ordered = False
+            self.dates.append(parsed)
+            self.rows.append(self.end + offset)
+        self.end += len(new)
+        self._tail = values[-self.OVERLAP:]
+        return True
+
+
+class BookRanges:
+    """Небольшие диапазоны одной книги (сводки, итоги) одним ``values:batchGet``.
+
+    Значения всех диапазонов кешируются вместе на ttl секунд, повторные запросы
+    (кнопки, рассылки по сотрудникам) обслуживаются из памяти.
+    """
+
+    def __init__(self, name: str, book_id: str, ranges: Dict[str, Tuple[str, str]], ttl: float):
+        """
+        :param name: имя снимка в реестре Snapshot
+        :param book_id: id гугл таблицы
+        :param ranges: ключ -> (имя листа, диапазон A1)
+        :param ttl: время жизни значений, сек.
+        """
+        self.book_id = book_id
+        self.ranges = ranges
+        self.snapshot = Snapshot(name, self._load, ttl=ttl, book_id=book_id)
+
+    async def _load(self) -> Dict[str, List[list]]:
+        from services.async_google_service import GoogleSheetAsyncClient
+
+        ss = await GoogleSheetAsyncClient.spreadsheet(self.book_id)
+        response = await ss.values_batch_get([f"'{sheet}'!{cells}" for sheet, cells in self.ranges.values()])
+        value_ranges = response.get('valueRanges', [])
+        return {key: _fill(value_range.get('values', [])) for key, value_range in zip(self.ranges, value_ranges)}
+
+    async def get(self, key: str) -> List[list]:
+        """Значения диапазона key, строки дополнены до одной длины как в ``ws.get_values()``."""
+        return (await self.snapshot.get()).get(key, [])
+
+
+def _fill(values: List[list]) -> List[list]:
+    width = max((len(row) for row in values), default=0)
+    return [row + [''] * (width - len(row)) for row in values]
+
+
+def column_letter(col: int) -> str:
+    """Буква столбца по номеру с 1: 1 -> A, 28 -> AB."""
+    letters = ''
+    while col:
+        col, rest = divmod(col - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+
+def column_number(letters: str) -> int:
+    """Номер столбца с 1 по букве: A -> 1, AB -> 28."""
+    col = 0
+    for letter in letters.upper():
+        col = col * 26 + ord(letter) - ord('A') + 1
+    return col
+
+
+def _project(*columns: list) -> Iterator[Tuple[str, ...]]:
+    for row in zip_longest(*columns, fillvalue=''):
+        if any(row):
+            yield row
+
+
+_readers: Dict[Tuple[str, str], SheetReader] = {}
+
+
+def sheet_reader(book_id: str, sheet_name: str) -> SheetReader:
+    """Общий на процесс SheetReader листа, заголовки кешируются между вызовами."""
+    key = (book_id, sheet_name)
+    if key not in _readers:
+        _readers[key] = SheetReader(book_id, sheet_name)
+    return _readers[key]
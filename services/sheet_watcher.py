@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Сброс кеша листов по факту изменения книги, а не по таймеру.
+
+Раз в WATCH_INTERVAL секунд для каждой книги, из которой читает хоть один ``Snapshot``,
+запрашивается только ``modifiedTime`` файла на гугл диске. Если книга изменилась, все её
+снимки сбрасываются и перечитываются при следующем обращении. Если нет, TTL снимков,
+загруженных после последнего изменения, продлевается, и в обычном режиме вместо чтения
+листов целиком остаётся один дешёвый запрос метаданных на книгу за интервал.
+TTL снимков остаётся страховкой, если наблюдатель остановлен или Drive недоступен.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from cache.snapshot import Snapshot
+from core.config import settings, GoogleSheetsSettings
+from services import google_drive
+from services.metrics import metrics
+
+gs: GoogleSheetsSettings = settings.gs
+
+
+class SheetWatcher:
+    """Опрос modifiedTime книг и сброс снимков изменившихся книг."""
+
+    def __init__(self, interval: float):
+        """
+        :param interval: период опроса, сек.
+        """
+        self.interval = interval
+        self._versions: Dict[str, str] = {}
+        # time.monotonic() первого опроса, увидевшего текущую версию книги
+        self._since: Dict[str, float] = {}
+
+    @staticmethod
+    def books() -> List[str]:
+        """Книги, из которых читают зарегистрированные снимки."""
+        return sorted({snapshot.book_id for snapshot in Snapshot.registry.values() if snapshot.book_id})
+
+    async def check(self, book_id: str) -> bool:
+        """Проверить книгу book_id, возвращает True, если она изменилась и снимки сброшены.
+
+        :param book_id: id гугл таблицы
+        """
+        started = time.monotonic()
+        modified = await google_drive.modified_time(book_id)
+        snapshots = Snapshot.by_book(book_id)
+
+        if self._versions.get(book_id) != modified:
+            if book_id in self._versions:
+                metrics.inc('watcher.changes')
+                logging.info('Книга %s изменена в %s, сброшено снимков: %s', book_id, modified, len(snapshots))
+            self._versions[book_id] = modified
+            self._since[book_id] = started
+            for snapshot in snapshots:
+                snapshot.invalidate()
+            return True
+
+        touched = sum(snapshot.touch(self._since[book_id]) for snapshot in snapshots)
+        metrics.inc('watcher.unchanged')
+        metrics.inc('watcher.touched', touched)
+        return False
+
+    async def poll(self) -> None:
+        """Один проход по всем книгам, ошибки Drive пишутся в лог."""
+        books = self.books()
+        results = await asyncio.gather(*(self.check(book_id) for book_id in books), return_exceptions=True)
+        for book_id, result in zip(books, results):
+            if isinstance(result, Exception):
+                metrics.inc('watcher.errors')
+                logging.warning('Книга %s: не удалось проверить изменения: %r', book_id, result)
+
+    async def run(self) -> None:
+        """Опрашивать книги до отмены задачи."""
+        while True:
+            await self.poll()
+            await asyncio.sleep(self.interval)
+
+
+sheet_watcher = SheetWatcher(gs.WATCH_INTERVAL)
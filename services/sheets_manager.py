@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Менеджер клиента gspread_asyncio на общем лимитере квоты.
+
+Модуль импортирует gspread_asyncio, поэтому подключается только при создании
+менеджера в ``GoogleSheetAsyncClient.manager()``.
+"""
+import asyncio
+import logging
+import time
+
+from gspread_asyncio import AsyncioGspreadClientManager
+
+from core.config import settings, GoogleSheetsSettings
+from services.metrics import metrics
+from services.rate_limit import backoff, give_up, google_quota, is_retryable
+
+gs: GoogleSheetsSettings = settings.gs
+
+
+class QuotaClientManager(AsyncioGspreadClientManager):
+    """Менеджер gspread_asyncio на общем лимитере квоты.
+
+    ``_call`` gspread_asyncio держит общий на менеджер call_lock, пока вызывает хуки
+    delay и handle_*_error, поэтому ожидание токена ``google_quota`` и паузы повторов
+    идут вокруг него: одна ошибка не останавливает остальные запросы к таблицам.
+    Вместо бесконечных повторов раз в ``gspread_delay`` - экспоненциальная задержка
+    с разбросом, не более RETRY_MAX повторов и RETRY_MAX_TOTAL секунд, после чего
+    ошибка пробрасывается.
+    """
+
+    async def _call(self, method, *args, **kwargs):
+        api_call_count = kwargs.pop('api_call_count', 1)
+        attempt = 0
+        deadline = time.monotonic() + gs.RETRY_MAX_TOTAL
+        while True:
+            metrics.observe('sheets.limiter_wait', await google_quota.wait(api_call_count))
+            try:
+                result = await super()._call(method, *args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    metrics.inc('sheets.errors')
+                    raise
+                delay = backoff(attempt)
+                if give_up(attempt, delay, deadline):
+                    metrics.inc('sheets.failures')
+                    raise
+                attempt += 1
+                metrics.inc('sheets.retries')
+                logging.warning('Google sheets: %s %s, повтор %s через %.1f с', method.__name__, e, attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+            metrics.inc('sheets.calls')
+            return result
+
+    async def delay(self):
+        # токен берётся в _call до call_lock
+        pass
+
+    async def handle_gspread_error(self, e, method, args, kwargs):
+        # повтор решает _call вне call_lock
+        raise e
+
+    async def handle_requests_error(self, e, method, args, kwargs):
+        raise e
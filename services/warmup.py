@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Прогрев снимков листов перед плановыми рассылками.
+
+Задачи в реестре ``hendlers.mailings.jobs`` объявляют, какие снимки (``Snapshot``) им нужны.
+За несколько минут до задач warm перечитывает эти снимки и держит их до начала задач,
+даже если TTL снимка короче, поэтому рассылки начинают отправлять сразу, а не читают
+листы в ту же минуту, когда сотрудники открывают бота. Изменение книги (``sheet_watcher``)
+по-прежнему сбрасывает прогретый снимок.
+"""
+import asyncio
+import logging
+import time
+from typing import Sequence
+
+from cache.snapshot import Snapshot
+from services.metrics import metrics
+
+
+async def warm(names: Sequence[str], hold: float) -> None:
+    """Перечитать снимки names и держать их hold секунд.
+
+    :param names: имена снимков в реестре Snapshot
+    :param hold: сколько секунд отдавать прогретые значения без перечитывания
+    """
+    started = time.monotonic()
+    results = await asyncio.gather(*(_warm(name, hold) for name in names), return_exceptions=True)
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            metrics.inc(f'warm.{name}.error')
+            logging.warning('Прогрев %s: не удалось загрузить: %r', name, result)
+    logging.info('Прогрев %s за %.1f с', ', '.join(names), time.monotonic() - started)
+
+
+async def _warm(name: str, hold: float) -> None:
+    snapshot = Snapshot.get_by_name(name)
+    started = time.monotonic()
+    await snapshot.refresh()
+    snapshot.hold(hold)
+    metrics.observe(f'warm.{name}', time.monotonic() - started)
@@ -1,11 +1,12 @@
 # !/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import logging
+from functools import lru_cache
 from itertools import combinations
-from typing import Union, List
+from typing import Union, List, Optional
 import os
 import shutil
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 
 import aiofiles
 import pytz
@@ -46,10 +47,40 @@ def dt_formatted(str_type: int = None, minus_days: int = 0, plus_days: int = 0)
     return (get_current_datetime() - timedelta(days=minus_days) + timedelta(days=plus_days)).strftime(ft)
 
 
+def ru_strftime(format: str = '%d.%m.%Y', date: Optional[datetime] = None, **kwargs) -> str:
+    """Дата по-русски через pytils.dt.ru_strftime, pytils грузится при первом вызове, а не при старте бота."""
+    from pytils.dt import ru_strftime as strftime
+    return strftime(format, date=date, **kwargs)
+
+
 def to_datetime(date_string: str, date_format: str = '%Y-%m-%d %H:%M:%S'):
     return datetime.strptime(date_string, date_format)
 
 
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d.%m.%y', '%Y-%m-%d %H:%M:%S', '%d.%m.%Y %H:%M:%S', '%m/%d/%Y')
+
+
+@lru_cache(maxsize=4096)
+def parse_datetime(value: str) -> Optional[datetime]:
+    """Дата и время из ячейки гугл таблицы, None если ячейка пустая или не дата.
+
+    Значения в листах повторяются (даты смен, списаний), поэтому результат кешируется.
+    """
+    value = (value or '').strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(value: str) -> Optional[date]:
+    """Дата из ячейки гугл таблицы, None если ячейка пустая или не дата."""
+    parsed = parse_datetime(value)
+    return parsed.date() if parsed else None
+
+
 def seconds_to_time(seconds: int, time_format: str = 'short') -> str:
     """Конвертация секунд в `ЧЧ:ММ:СС`
 